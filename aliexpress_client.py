@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+"""
+Cliente do gateway /sync do AliExpress
+Mantém um pool de conexões keep-alive, assina as chamadas e faz o parse da
+resposta uma única vez.
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from capture import redact_params
+from singleflight import SingleFlight, canonical_key
+
+SYNC_URL = 'https://api-sg.aliexpress.com/sync'
+
+# Timeout de conexão separado do timeout de leitura (segundos)
+CONNECT_TIMEOUT = 3.05
+DEFAULT_TIMEOUT = 15
+
+# Timeouts de leitura padrão por método da API
+METHOD_TIMEOUTS = {
+    'aliexpress.ds.product.get': 10,
+    'aliexpress.ds.product.wholesale.get': 10,
+    'aliexpress.ds.freight.query': 10,
+    'aliexpress.logistics.buyer.freight.calculate': 10,
+    'aliexpress.ds.feedname.get': 15,
+    'aliexpress.ds.feed.itemids.get': 15,
+    'aliexpress.ds.category.get': 15,
+    'aliexpress.solution.sku.attribute.query': 15,
+    'aliexpress.ds.order.tracking.get': 15,
+    'aliexpress.ds.text.search': 20,
+    'aliexpress.ds.order.create': 30,
+}
+
+# Métodos com efeito colateral: nunca compartilham chamada em voo
+NON_COALESCED_METHODS = {
+    'aliexpress.ds.order.create',
+}
+
+
+def generate_api_signature(params, app_secret):
+    """Gerar assinatura para APIs de negócios do AliExpress"""
+    # 1. Ordenar e concatenar key+value
+    sorted_params = "".join(f"{k}{str(v)}" for k, v in sorted(params.items()))
+
+    # 2. Concatenar secret + params + secret
+    to_sign = f"{app_secret}{sorted_params}{app_secret}"
+
+    # 3. Gerar MD5 maiúsculo
+    signature = hashlib.md5(to_sign.encode("utf-8")).hexdigest().upper()
+
+    return signature
+
+
+class AliExpressResponse:
+    """Envelope de resposta do /sync com parse feito uma única vez"""
+
+    def __init__(self, method, status_code, text, headers=None, url='', elapsed=0.0):
+        self.method = method
+        self.status_code = status_code
+        self.text = text
+        self.headers = headers or {}
+        self.url = url
+        self.elapsed = elapsed
+        self._data = None
+        self._parsed = False
+        self._parse_lock = threading.Lock()
+
+    def json(self):
+        """Mesmo contrato de requests.Response.json(), mas com cache"""
+        if not self._parsed:
+            with self._parse_lock:
+                if not self._parsed:
+                    self._data = json.loads(self.text)
+                    self._parsed = True
+        return self._data
+
+    @property
+    def data(self):
+        """Corpo parseado ou {} se a resposta não for JSON"""
+        try:
+            data = self.json()
+        except ValueError:
+            return {}
+        return data if isinstance(data, dict) else {}
+
+    @property
+    def response_key(self):
+        return self.method.replace('.', '_') + '_response'
+
+    @property
+    def envelope(self):
+        """Conteúdo de <method>_response"""
+        return self.data.get(self.response_key) or {}
+
+    @property
+    def result(self):
+        """Desembrulha <method>_response.result (ou resp_result.result)"""
+        envelope = self.envelope
+        if 'result' in envelope:
+            return envelope.get('result') or {}
+        resp_result = envelope.get('resp_result') or {}
+        if 'result' in resp_result:
+            return resp_result.get('result') or {}
+        # Algumas APIs (ex.: tracking) devolvem result no nível raiz
+        return self.data.get('result') or {}
+
+    @property
+    def error(self):
+        return self.data.get('error_response')
+
+    @property
+    def ok(self):
+        return self.status_code == 200 and not self.error
+
+
+class AliExpressClient:
+    """Cliente único para o gateway /sync do AliExpress"""
+
+    def __init__(self, app_key, app_secret, base_url=SYNC_URL, pool_size=None, rate_limiter=None, coalesce=True, capture=None):
+        self.app_key = app_key
+        self.app_secret = app_secret
+        self.base_url = base_url
+        self.pool_size = pool_size or int(os.getenv('ALIEXPRESS_POOL_SIZE', '20'))
+        self.rate_limiter = rate_limiter
+        self.singleflight = SingleFlight() if coalesce else None
+        self.capture = capture
+
+        self._session = None
+        self._session_pid = None
+        self._lock = threading.Lock()
+        self._stats = {'calls': 0, 'errors': 0, 'total_ms': 0.0}
+
+    def _get_session(self):
+        """Cria a sessão sob demanda (e de novo após fork do gunicorn)"""
+        pid = os.getpid()
+        if self._session is None or self._session_pid != pid:
+            with self._lock:
+                if self._session is None or self._session_pid != pid:
+                    session = requests.Session()
+                    # Só reenvia quando a conexão falha antes de a requisição sair
+                    retries = Retry(total=2, connect=2, read=0, status=0, redirect=0, backoff_factor=0.2)
+                    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=self.pool_size, max_retries=retries)
+                    session.mount('https://', adapter)
+                    session.mount('http://', adapter)
+                    self._session = session
+                    self._session_pid = pid
+        return self._session
+
+    def build_params(self, method, access_token=None, params=None):
+        """Monta os parâmetros base e assina a chamada"""
+        signed = {
+            "method": method,
+            "app_key": self.app_key,
+            "timestamp": int(time.time() * 1000),
+            "sign_method": "md5",
+            "format": "json",
+            "v": "2.0",
+        }
+        if access_token:
+            signed["access_token"] = access_token
+        if params:
+            signed.update(params)
+        signed["sign"] = generate_api_signature(signed, self.app_secret)
+        return signed
+
+    def send(self, params, timeout=None):
+        """
+        Envia parâmetros já assinados pelo pool de conexões.
+        Chamadas de leitura idênticas em voo (mesmo método e parâmetros, sem
+        timestamp/sign) compartilham a mesma requisição e o mesmo
+        AliExpressResponse, que deve ser tratado como somente leitura.
+        """
+        method = params.get('method', '')
+        if self.singleflight is None or method in NON_COALESCED_METHODS:
+            return self._send(params, timeout)
+        return self.singleflight.do(canonical_key(params), lambda: self._send(params, timeout))
+
+    def _send(self, params, timeout=None):
+        method = params.get('method', '')
+        read_timeout = timeout or METHOD_TIMEOUTS.get(method, DEFAULT_TIMEOUT)
+
+        # Espera apenas se o balde do método estiver vazio
+        if self.rate_limiter is not None:
+            self.rate_limiter.acquire(method)
+
+        started = time.perf_counter()
+        try:
+            response = self._get_session().get(
+                self.base_url, params=params, timeout=(CONNECT_TIMEOUT, read_timeout)
+            )
+        except requests.RequestException:
+            self._record(started, error=True)
+            raise
+        elapsed = time.perf_counter() - started
+        self._record(started, error=response.status_code != 200)
+
+        if self.capture is not None:
+            # Amostragem e gravação ficam a cargo do CaptureBuffer (sem I/O aqui)
+            self.capture.record(
+                method,
+                key=params.get('product_id') or params.get('feed_name'),
+                body=response.text,
+                meta={
+                    'status': response.status_code,
+                    'elapsed_ms': round(elapsed * 1000, 1),
+                    'params': redact_params(params),
+                },
+            )
+
+        return AliExpressResponse(
+            method,
+            response.status_code,
+            response.text,
+            headers=response.headers,
+            url=response.url,
+            elapsed=elapsed,
+        )
+
+    def call(self, method, access_token=None, params=None, timeout=None):
+        """Chama um método da API e devolve um AliExpressResponse"""
+        return self.send(self.build_params(method, access_token, params), timeout=timeout)
+
+    def _record(self, started, error=False):
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        with self._lock:
+            self._stats['calls'] += 1
+            self._stats['total_ms'] += elapsed_ms
+            if error:
+                self._stats['errors'] += 1
+
+    def stats(self):
+        with self._lock:
+            calls = self._stats['calls']
+            stats = {
+                'calls': calls,
+                'errors': self._stats['errors'],
+                'avg_ms': round(self._stats['total_ms'] / calls, 1) if calls else 0.0,
+                'pool_size': self.pool_size,
+            }
+        if self.singleflight is not None:
+            stats['coalescing'] = self.singleflight.stats()
+        return stats
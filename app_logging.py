@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+Logging estruturado (structlog) com níveis, amostragem por módulo e
+formatação preguiçosa
+Chamadas abaixo de LOG_LEVEL viram no-op antes de montar o evento, e
+payloads passados com lazy_json() só são serializados se o evento for
+de fato emitido.
+"""
+
+import json
+import logging
+import os
+import random
+import sys
+
+try:
+    import structlog
+    STRUCTLOG_AVAILABLE = True
+except ImportError:
+    STRUCTLOG_AVAILABLE = False
+
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()
+LOG_FORMAT = os.getenv('LOG_FORMAT', 'console').lower()  # console | json
+
+
+def parse_sample_rates(raw):
+    """Lê 'modulo=taxa,modulo=taxa' (ex.: LOG_SAMPLE_RATES=shipping=0.1)"""
+    rates = {}
+    for part in (raw or '').split(','):
+        if '=' not in part:
+            continue
+        name, rate = part.split('=', 1)
+        try:
+            rates[name.strip()] = max(0.0, min(1.0, float(rate)))
+        except ValueError:
+            pass
+    return rates
+
+
+SAMPLE_RATES = parse_sample_rates(os.getenv('LOG_SAMPLE_RATES'))
+
+
+class lazy_json:
+    """Serializa o objeto só quando o evento é realmente renderizado"""
+
+    __slots__ = ('obj', 'limit', 'indent')
+
+    def __init__(self, obj, limit=None, indent=None):
+        self.obj = obj
+        self.limit = limit
+        self.indent = indent
+
+    def __str__(self):
+        text = json.dumps(self.obj, ensure_ascii=False, default=str, indent=self.indent)
+        if self.limit and len(text) > self.limit:
+            return text[:self.limit] + '...'
+        return text
+
+    __repr__ = __str__
+
+
+class lazy_text:
+    """Trunca textos grandes (ex.: response.text) só na renderização"""
+
+    __slots__ = ('text', 'limit')
+
+    def __init__(self, text, limit=500):
+        self.text = text
+        self.limit = limit
+
+    def __str__(self):
+        text = self.text or ''
+        return text[:self.limit] + '...' if self.limit and len(text) > self.limit else text
+
+    __repr__ = __str__
+
+
+def _sample(logger, method_name, event_dict):
+    """Descarta eventos de DEBUG/INFO conforme a taxa do módulo"""
+    module = event_dict.get('module')
+    rate = SAMPLE_RATES.get(module)
+    if rate is not None and method_name in ('debug', 'info') and random.random() >= rate:
+        raise structlog.DropEvent
+    return event_dict
+
+
+def _render_lazy(logger, method_name, event_dict):
+    for key, value in event_dict.items():
+        if isinstance(value, (lazy_json, lazy_text)):
+            event_dict[key] = str(value)
+    return event_dict
+
+
+_configured = False
+
+
+def configure_logging():
+    global _configured
+    if _configured:
+        return
+    _configured = True
+
+    level = getattr(logging, LOG_LEVEL, logging.INFO)
+    if not STRUCTLOG_AVAILABLE:
+        logging.basicConfig(stream=sys.stdout, level=level, format='%(asctime)s %(levelname)s %(name)s %(message)s')
+        return
+
+    renderer = structlog.processors.JSONRenderer(ensure_ascii=False) if LOG_FORMAT == 'json' \
+        else structlog.dev.ConsoleRenderer(colors=False)
+    structlog.configure(
+        processors=[
+            _sample,
+            structlog.processors.add_log_level,
+            structlog.processors.TimeStamper(fmt='iso', utc=True),
+            structlog.processors.format_exc_info,
+            _render_lazy,
+            renderer,
+        ],
+        wrapper_class=structlog.make_filtering_bound_logger(level),
+        logger_factory=structlog.PrintLoggerFactory(file=sys.stdout),
+        cache_logger_on_first_use=True,
+    )
+
+
+class _StdlibLogger:
+    """Mesma interface (evento + campos) sobre logging quando structlog falta"""
+
+    def __init__(self, name):
+        self._logger = logging.getLogger(name)
+        self._rate = SAMPLE_RATES.get(name)
+
+    def _log(self, level, event, **kw):
+        if not self._logger.isEnabledFor(level):
+            return
+        if self._rate is not None and level <= logging.INFO and random.random() >= self._rate:
+            return
+        fields = ' '.join(f'{k}={v}' for k, v in kw.items())
+        self._logger.log(level, f'{event} {fields}'.rstrip())
+
+    def debug(self, event, **kw):
+        self._log(logging.DEBUG, event, **kw)
+
+    def info(self, event, **kw):
+        self._log(logging.INFO, event, **kw)
+
+    def warning(self, event, **kw):
+        self._log(logging.WARNING, event, **kw)
+
+    def error(self, event, **kw):
+        self._log(logging.ERROR, event, **kw)
+
+    def exception(self, event, **kw):
+        self._logger.exception(event)
+
+    def bind(self, **kw):
+        return self
+
+
+def get_logger(module):
+    """Logger de um módulo/área (chave usada em LOG_SAMPLE_RATES)"""
+    configure_logging()
+    if not STRUCTLOG_AVAILABLE:
+        return _StdlibLogger(module)
+    return structlog.get_logger(module=module)
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Cache LRU em memória com TTL e stale-while-revalidate
+Entradas vencidas ainda podem ser servidas durante a janela de "stale"
+enquanto uma thread em segundo plano recarrega o valor.
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+FRESH = 'fresh'
+STALE = 'stale'
+
+
+class TTLCache:
+    """LRU limitado por número de entradas, com TTL por entrada"""
+
+    def __init__(self, maxsize=256, ttl=300, stale_ttl=0, name='cache'):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.name = name
+
+        self._data = OrderedDict()  # key -> (value, expires_at, stale_until)
+        self._lock = threading.Lock()
+        self._refreshing = set()
+        self._executor = None
+        self._executor_pid = None
+        self._stats = {'hits': 0, 'stale_hits': 0, 'misses': 0, 'evictions': 0, 'refreshes': 0, 'refresh_errors': 0}
+
+    def lookup(self, key):
+        """Devolve (valor, FRESH|STALE) ou (None, None)"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self._stats['misses'] += 1
+                return None, None
+            value, expires_at, stale_until = entry
+            if now < expires_at:
+                self._data.move_to_end(key)
+                self._stats['hits'] += 1
+                return value, FRESH
+            if now < stale_until:
+                self._data.move_to_end(key)
+                self._stats['stale_hits'] += 1
+                return value, STALE
+            del self._data[key]
+            self._stats['misses'] += 1
+            return None, None
+
+    def get(self, key, default=None):
+        value, state = self.lookup(key)
+        return default if state is None else value
+
+    def set(self, key, value, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        now = time.monotonic()
+        with self._lock:
+            self._data[key] = (value, now + ttl, now + ttl + self.stale_ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self._stats['evictions'] += 1
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def get_or_load(self, key, loader, cacheable=None, ttl=None):
+        """
+        Lê do cache; em miss chama loader() e guarda o resultado se
+        cacheable(resultado) for verdadeiro. Em hit "stale" devolve o valor
+        antigo e agenda o recarregamento em segundo plano.
+        Devolve (valor, cached) onde cached indica se veio do cache.
+        """
+        value, state = self.lookup(key)
+        if state == FRESH:
+            return value, True
+        if state == STALE:
+            self._refresh_async(key, loader, cacheable, ttl)
+            return value, True
+
+        value = loader()
+        if cacheable is None or cacheable(value):
+            self.set(key, value, ttl)
+        return value, False
+
+    def _get_executor(self):
+        # Pool criado sob demanda em cada worker (threads não sobrevivem ao fork)
+        pid = os.getpid()
+        if self._executor is None or self._executor_pid != pid:
+            self._executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix=f'{self.name}-refresh')
+            self._executor_pid = pid
+        return self._executor
+
+    def _refresh_async(self, key, loader, cacheable, ttl):
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+            executor = self._get_executor()
+
+        def _refresh():
+            try:
+                value = loader()
+                if cacheable is None or cacheable(value):
+                    self.set(key, value, ttl)
+                    with self._lock:
+                        self._stats['refreshes'] += 1
+            except Exception as e:
+                with self._lock:
+                    self._stats['refresh_errors'] += 1
+                print(f'⚠️ Falha ao recarregar {self.name} {key}: {e}')
+            finally:
+                with self._lock:
+                    self._refreshing.discard(key)
+
+        executor.submit(_refresh)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['size'] = len(self._data)
+        lookups = stats['hits'] + stats['stale_hits'] + stats['misses']
+        stats['maxsize'] = self.maxsize
+        stats['hit_rate'] = round((stats['hits'] + stats['stale_hits']) / lookups, 3) if lookups else 0.0
+        return stats
@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+"""
+Captura amostrada de respostas do AliExpress
+Uma fração configurável das respostas vai para um anel em memória de tamanho
+fixo; uma thread em segundo plano descarrega o anel em segmentos .jsonl.gz
+com tamanho máximo, apagando os mais antigos quando o total passa do limite.
+Substitui os arquivos JSON gravados em logs/ a cada requisição.
+"""
+
+import gzip
+import json
+import os
+import random
+import re
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+SEGMENT_PREFIX = 'capture-'
+SEGMENT_SUFFIX = '.jsonl.gz'
+_SEGMENT_RE = re.compile(r'^capture-[0-9T-]+-\d+-\d+\.jsonl\.gz$')
+
+# Parâmetros que nunca devem ir para o disco
+REDACTED_PARAMS = {'access_token', 'sign', 'app_key', 'refresh_token'}
+
+# Métodos com dados pessoais do comprador (nome, endereço, telefone) nos
+# parâmetros e na resposta: nunca entram na captura
+NON_CAPTURED_METHODS = {'aliexpress.ds.order.create', 'aliexpress.ds.order.tracking.get'}
+
+
+class CaptureBuffer:
+    """Anel em memória + descarga assíncrona para segmentos gzip"""
+
+    def __init__(self, directory=None, sample_rate=None, ring_size=None,
+                 segment_bytes=None, max_total_bytes=None, flush_interval=None):
+        self.directory = directory or os.getenv('CAPTURE_DIR', os.path.join('logs', 'captures'))
+        self.sample_rate = sample_rate if sample_rate is not None else float(os.getenv('CAPTURE_SAMPLE_RATE', '0.05'))
+        self.ring_size = ring_size or int(os.getenv('CAPTURE_RING_SIZE', '100'))
+        self.segment_bytes = segment_bytes or int(os.getenv('CAPTURE_SEGMENT_BYTES', str(2 * 1024 * 1024)))
+        self.max_total_bytes = max_total_bytes or int(os.getenv('CAPTURE_MAX_BYTES', str(50 * 1024 * 1024)))
+        self.flush_interval = flush_interval or float(os.getenv('CAPTURE_FLUSH_INTERVAL', '10'))
+
+        self._ring = deque(maxlen=self.ring_size)
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+        self._thread_pid = None
+        self._segment = None
+        self._segment_seq = 0
+        self._stats = {'seen': 0, 'sampled': 0, 'dropped': 0, 'flushed': 0, 'flush_errors': 0}
+
+    @property
+    def enabled(self):
+        return self.sample_rate > 0
+
+    def record(self, kind, key=None, body=None, meta=None):
+        """Registra uma resposta (amostrada). Não faz I/O nem serialização."""
+        if not self.enabled or kind in NON_CAPTURED_METHODS:
+            return False
+        with self._lock:
+            self._stats['seen'] += 1
+            if self.sample_rate < 1 and random.random() >= self.sample_rate:
+                return False
+            if len(self._ring) == self._ring.maxlen:
+                self._stats['dropped'] += 1
+            self._ring.append({
+                'ts': time.time(),
+                'kind': kind,
+                'key': key,
+                'meta': meta or {},
+                'body': body,
+            })
+            self._stats['sampled'] += 1
+        self._ensure_thread()
+        return True
+
+    def recent(self, limit=20):
+        """Capturas ainda em memória (mais recentes primeiro)"""
+        with self._lock:
+            items = list(self._ring)[-limit:]
+        return list(reversed(items))
+
+    # ---------- descarga em segundo plano ----------
+
+    def _ensure_thread(self):
+        pid = os.getpid()
+        if self._thread is not None and self._thread_pid == pid and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._thread_pid == pid and self._thread.is_alive():
+                return
+            self._segment = None
+            self._thread = threading.Thread(target=self._run, name='capture-flusher', daemon=True)
+            self._thread_pid = pid
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                with self._lock:
+                    self._stats['flush_errors'] += 1
+                print(f'⚠️ Falha ao gravar capturas: {e}')
+
+    def flush(self):
+        with self._lock:
+            items = list(self._ring)
+            self._ring.clear()
+        if not items:
+            return 0
+
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._current_segment()
+        # Cada descarga é um membro gzip novo no mesmo segmento (gzip aceita concatenação)
+        with open(path, 'ab') as raw:
+            with gzip.GzipFile(fileobj=raw, mode='wb') as gz:
+                for item in items:
+                    gz.write(json.dumps(item, ensure_ascii=False, default=str).encode('utf-8'))
+                    gz.write(b'\n')
+
+        with self._lock:
+            self._stats['flushed'] += len(items)
+        self._enforce_cap()
+        return len(items)
+
+    def _current_segment(self):
+        if self._segment and os.path.exists(self._segment) and os.path.getsize(self._segment) < self.segment_bytes:
+            return self._segment
+        self._segment_seq += 1
+        stamp = datetime.utcnow().strftime('%Y%m%dT%H%M%S')
+        name = f'{SEGMENT_PREFIX}{stamp}-{os.getpid()}-{self._segment_seq}{SEGMENT_SUFFIX}'
+        self._segment = os.path.join(self.directory, name)
+        return self._segment
+
+    def _enforce_cap(self):
+        segments = self.list_segments()
+        total = sum(s['size'] for s in segments)
+        # list_segments vem do mais novo para o mais antigo
+        for segment in reversed(segments):
+            if total <= self.max_total_bytes:
+                break
+            if os.path.join(self.directory, segment['name']) == self._segment:
+                continue
+            try:
+                os.remove(os.path.join(self.directory, segment['name']))
+                total -= segment['size']
+            except OSError:
+                pass
+
+    # ---------- leitura ----------
+
+    def list_segments(self):
+        try:
+            names = [n for n in os.listdir(self.directory) if _SEGMENT_RE.match(n)]
+        except FileNotFoundError:
+            return []
+        segments = []
+        for name in names:
+            path = os.path.join(self.directory, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            segments.append({
+                'name': name,
+                'size': stat.st_size,
+                'modified_at': datetime.utcfromtimestamp(stat.st_mtime).isoformat()
+            })
+        segments.sort(key=lambda s: s['modified_at'], reverse=True)
+        return segments
+
+    def segment_path(self, name):
+        """Caminho de um segmento pelo nome (None se inválido ou inexistente)"""
+        if not _SEGMENT_RE.match(name or ''):
+            return None
+        path = os.path.join(self.directory, name)
+        return path if os.path.isfile(path) else None
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['in_memory'] = len(self._ring)
+        stats['sample_rate'] = self.sample_rate
+        stats['ring_size'] = self.ring_size
+        return stats
+
+
+def redact_params(params):
+    """Parâmetros da chamada sem credenciais"""
+    return {k: v for k, v in (params or {}).items() if k not in REDACTED_PARAMS}
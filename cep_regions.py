@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Tabela de faixas de CEP → UF, capital, região e prazos
+Carregada uma vez de data/cep_ranges.csv para listas ordenadas pelo início
+da faixa; a busca é binária (bisect) sobre os 5 primeiros dígitos do CEP.
+"""
+
+import bisect
+import csv
+import math
+import os
+from collections import namedtuple
+
+CEP_RANGES_FILE = os.getenv('CEP_RANGES_FILE', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'cep_ranges.csv'))
+
+# capital_code: código IATA do aeroporto da capital (referência interna, não é o cityCode do AliExpress)
+CepRegion = namedtuple('CepRegion', ['uf', 'capital_code', 'region', 'economy_days', 'express_days', 'lat', 'lon'])
+
+# Prazo do frete próprio quando o CEP não está em nenhuma faixa
+DEFAULT_DELIVERY_DAYS = {'economy': 10, 'express': 5}
+
+
+def _load_table(path):
+    rows = []
+    with open(path, newline='', encoding='utf-8') as f:
+        for row in csv.DictReader(f):
+            rows.append((int(row['start']), int(row['end']), CepRegion(
+                row['uf'], row['capital_code'], row['region'],
+                int(row['economy_days']), int(row['express_days']),
+                float(row['lat']), float(row['lon'])
+            )))
+    rows.sort(key=lambda r: r[0])
+    return [r[0] for r in rows], [r[1] for r in rows], [r[2] for r in rows]
+
+
+_STARTS, _ENDS, _REGIONS = _load_table(CEP_RANGES_FILE)
+
+# Uma entrada por UF (a primeira faixa de cada uma)
+UF_REGIONS = {}
+for _region in _REGIONS:
+    UF_REGIONS.setdefault(_region.uf, _region)
+
+
+def normalize_cep(cep):
+    """Somente dígitos, 8 posições (None se inválido)"""
+    digits = ''.join(ch for ch in str(cep or '') if ch.isdigit())
+    return digits if len(digits) == 8 else None
+
+
+def region_for_cep(cep):
+    """CepRegion do CEP ou None quando fora das faixas"""
+    digits = normalize_cep(cep)
+    if not digits:
+        return None
+    prefix = int(digits[:5])
+    i = bisect.bisect_right(_STARTS, prefix) - 1
+    if i < 0 or prefix > _ENDS[i]:
+        return None
+    return _REGIONS[i]
+
+
+def uf_for_cep(cep):
+    """UF do CEP ou None quando fora das faixas"""
+    region = region_for_cep(cep)
+    return region.uf if region else None
+
+
+def delivery_days_for_cep(cep):
+    """Prazos (dias úteis) do frete próprio para o CEP: {'economy', 'express'}"""
+    region = region_for_cep(cep)
+    if not region:
+        return dict(DEFAULT_DELIVERY_DAYS)
+    return {'economy': region.economy_days, 'express': region.express_days}
+
+
+def uf_distance_km(a, b):
+    """Distância aproximada (haversine) entre as capitais de duas UFs"""
+    if a == b:
+        return 0.0
+    ra, rb = UF_REGIONS[a], UF_REGIONS[b]
+    p1, p2 = math.radians(ra.lat), math.radians(rb.lat)
+    dp, dl = p2 - p1, math.radians(rb.lon - ra.lon)
+    h = math.sin(dp / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(dl / 2) ** 2
+    return 6371.0 * 2 * math.asin(math.sqrt(h))
+
+
+def nearest_uf(uf, candidates):
+    """UF de candidates mais próxima de uf (ela mesma quando presente)"""
+    candidates = [c for c in candidates if c in UF_REGIONS]
+    if not candidates or uf not in UF_REGIONS:
+        return None
+    if uf in candidates:
+        return uf
+    return min(candidates, key=lambda c: uf_distance_km(uf, c))
+
+
+def range_table():
+    """Cópia das faixas ordenadas: (inícios, fins, CepRegion) para uso vetorizado"""
+    return list(_STARTS), list(_ENDS), list(_REGIONS)
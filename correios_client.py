@@ -0,0 +1,290 @@
+#!/usr/bin/env python3
+"""
+Cliente do CalcPrecoPrazo dos Correios
+Pool de conexões keep-alive, timeout adaptativo (média móvel da latência),
+cache por (origem, prefixo do CEP, faixa de peso, serviço) e uma tabela de
+preços local (sqlite) alimentada pelas respostas bem-sucedidas. Com o
+serviço lento ou fora do ar a cotação sai da tabela, sem esperar.
+"""
+
+import math
+import os
+import sqlite3
+import threading
+import time
+import xml.etree.ElementTree as ET
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from cache import TTLCache
+from cep_regions import normalize_cep, uf_for_cep
+from file_lock import persistent_state_dir
+
+CALC_URL = 'https://ws.correios.com.br/calculador/CalcPrecoPrazo.asmx/CalcPrecoPrazo'
+
+SERVICE_NAMES = {
+    '04510': 'PAC',
+    '04014': 'SEDEX',
+}
+
+CONNECT_TIMEOUT = 1.5
+
+
+def weight_bucket(weight):
+    """Faixa de peso (kg) usada na cotação: 0,5 kg até 2 kg, depois 1 kg"""
+    weight = max(0.1, float(weight or 0.5))
+    if weight <= 2:
+        return math.ceil(weight * 2) / 2
+    return float(math.ceil(weight))
+
+
+def _to_float(text, default=0.0):
+    """Valor dos Correios ("1.234,50") em float"""
+    text = str(text or '').replace('R$', '').strip()
+    if ',' in text:
+        text = text.replace('.', '').replace(',', '.')
+    try:
+        return float(text)
+    except ValueError:
+        return default
+
+
+class RateTable:
+    """Preços aprendidos das respostas dos Correios (sqlite local)"""
+
+    def __init__(self, path=None):
+        self.path = path or os.getenv('CORREIOS_RATE_TABLE', os.path.join(persistent_state_dir('correios'), 'rates.sqlite'))
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS rates ('
+                ' prefix TEXT, uf TEXT, weight REAL, service TEXT,'
+                ' price REAL, days INTEGER, updated_at REAL,'
+                ' PRIMARY KEY (prefix, weight, service))'
+            )
+            conn.execute('CREATE INDEX IF NOT EXISTS rates_uf ON rates (uf, weight, service)')
+
+    def _connect(self):
+        # Uma conexão por operação: seguro entre threads e workers
+        return sqlite3.connect(self.path, timeout=2)
+
+    def store(self, prefix, uf, weight, service, price, days):
+        with self._connect() as conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO rates VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (prefix, uf, weight, service, price, days, time.time())
+            )
+
+    def lookup(self, prefix, uf, weight, service):
+        """(preço, prazo, precisão) pelo prefixo exato ou pela média da UF"""
+        with self._connect() as conn:
+            row = conn.execute(
+                'SELECT price, days FROM rates WHERE prefix = ? AND weight = ? AND service = ?',
+                (prefix, weight, service)
+            ).fetchone()
+            if row:
+                return row[0], row[1], 'prefix'
+            if uf:
+                row = conn.execute(
+                    'SELECT AVG(price), MAX(days) FROM rates WHERE uf = ? AND weight = ? AND service = ?',
+                    (uf, weight, service)
+                ).fetchone()
+                if row and row[0] is not None:
+                    return round(row[0], 2), row[1], 'uf'
+        return None
+
+    def size(self):
+        with self._connect() as conn:
+            return conn.execute('SELECT COUNT(*) FROM rates').fetchone()[0]
+
+
+class CorreiosClient:
+    """Cotações dos Correios: cache → serviço (timeout curto) → tabela local"""
+
+    def __init__(self, origin_cep=None, services=None, pool_size=None, rate_table=None):
+        self.origin_cep = normalize_cep(origin_cep or os.getenv('CORREIOS_ORIGIN_CEP', '01001000'))
+        self.services = services or [s.strip() for s in os.getenv('CORREIOS_SERVICES', '04510').split(',') if s.strip()]
+        self.pool_size = pool_size or int(os.getenv('CORREIOS_POOL_SIZE', '10'))
+        self.min_timeout = float(os.getenv('CORREIOS_MIN_TIMEOUT', '1.5'))
+        self.max_timeout = float(os.getenv('CORREIOS_MAX_TIMEOUT', '5'))
+        # Falhas seguidas que abrem o circuito e por quanto tempo (segundos)
+        self.failure_threshold = int(os.getenv('CORREIOS_FAILURE_THRESHOLD', '3'))
+        self.cooldown = float(os.getenv('CORREIOS_COOLDOWN', '60'))
+        self.rate_table = rate_table or RateTable()
+        self.cache = TTLCache(
+            maxsize=int(os.getenv('CORREIOS_CACHE_SIZE', '4096')),
+            ttl=int(os.getenv('CORREIOS_CACHE_TTL', '21600')),
+            name='correios'
+        )
+
+        self._session = None
+        self._session_pid = None
+        self._lock = threading.Lock()
+        self._latency_ewma = None
+        self._failures = 0
+        self._open_until = 0.0
+        self._stats = {'calls': 0, 'errors': 0, 'timeouts': 0, 'rate_table': 0, 'short_circuited': 0}
+
+    def _get_session(self):
+        """Cria a sessão sob demanda (e de novo após fork do gunicorn)"""
+        pid = os.getpid()
+        if self._session is None or self._session_pid != pid:
+            with self._lock:
+                if self._session is None or self._session_pid != pid:
+                    session = requests.Session()
+                    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size, max_retries=0)
+                    session.mount('https://', adapter)
+                    self._session = session
+                    self._session_pid = pid
+        return self._session
+
+    @property
+    def timeout(self):
+        """Timeout de leitura: 3x a latência média, entre min e max"""
+        with self._lock:
+            ewma = self._latency_ewma
+        if ewma is None:
+            return self.max_timeout
+        return max(self.min_timeout, min(self.max_timeout, ewma * 3))
+
+    def _record(self, elapsed=None, error=False, timeout=False):
+        with self._lock:
+            self._stats['calls'] += 1
+            if error:
+                self._stats['errors'] += 1
+                if timeout:
+                    self._stats['timeouts'] += 1
+                    # Timeout conta como latência máxima para o próximo cálculo
+                    elapsed = self.max_timeout
+                self._failures += 1
+                if self._failures >= self.failure_threshold:
+                    self._open_until = time.monotonic() + self.cooldown
+            else:
+                self._failures = 0
+            if elapsed is not None:
+                self._latency_ewma = elapsed if self._latency_ewma is None else 0.8 * self._latency_ewma + 0.2 * elapsed
+
+    def available(self):
+        """False enquanto o circuito está aberto (serviço lento ou fora do ar)"""
+        with self._lock:
+            return time.monotonic() >= self._open_until
+
+    def _fetch(self, destination, weight, dimensions, timeout=None):
+        dimensions = dimensions or {}
+        params = {
+            'nCdEmpresa': '',
+            'sDsSenha': '',
+            'nCdServico': ','.join(self.services),
+            'sCepOrigem': self.origin_cep,
+            'sCepDestino': destination,
+            'nVlPeso': str(weight),
+            'nCdFormato': '1',  # Caixa/Pacote
+            'nVlComprimento': str(dimensions.get('length', 20)),
+            'nVlAltura': str(dimensions.get('height', 10)),
+            'nVlLargura': str(dimensions.get('width', 15)),
+            'nVlDiametro': '0',
+            'sCdMaoPropria': 'N',
+            'nVlValorDeclarado': '0',
+            'sCdAvisoRecebimento': 'N'
+        }
+        # O prazo de quem chama limita o timeout adaptativo
+        read_timeout = self.timeout if timeout is None else min(self.timeout, timeout)
+        started = time.perf_counter()
+        try:
+            response = self._get_session().get(CALC_URL, params=params, timeout=(CONNECT_TIMEOUT, read_timeout))
+            response.raise_for_status()
+            # Parse direto dos bytes; o parser respeita o encoding declarado no XML
+            root = ET.fromstring(response.content)
+        except requests.Timeout:
+            self._record(error=True, timeout=True)
+            raise
+        except Exception:
+            self._record(time.perf_counter() - started, error=True)
+            raise
+        self._record(time.perf_counter() - started)
+
+        results = {}
+        for servico in root.iter():
+            if not servico.tag.endswith('cServico'):
+                continue
+            fields = {child.tag.rsplit('}', 1)[-1]: (child.text or '') for child in servico}
+            if fields.get('Erro', '0') not in ('0', '', '010', '011'):
+                continue
+            price = _to_float(fields.get('Valor'))
+            if price <= 0:
+                continue
+            results[fields.get('Codigo') or self.services[0]] = {
+                'price': price,
+                'days': int(fields.get('PrazoEntrega') or 5),
+            }
+        return results
+
+    def quote(self, destination_cep, weight, dimensions=None, timeout=None):
+        """
+        Cotações por serviço: lista de dicts com service, price, days e
+        source (cache | live | rate_table). Lista vazia quando não há
+        nenhuma fonte para o destino. timeout (segundos) é o que resta do
+        prazo de quem chama; abaixo de min_timeout nem tenta o serviço.
+        """
+        destination = normalize_cep(destination_cep)
+        if not destination:
+            return []
+        prefix = destination[:5]
+        uf = uf_for_cep(destination)
+        bucket = weight_bucket(weight)
+
+        quotes = {}
+        missing = []
+        for service in self.services:
+            hit = self.cache.get((self.origin_cep, prefix, bucket, service))
+            if hit is not None:
+                quotes[service] = dict(hit, source='cache')
+            else:
+                missing.append(service)
+
+        if missing and self.available() and (timeout is None or timeout >= self.min_timeout):
+            try:
+                live = self._fetch(destination, bucket, dimensions, timeout)
+                for service, entry in live.items():
+                    self.cache.set((self.origin_cep, prefix, bucket, service), entry)
+                    try:
+                        self.rate_table.store(prefix, uf, bucket, service, entry['price'], entry['days'])
+                    except sqlite3.Error as e:
+                        print(f'⚠️ Falha ao gravar tabela de preços dos Correios: {e}')
+                    if service in missing:
+                        quotes[service] = dict(entry, source='live')
+                missing = [s for s in missing if s not in quotes]
+            except Exception as e:
+                print(f'⚠️ Correios indisponível ({type(e).__name__}): {e}')
+        elif missing:
+            with self._lock:
+                self._stats['short_circuited'] += 1
+
+        for service in missing:
+            try:
+                row = self.rate_table.lookup(prefix, uf, bucket, service)
+            except sqlite3.Error:
+                row = None
+            if row:
+                price, days, precision = row
+                quotes[service] = {'price': price, 'days': days, 'source': 'rate_table', 'precision': precision}
+                with self._lock:
+                    self._stats['rate_table'] += 1
+
+        return [dict(entry, service=service, weight_bucket=bucket) for service, entry in quotes.items()]
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['latency_ewma_ms'] = round(self._latency_ewma * 1000, 1) if self._latency_ewma is not None else None
+            stats['circuit_open'] = time.monotonic() < self._open_until
+        stats['timeout'] = round(self.timeout, 2)
+        stats['cache'] = self.cache.stats()
+        try:
+            stats['rate_table_size'] = self.rate_table.size()
+        except sqlite3.Error:
+            stats['rate_table_size'] = None
+        return stats
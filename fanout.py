@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Execução concorrente limitada (fan-out)
+Dispara uma função para vários itens com número máximo de workers e um prazo
+global, devolvendo os resultados conforme ficam prontos.
+"""
+
+import os
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+DEFAULT_MAX_WORKERS = int(os.getenv('FANOUT_MAX_WORKERS', '8'))
+
+# Resultado de um item: value preenchido em caso de sucesso, error caso contrário
+FanOutResult = namedtuple('FanOutResult', ['item', 'value', 'error', 'elapsed'])
+
+
+class DeadlineExceeded(Exception):
+    """O prazo global terminou antes de o item ser concluído"""
+
+
+def fan_out(func, items, max_workers=None, deadline=None):
+    """
+    Executa func(item) para cada item com no máximo max_workers em paralelo.
+
+    deadline é um instante absoluto de time.monotonic(). Itens que não
+    terminarem a tempo são devolvidos com error=DeadlineExceeded; itens que
+    ainda nem começaram são cancelados.
+
+    É um gerador: cada FanOutResult sai assim que o item termina.
+    """
+    items = list(items)
+    if not items:
+        return
+
+    max_workers = max(1, min(max_workers or DEFAULT_MAX_WORKERS, len(items)))
+    executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='fanout')
+    started = {}
+    pending = {}
+
+    def _run(index, item):
+        started[index] = time.monotonic()
+        return func(item)
+
+    t0 = time.monotonic()
+    try:
+        for index, item in enumerate(items):
+            pending[executor.submit(_run, index, item)] = (index, item)
+
+        while pending:
+            timeout = None
+            if deadline is not None:
+                timeout = max(0.0, deadline - time.monotonic())
+            done, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+
+            if not done:
+                # Prazo esgotado: devolve o que sobrou como erro
+                for future, (index, item) in pending.items():
+                    future.cancel()
+                    elapsed = time.monotonic() - started.get(index, t0)
+                    yield FanOutResult(item, None, DeadlineExceeded('prazo global esgotado'), elapsed)
+                pending.clear()
+                break
+
+            for future in done:
+                index, item = pending.pop(future)
+                elapsed = time.monotonic() - started.get(index, t0)
+                try:
+                    value, error = future.result(), None
+                except Exception as e:
+                    value, error = None, e
+                yield FanOutResult(item, value, error, elapsed)
+    finally:
+        # Não espera threads presas em I/O além do prazo
+        executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+"""
+Catálogo de nomes de feeds (aliexpress.ds.feedname.get) em cache
+A lista muda pouco: fica em memória por ttl segundos e, vencida, continua
+servindo enquanto um recálculo roda em segundo plano. Toda lista obtida com
+sucesso vira o "último snapshot bom" (arquivo local + Firestore, quando
+disponível), usado quando a API falha ou ainda não há token.
+"""
+
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from file_lock import persistent_state_dir
+from singleflight import SingleFlight
+
+
+def parse_feed_names(data):
+    """Resposta do feedname.get → [{'feed_name', 'description', 'product_count'}]"""
+    response = (data or {}).get('aliexpress_ds_feedname_get_response') or {}
+    result = (response.get('resp_result') or {}).get('result') or {}
+
+    if 'feed_name_list' in result:
+        promos = result['feed_name_list']
+    else:
+        promos = result.get('promos') or []
+        if isinstance(promos, dict):
+            promos = promos.get('promo') or []
+    if isinstance(promos, dict):
+        promos = [promos]
+
+    feeds = []
+    for promo in promos:
+        if not isinstance(promo, dict):
+            continue
+        name = promo.get('promo_name') or promo.get('feed_name')
+        if not name:
+            continue
+        try:
+            count = int(promo.get('product_num', 0) or 0)
+        except (TypeError, ValueError):
+            count = 0
+        feeds.append({
+            'feed_name': name,
+            'description': promo.get('promo_desc') or promo.get('feed_desc') or '',
+            'product_count': count,
+        })
+    return feeds
+
+
+class FeedCatalog:
+    """memória → snapshot local → Firestore → API; recálculo em segundo plano"""
+
+    def __init__(self, fetch_fn, collection_factory=None, ttl=None, retry_interval=None, snapshot_path=None):
+        # fetch_fn() devolve a lista normalizada (parse_feed_names) ou levanta exceção
+        self.fetch_fn = fetch_fn
+        # collection_factory() devolve a coleção do Firestore (None = só arquivo local)
+        self.collection_factory = collection_factory
+        self.ttl = ttl if ttl is not None else int(os.getenv('FEED_CATALOG_TTL', str(6 * 3600)))
+        self.retry_interval = retry_interval if retry_interval is not None else int(os.getenv('FEED_CATALOG_RETRY_INTERVAL', '300'))
+        self.snapshot_path = snapshot_path or os.getenv(
+            'FEED_CATALOG_SNAPSHOT', os.path.join(persistent_state_dir('feeds'), 'catalog.json')
+        )
+        self._lock = threading.Lock()
+        self._feeds = None
+        self._fetched_at = 0.0
+        self._source = None
+        self._last_error = None
+        self._last_attempt = None
+        self._refreshing = False
+        # Uma consulta à API por vez neste processo; concorrentes esperam por ela
+        self._flight = SingleFlight()
+        self._executor = None
+        self._executor_pid = None
+        self._stats = {'hits': 0, 'refreshes': 0, 'refresh_errors': 0, 'snapshot_loads': 0}
+
+    def _doc(self):
+        collection = self.collection_factory() if self.collection_factory else None
+        if collection is None:
+            return None
+        # Fallback para versões antigas do Firebase Admin SDK
+        try:
+            return collection.doc('latest')
+        except AttributeError:
+            return collection.document('latest')
+
+    def _load_snapshot(self):
+        """Último snapshot bom: arquivo local (compartilhado entre workers) ou Firestore"""
+        try:
+            with open(self.snapshot_path, encoding='utf-8') as f:
+                snapshot = json.load(f)
+            if snapshot.get('feeds'):
+                return snapshot['feeds'], snapshot.get('fetched_at', 0.0), 'snapshot'
+        except (OSError, ValueError):
+            pass
+        try:
+            doc = self._doc()
+            if doc is not None:
+                snap = doc.get()
+                if snap and snap.exists:
+                    data = snap.to_dict() or {}
+                    if data.get('feeds'):
+                        return data['feeds'], data.get('fetched_at', 0.0), 'firestore'
+        except Exception as e:
+            print(f'⚠️ Falha ao ler snapshot do catálogo de feeds: {e}')
+        return None, 0.0, None
+
+    def _save_snapshot(self, feeds, fetched_at):
+        snapshot = {'feeds': feeds, 'fetched_at': fetched_at}
+        try:
+            tmp = f'{self.snapshot_path}.{os.getpid()}.tmp'
+            with open(tmp, 'w', encoding='utf-8') as f:
+                json.dump(snapshot, f, ensure_ascii=False)
+            os.replace(tmp, self.snapshot_path)
+        except OSError as e:
+            print(f'⚠️ Falha ao gravar snapshot do catálogo de feeds: {e}')
+        try:
+            doc = self._doc()
+            if doc is not None:
+                doc.set(snapshot)
+        except Exception as e:
+            print(f'⚠️ Falha ao gravar catálogo de feeds no Firestore: {e}')
+
+    def refresh(self):
+        """Busca a lista na API; só substitui o snapshot quando vem não vazia"""
+        with self._lock:
+            self._last_attempt = time.monotonic()
+        try:
+            feeds = self.fetch_fn()
+            if not feeds:
+                raise ValueError('API devolveu lista de feeds vazia')
+        except Exception as e:
+            with self._lock:
+                self._last_error = str(e)
+                self._stats['refresh_errors'] += 1
+            print(f'⚠️ Falha ao atualizar catálogo de feeds: {e}')
+            return False
+        fetched_at = time.time()
+        with self._lock:
+            self._feeds, self._fetched_at, self._source = feeds, fetched_at, 'live'
+            self._last_error = None
+            self._stats['refreshes'] += 1
+        self._save_snapshot(feeds, fetched_at)
+        return True
+
+    def _retry_wait(self):
+        """Segundos até poder tentar a API de novo (0 = já pode)"""
+        with self._lock:
+            if self._last_attempt is None:
+                return 0.0
+            return max(0.0, self.retry_interval - (time.monotonic() - self._last_attempt))
+
+    def _refresh_once(self):
+        return self._flight.do('refresh', self.refresh)
+
+    def _get_executor(self):
+        # Pool criado sob demanda em cada worker (threads não sobrevivem ao fork)
+        pid = os.getpid()
+        if self._executor is None or self._executor_pid != pid:
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='feed-catalog')
+            self._executor_pid = pid
+        return self._executor
+
+    def _schedule_refresh(self):
+        with self._lock:
+            if self._refreshing or (
+                self._last_attempt is not None and time.monotonic() - self._last_attempt < self.retry_interval
+            ):
+                return
+            self._refreshing = True
+            executor = self._get_executor()
+
+        def _run():
+            try:
+                # Outro worker pode já ter renovado o snapshot compartilhado
+                feeds, fetched_at, source = self._load_snapshot()
+                if feeds is not None and time.time() - fetched_at <= self.ttl:
+                    with self._lock:
+                        self._feeds, self._fetched_at, self._source = feeds, fetched_at, source
+                    return
+                self._refresh_once()
+            finally:
+                with self._lock:
+                    self._refreshing = False
+
+        executor.submit(_run)
+
+    def get(self, force=False):
+        """
+        (feeds, meta). meta: source (live | memory | snapshot | firestore),
+        age (s), stale e error. Lista vazia só quando nunca houve sucesso.
+        """
+        if force:
+            self._refresh_once()
+
+        with self._lock:
+            feeds, fetched_at, source = self._feeds, self._fetched_at, self._source
+        if feeds is None:
+            feeds, fetched_at, source = self._load_snapshot()
+            if feeds is not None:
+                with self._lock:
+                    self._stats['snapshot_loads'] += 1
+                    if self._feeds is None:
+                        self._feeds, self._fetched_at, self._source = feeds, fetched_at, source
+
+        if feeds is None:
+            # Primeira vez sem snapshot: uma espera pela API, compartilhada entre as
+            # requisições concorrentes; depois de falhar, só tenta de novo após retry_interval
+            if self._retry_wait() <= 0:
+                self._refresh_once()
+            with self._lock:
+                feeds, fetched_at, source = self._feeds, self._fetched_at, self._source
+        elif not force:
+            with self._lock:
+                self._stats['hits'] += 1
+                if source == 'live':
+                    source = 'memory'
+
+        age = time.time() - fetched_at if feeds is not None else None
+        stale = age is not None and age > self.ttl
+        if stale:
+            self._schedule_refresh()
+        with self._lock:
+            error = self._last_error
+        meta = {'source': source, 'age': round(age, 1) if age is not None else None, 'stale': stale, 'error': error}
+        return [dict(f) for f in (feeds or [])], meta
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['feeds'] = len(self._feeds) if self._feeds is not None else None
+            stats['age'] = round(time.time() - self._fetched_at, 1) if self._feeds is not None else None
+            stats['refreshing'] = self._refreshing
+            stats['last_error'] = self._last_error
+        stats['ttl'] = self.ttl
+        return stats
@@ -0,0 +1,275 @@
+#!/usr/bin/env python3
+"""
+Leitura retomável dos IDs de um feed (aliexpress.ds.feed.itemids.get)
+Cada feed tem um checkpoint local (sqlite): ciclo atual, cursor (search_id)
+ou próxima página, páginas lidas e os IDs já vistos no ciclo. Cada execução
+lê no máximo page_budget páginas / time_budget segundos a partir do
+checkpoint, que é gravado a cada página; falhas no meio não perdem o que já
+foi lido. Ao chegar ao fim do feed o ciclo fecha e o próximo recomeça.
+
+IDs vistos ficam pendentes até quem os consome confirmar (mark_done) que o
+produto foi gravado; a execução seguinte devolve de novo os pendentes
+(até max_attempts tentativas), então falhas no detalhe ou um job
+interrompido não deixam produtos de fora até o próximo ciclo.
+
+Com search_id a API pagina por cursor e as páginas saem em sequência; sem
+ele, as páginas (page_no) são buscadas em ondas de até concurrency.
+"""
+
+import os
+import sqlite3
+import time
+from collections import namedtuple
+
+from fanout import fan_out
+from file_lock import persistent_state_dir
+
+# Página devolvida por fetch_page: IDs, cursor da próxima (ou None) e total restante (ou None)
+FeedPage = namedtuple('FeedPage', ['ids', 'search_id', 'total'])
+
+
+class CrawlCheckpointStore:
+    """Checkpoints e IDs vistos por feed/ciclo"""
+
+    def __init__(self, path=None, max_attempts=None):
+        self.path = path or os.getenv('FEED_CRAWL_DB_PATH', os.path.join(persistent_state_dir('feeds'), 'crawl.sqlite'))
+        # Tentativas de processar um ID pendente antes de desistir dele no ciclo
+        self.max_attempts = max_attempts or int(os.getenv('FEED_CRAWL_MAX_ATTEMPTS', '5'))
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS crawl_checkpoints ('
+                ' feed_name TEXT PRIMARY KEY, cycle INTEGER, cursor TEXT, next_page INTEGER,'
+                ' pages INTEGER, total INTEGER, complete INTEGER, updated_at REAL)'
+            )
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS crawl_seen ('
+                ' feed_name TEXT, product_id TEXT, cycle INTEGER,'
+                ' pending INTEGER DEFAULT 1, attempts INTEGER DEFAULT 0,'
+                ' PRIMARY KEY (feed_name, product_id))'
+            )
+            # Tabelas criadas antes das colunas de pendência
+            columns = {r[1] for r in conn.execute('PRAGMA table_info(crawl_seen)')}
+            if 'pending' not in columns:
+                conn.execute('ALTER TABLE crawl_seen ADD COLUMN pending INTEGER DEFAULT 0')
+            if 'attempts' not in columns:
+                conn.execute('ALTER TABLE crawl_seen ADD COLUMN attempts INTEGER DEFAULT 0')
+            conn.execute('CREATE INDEX IF NOT EXISTS crawl_seen_cycle ON crawl_seen (feed_name, cycle)')
+            conn.execute('CREATE INDEX IF NOT EXISTS crawl_seen_pending ON crawl_seen (feed_name, pending)')
+
+    def _connect(self):
+        # Uma conexão por operação: seguro entre threads e workers
+        return sqlite3.connect(self.path, timeout=10)
+
+    def load(self, feed_name):
+        with self._connect() as conn:
+            row = conn.execute(
+                'SELECT cycle, cursor, next_page, pages, total, complete, updated_at FROM crawl_checkpoints WHERE feed_name = ?',
+                (feed_name,)
+            ).fetchone()
+        if not row:
+            return {'cycle': 0, 'cursor': None, 'next_page': 1, 'pages': 0, 'total': None, 'complete': True, 'updated_at': None}
+        cycle, cursor, next_page, pages, total, complete, updated_at = row
+        return {'cycle': cycle, 'cursor': cursor, 'next_page': next_page, 'pages': pages,
+                'total': total, 'complete': bool(complete), 'updated_at': updated_at}
+
+    def save(self, feed_name, checkpoint):
+        with self._connect() as conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO crawl_checkpoints VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                (feed_name, checkpoint['cycle'], checkpoint['cursor'], checkpoint['next_page'],
+                 checkpoint['pages'], checkpoint['total'], int(checkpoint['complete']), time.time())
+            )
+
+    def add_seen(self, feed_name, cycle, ids):
+        """Marca ids como vistos (e pendentes) no ciclo; devolve os que ainda não tinham sido vistos nele"""
+        ids = list(dict.fromkeys(ids))
+        if not ids:
+            return []
+        with self._connect() as conn:
+            known = set()
+            for start in range(0, len(ids), 500):
+                chunk = ids[start:start + 500]
+                marks = ','.join('?' * len(chunk))
+                known.update(r[0] for r in conn.execute(
+                    f'SELECT product_id FROM crawl_seen WHERE feed_name = ? AND cycle = ? AND product_id IN ({marks})',
+                    (feed_name, cycle, *chunk)
+                ))
+            fresh = [pid for pid in ids if pid not in known]
+            conn.executemany(
+                'INSERT OR REPLACE INTO crawl_seen (feed_name, product_id, cycle, pending, attempts) VALUES (?, ?, ?, 1, 0)',
+                [(feed_name, pid, cycle) for pid in fresh]
+            )
+        return fresh
+
+    def pending_ids(self, feed_name, limit=None):
+        """IDs vistos e ainda não confirmados, com tentativas restantes (mais antigos primeiro)"""
+        query = 'SELECT product_id FROM crawl_seen WHERE feed_name = ? AND pending = 1 AND attempts < ? ORDER BY rowid'
+        args = (feed_name, self.max_attempts)
+        if limit is not None:
+            query += ' LIMIT ?'
+            args += (limit,)
+        with self._connect() as conn:
+            return [r[0] for r in conn.execute(query, args)]
+
+    def _update_pending(self, feed_name, ids, statement):
+        ids = [str(pid) for pid in ids]
+        with self._connect() as conn:
+            for start in range(0, len(ids), 500):
+                chunk = ids[start:start + 500]
+                marks = ','.join('?' * len(chunk))
+                conn.execute(f'{statement} WHERE feed_name = ? AND product_id IN ({marks})', (feed_name, *chunk))
+
+    def mark_done(self, feed_name, ids):
+        """IDs processados (gravados ou sem mudança): saem da pendência"""
+        self._update_pending(feed_name, ids, 'UPDATE crawl_seen SET pending = 0')
+
+    def mark_failed(self, feed_name, ids):
+        """IDs que falharam nesta execução: continuam pendentes, com uma tentativa a mais"""
+        self._update_pending(feed_name, ids, 'UPDATE crawl_seen SET attempts = attempts + 1')
+
+    def pending_count(self, feed_name):
+        with self._connect() as conn:
+            return conn.execute(
+                'SELECT COUNT(*) FROM crawl_seen WHERE feed_name = ? AND pending = 1 AND attempts < ?',
+                (feed_name, self.max_attempts)
+            ).fetchone()[0]
+
+    def cycle_ids(self, feed_name, cycle):
+        with self._connect() as conn:
+            return {r[0] for r in conn.execute(
+                'SELECT product_id FROM crawl_seen WHERE feed_name = ? AND cycle = ?', (feed_name, cycle)
+            )}
+
+    def seen_count(self, feed_name, cycle):
+        with self._connect() as conn:
+            return conn.execute(
+                'SELECT COUNT(*) FROM crawl_seen WHERE feed_name = ? AND cycle = ?', (feed_name, cycle)
+            ).fetchone()[0]
+
+    def prune(self, feed_name, cycle):
+        """Remove IDs de ciclos anteriores (não voltaram a aparecer no feed)"""
+        with self._connect() as conn:
+            conn.execute('DELETE FROM crawl_seen WHERE feed_name = ? AND cycle < ?', (feed_name, cycle))
+
+
+class FeedCrawler:
+    """
+    fetch_page(feed_name, page_no, search_id, page_size) -> FeedPage; exceções
+    interrompem a execução com o checkpoint preservado.
+    """
+
+    def __init__(self, fetch_page, store=None, concurrency=None):
+        self.fetch_page = fetch_page
+        self.store = store or CrawlCheckpointStore()
+        self.concurrency = concurrency or int(os.getenv('FEED_CRAWL_CONCURRENCY', '4'))
+
+    def crawl(self, feed_name, page_size, page_budget, time_budget=None, restart=False, progress=None, retry_limit=None):
+        """
+        Lê até page_budget páginas (None = até o fim do feed) a partir do
+        checkpoint. Devolve dict com
+        ids (pendentes de execuções anteriores, até retry_limit, seguidos dos
+        novos no ciclo), retried, pages, complete, cycle, cycle_ids (todos os
+        IDs do ciclo quando complete) e error. Quem consome os ids confirma
+        com mark_done / mark_failed.
+        """
+        progress = progress or (lambda **fields: None)
+        # Vistos antes e nunca confirmados (falha no detalhe, job interrompido)
+        retried = self.store.pending_ids(feed_name, limit=retry_limit)
+        cp = self.store.load(feed_name)
+        if restart or cp['complete']:
+            cp = dict(cp, cycle=cp['cycle'] + 1, cursor=None, next_page=1, pages=0, total=None, complete=False)
+            self.store.save(feed_name, cp)
+
+        deadline = time.monotonic() + time_budget if time_budget else None
+        new_ids = []
+        pages = 0
+        error = None
+
+        def _accept(page):
+            # Aplica uma página ao checkpoint; True quando o feed terminou
+            nonlocal pages
+            pages += 1
+            cp['pages'] += 1
+            cp['next_page'] += 1
+            new_ids.extend(self.store.add_seen(feed_name, cp['cycle'], page.ids))
+            if page.search_id:
+                cp['cursor'] = page.search_id
+            if page.total is not None:
+                cp['total'] = page.total
+            done = (not page.ids
+                    or (page.total is not None and page.total <= 0)
+                    or (not page.search_id and len(page.ids) < page_size))
+            cp['complete'] = bool(done)
+            self.store.save(feed_name, cp)
+            progress(pages_fetched=cp['pages'], ids_found=len(new_ids), cycle=cp['cycle'])
+            return cp['complete']
+
+        while (page_budget is None or pages < page_budget) and not cp['complete']:
+            if deadline is not None and time.monotonic() >= deadline:
+                break
+            # Sem cursor conhecido depois da 1ª página: ondas de páginas em paralelo
+            wave = 1
+            if cp['cursor'] is None and cp['next_page'] > 1:
+                wave = self.concurrency if page_budget is None else max(1, min(self.concurrency, page_budget - pages))
+
+            if wave == 1:
+                try:
+                    page = self.fetch_page(feed_name, cp['next_page'], cp['cursor'], page_size)
+                except Exception as e:
+                    error = str(e)
+                    if cp['cursor']:
+                        # Cursor pode ter expirado: a próxima execução refaz a cadeia
+                        # (IDs já vistos no ciclo não contam de novo)
+                        cp.update(cursor=None, next_page=1)
+                        self.store.save(feed_name, cp)
+                    break
+                _accept(page)
+                continue
+
+            first = cp['next_page']
+            results = {}
+            for item in fan_out(lambda n: self.fetch_page(feed_name, n, None, page_size),
+                                range(first, first + wave), max_workers=wave, deadline=deadline):
+                results[item.item] = item
+            # Só avança pelas páginas contíguas bem-sucedidas
+            for n in range(first, first + wave):
+                item = results.get(n)
+                if item is None or item.error:
+                    error = str(item.error) if item is not None else 'página não lida'
+                    break
+                if _accept(item.value):
+                    break
+            if error:
+                break
+
+        retried_set = set(retried)
+        result = {
+            'feed_name': feed_name,
+            'ids': retried + [pid for pid in new_ids if pid not in retried_set],
+            'retried': len(retried),
+            'pages': pages,
+            'complete': cp['complete'],
+            'cycle': cp['cycle'],
+            'cycle_pages': cp['pages'],
+            'cycle_ids': None,
+            'error': error,
+        }
+        if cp['complete']:
+            result['cycle_ids'] = self.store.cycle_ids(feed_name, cp['cycle'])
+            self.store.prune(feed_name, cp['cycle'])
+        return result
+
+    def mark_done(self, feed_name, ids):
+        self.store.mark_done(feed_name, ids)
+
+    def mark_failed(self, feed_name, ids):
+        self.store.mark_failed(feed_name, ids)
+
+    def status(self, feed_name):
+        cp = self.store.load(feed_name)
+        cp['seen'] = self.store.seen_count(feed_name, cp['cycle'])
+        cp['pending'] = self.store.pending_count(feed_name)
+        return cp
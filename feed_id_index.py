@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Índice compacto de IDs de produto por feed
+Cada snapshot é um arquivo de uint64 ordenados e sem repetição, lido com
+np.memmap (sem cópia). Guarda o snapshot atual e o anterior de cada feed:
+novos/removidos desde a última sincronização completa e comparações entre
+feeds saem de operações de conjunto sobre arrays ordenados.
+"""
+
+import os
+from urllib.parse import quote, unquote
+
+import numpy as np
+
+from file_lock import persistent_state_dir
+
+_EMPTY = np.empty(0, dtype=np.uint64)
+
+
+def to_id_array(ids):
+    """IDs (str/int) → uint64 ordenados e únicos; ignora IDs não numéricos"""
+    values = []
+    for pid in ids:
+        try:
+            values.append(int(pid))
+        except (TypeError, ValueError):
+            continue
+    return np.unique(np.asarray(values, dtype=np.uint64))
+
+
+def union(*arrays):
+    arrays = [a for a in arrays if len(a)]
+    if not arrays:
+        return _EMPTY
+    return np.unique(np.concatenate(arrays))
+
+
+def intersection(a, b):
+    return np.intersect1d(a, b, assume_unique=True)
+
+
+def difference(a, b):
+    """Elementos de a que não estão em b"""
+    return np.setdiff1d(a, b, assume_unique=True)
+
+
+def contains(index, ids):
+    """Máscara booleana: quais ids estão no array ordenado index"""
+    ids = np.asarray(ids, dtype=np.uint64)
+    if not len(index):
+        return np.zeros(len(ids), dtype=bool)
+    pos = np.searchsorted(index, ids)
+    return index[np.minimum(pos, len(index) - 1)] == ids
+
+
+class FeedIdIndex:
+    """Snapshots current/previous por feed em FEED_ID_INDEX_DIR"""
+
+    def __init__(self, directory=None):
+        self.directory = directory or os.getenv('FEED_ID_INDEX_DIR', os.path.join(persistent_state_dir('feeds'), 'ids'))
+        os.makedirs(self.directory, exist_ok=True)
+
+    def _path(self, feed_name, snapshot):
+        # Nomes de feed têm '&', espaços etc.: codificados de forma reversível
+        return os.path.join(self.directory, f'{quote(feed_name, safe="")}.{snapshot}.u64')
+
+    def load(self, feed_name, snapshot='current'):
+        """Array uint64 ordenado (memmap somente leitura; vazio se não existe)"""
+        path = self._path(feed_name, snapshot)
+        try:
+            if os.path.getsize(path) == 0:
+                return _EMPTY
+            return np.memmap(path, dtype=np.uint64, mode='r')
+        except FileNotFoundError:
+            return _EMPTY
+
+    def save(self, feed_name, ids):
+        """
+        Grava ids como snapshot atual (o atual vira o anterior) e devolve o
+        diff em relação a ele: {'added', 'removed', 'size'} (arrays).
+        """
+        array = ids if isinstance(ids, np.ndarray) and ids.dtype == np.uint64 else to_id_array(ids)
+        current_path = self._path(feed_name, 'current')
+        previous = np.array(self.load(feed_name, 'current'))
+
+        tmp = f'{current_path}.{os.getpid()}.tmp'
+        array.tofile(tmp)
+        if os.path.exists(current_path):
+            os.replace(current_path, self._path(feed_name, 'previous'))
+        os.replace(tmp, current_path)
+        return {'added': difference(array, previous), 'removed': difference(previous, array), 'size': len(array)}
+
+    def diff(self, feed_name):
+        """Novos e removidos entre o snapshot anterior e o atual"""
+        current = self.load(feed_name, 'current')
+        previous = self.load(feed_name, 'previous')
+        return {'added': difference(current, previous), 'removed': difference(previous, current)}
+
+    def new_ids(self, feed_name, ids):
+        """IDs de ids que não estão no snapshot atual do feed (ordem preservada)"""
+        ids = list(ids)
+        numeric = []
+        for pid in ids:
+            try:
+                numeric.append(int(pid))
+            except (TypeError, ValueError):
+                numeric.append(0)
+        mask = contains(self.load(feed_name, 'current'), np.asarray(numeric, dtype=np.uint64))
+        return [pid for pid, known in zip(ids, mask) if not known]
+
+    def feeds(self):
+        """Feeds com snapshot atual: {feed_name: quantidade de IDs}"""
+        result = {}
+        for name in os.listdir(self.directory):
+            if name.endswith('.current.u64'):
+                result[unquote(name[:-len('.current.u64')])] = os.path.getsize(os.path.join(self.directory, name)) // 8
+        return result
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Índice local de hashes de conteúdo dos produtos de feed
+Guarda, por feed, o hash do último conteúdo gravado de cada produto
+(sqlite compartilhado entre workers). A sincronização só escreve no
+Firestore os produtos novos ou cujo hash mudou.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import time
+
+from file_lock import persistent_state_dir
+
+# Campos que mudam a cada execução e não fazem parte do conteúdo
+VOLATILE_FIELDS = ('updated_at', 'content_hash')
+
+
+def content_hash(data, exclude=VOLATILE_FIELDS):
+    """Hash estável (ordem das chaves não importa) do produto normalizado"""
+    payload = {k: v for k, v in data.items() if k not in exclude}
+    raw = json.dumps(payload, sort_keys=True, separators=(',', ':'), ensure_ascii=False, default=str)
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+
+class FeedHashIndex:
+    """(feed, produto) → hash do último conteúdo gravado"""
+
+    def __init__(self, path=None):
+        self.path = path or os.getenv('FEED_INDEX_PATH', os.path.join(persistent_state_dir('feeds'), 'hashes.sqlite'))
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS feed_hashes ('
+                ' feed_name TEXT, product_id TEXT, hash TEXT, seen_at REAL,'
+                ' PRIMARY KEY (feed_name, product_id))'
+            )
+
+    def _connect(self):
+        # Uma conexão por operação: seguro entre threads e workers
+        return sqlite3.connect(self.path, timeout=5)
+
+    def hashes(self, feed_name):
+        """{product_id: hash} do feed"""
+        with self._connect() as conn:
+            rows = conn.execute(
+                'SELECT product_id, hash FROM feed_hashes WHERE feed_name = ?', (feed_name,)
+            ).fetchall()
+        return dict(rows)
+
+    def update(self, feed_name, hashes):
+        """Grava {product_id: hash} (depois de o Firestore aceitar a escrita)"""
+        if not hashes:
+            return
+        now = time.time()
+        with self._connect() as conn:
+            conn.executemany(
+                'INSERT OR REPLACE INTO feed_hashes VALUES (?, ?, ?, ?)',
+                [(feed_name, pid, h, now) for pid, h in hashes.items()]
+            )
+
+    def remove(self, feed_name, product_ids):
+        if not product_ids:
+            return
+        with self._connect() as conn:
+            conn.executemany(
+                'DELETE FROM feed_hashes WHERE feed_name = ? AND product_id = ?',
+                [(feed_name, pid) for pid in product_ids]
+            )
+
+    def size(self, feed_name=None):
+        with self._connect() as conn:
+            if feed_name:
+                return conn.execute('SELECT COUNT(*) FROM feed_hashes WHERE feed_name = ?', (feed_name,)).fetchone()[0]
+            return conn.execute('SELECT COUNT(*) FROM feed_hashes').fetchone()[0]
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Lock entre processos baseado em arquivo
+Usa fcntl.flock quando disponível (Linux/gunicorn) e cai para um lock de
+thread quando não estiver (ex.: desenvolvimento no Windows).
+"""
+
+import os
+import tempfile
+import threading
+
+try:
+    import fcntl
+    FCNTL_AVAILABLE = True
+except ImportError:
+    FCNTL_AVAILABLE = False
+
+
+def shared_state_dir(name):
+    """
+    Diretório compartilhado entre workers (memória em /dev/shm quando existir).
+    Só para estado descartável: locks e baldes do rate limiter.
+    """
+    base = os.getenv('SHARED_STATE_DIR') or ('/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir())
+    path = os.path.join(base, name)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def persistent_state_dir(name):
+    """
+    Diretório em disco para estado que precisa sobreviver a reinícios (fila de
+    jobs, checkpoints e índices de feeds). STATE_DIR, ou state/ ao lado do
+    código; se não der para gravar ali, usa o diretório temporário do sistema.
+    """
+    base = os.getenv('STATE_DIR') or os.path.join(os.path.dirname(os.path.abspath(__file__)), 'state')
+    path = os.path.join(base, name)
+    try:
+        os.makedirs(path, exist_ok=True)
+    except OSError as e:
+        path = os.path.join(tempfile.gettempdir(), 'state', name)
+        print(f'⚠️ STATE_DIR sem permissão de escrita ({e}); usando {path}')
+        os.makedirs(path, exist_ok=True)
+    return path
+
+
+class FileLock:
+    """Lock exclusivo sobre um arquivo (não reentrante)"""
+
+    _local_locks = {}
+    _local_guard = threading.Lock()
+
+    def __init__(self, path):
+        self.path = path
+        self._fd = None
+        # flock não serializa threads que compartilham o mesmo fd/processo
+        # de forma confiável, então também seguramos um lock local por caminho
+        with FileLock._local_guard:
+            self._thread_lock = FileLock._local_locks.setdefault(path, threading.Lock())
+
+    def acquire(self, blocking=True):
+        if not self._thread_lock.acquire(blocking):
+            return False
+        if not FCNTL_AVAILABLE:
+            return True
+        try:
+            self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+            flags = fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB
+            fcntl.flock(self._fd, flags)
+            return True
+        except OSError:
+            if self._fd is not None:
+                os.close(self._fd)
+                self._fd = None
+            self._thread_lock.release()
+            if blocking:
+                raise
+            return False
+
+    def release(self):
+        if self._fd is not None:
+            try:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+            finally:
+                os.close(self._fd)
+                self._fd = None
+        self._thread_lock.release()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.release()
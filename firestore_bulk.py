@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Escrita em lote no Firestore
+Acumula set() em memória e grava em WriteBatch de até batch_size documentos
+(limite do Firestore: 500), com vários lotes em paralelo. Lote que falha é
+repetido com backoff; se continuar falhando, cada documento é tentado
+sozinho e as falhas definitivas entram no relatório.
+"""
+
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+FIRESTORE_BATCH_LIMIT = 500
+
+_executor = None
+_executor_pid = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    # Pool criado sob demanda em cada worker (threads não sobrevivem ao fork)
+    global _executor, _executor_pid
+    pid = os.getpid()
+    with _executor_lock:
+        if _executor is None or _executor_pid != pid:
+            _executor = ThreadPoolExecutor(
+                max_workers=int(os.getenv('FIRESTORE_BULK_WORKERS', '4')),
+                thread_name_prefix='firestore-bulk'
+            )
+            _executor_pid = pid
+        return _executor
+
+
+def doc_ref(db, collection, doc_id):
+    """Referência do documento (fallback para versões antigas do Firebase Admin SDK)"""
+    col = db.collection(collection)
+    try:
+        return col.doc(str(doc_id))
+    except AttributeError:
+        return col.document(str(doc_id))
+
+
+class BulkWriter:
+    """
+    Uso:
+        with BulkWriter(db) as writer:
+            writer.set('products', pid, data, merge=True)
+        writer.report -> {'written', 'failed', 'batches', 'retries', 'errors'}
+    on_success(doc_id) é chamado (na thread do lote) depois que o documento
+    foi aceito pelo Firestore.
+    """
+
+    def __init__(self, db, batch_size=None, retries=None, backoff=None):
+        self.db = db
+        self.batch_size = min(FIRESTORE_BATCH_LIMIT, batch_size or int(os.getenv('FIRESTORE_BATCH_SIZE', str(FIRESTORE_BATCH_LIMIT))))
+        self.retries = retries if retries is not None else int(os.getenv('FIRESTORE_BULK_RETRIES', '3'))
+        self.backoff = backoff if backoff is not None else float(os.getenv('FIRESTORE_BULK_BACKOFF', '0.5'))
+        self._lock = threading.Lock()
+        self._buffer = []
+        self._futures = []
+        self.report = {'written': 0, 'failed': 0, 'batches': 0, 'retries': 0, 'errors': {}}
+
+    def set(self, collection, doc_id, data, merge=False, on_success=None):
+        with self._lock:
+            self._buffer.append((collection, str(doc_id), data, merge, on_success))
+            if len(self._buffer) < self.batch_size:
+                return
+            ops, self._buffer = self._buffer, []
+        self._submit(ops)
+
+    def _submit(self, ops):
+        self._futures.append(_get_executor().submit(self._write, ops))
+
+    def flush(self):
+        """Envia o que está no buffer e espera todos os lotes em voo"""
+        with self._lock:
+            ops, self._buffer = self._buffer, []
+        if ops:
+            self._submit(ops)
+        futures, self._futures = self._futures, []
+        wait(futures)
+        return self.report
+
+    close = flush
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.flush()
+        return False
+
+    def _commit(self, ops):
+        batch = self.db.batch()
+        for collection, doc_id, data, merge, _ in ops:
+            batch.set(doc_ref(self.db, collection, doc_id), data, merge=merge)
+        batch.commit()
+
+    def _with_retries(self, fn):
+        for attempt in range(self.retries + 1):
+            try:
+                fn()
+                return None
+            except Exception as e:
+                if attempt == self.retries:
+                    return e
+                with self._lock:
+                    self.report['retries'] += 1
+                time.sleep(self.backoff * (2 ** attempt))
+
+    def _write(self, ops):
+        with self._lock:
+            self.report['batches'] += 1
+        error = self._with_retries(lambda: self._commit(ops))
+        if error is None:
+            self._done(ops)
+            return
+
+        # Lote é atômico: descobrir documento a documento qual falha
+        print(f'⚠️ Lote de {len(ops)} documentos falhou ({error}); gravando individualmente')
+        for op in ops:
+            collection, doc_id, data, merge, _ = op
+            error = self._with_retries(lambda: doc_ref(self.db, collection, doc_id).set(data, merge=merge))
+            if error is None:
+                self._done([op])
+            else:
+                with self._lock:
+                    self.report['failed'] += 1
+                    self.report['errors'][f'{collection}/{doc_id}'] = str(error)
+                print(f'❌ Falha ao gravar {collection}/{doc_id}: {error}')
+
+    def _done(self, ops):
+        with self._lock:
+            self.report['written'] += len(ops)
+        for _, doc_id, _, _, on_success in ops:
+            if on_success:
+                on_success(doc_id)
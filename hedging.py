@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Cadeia de fallback com orçamento de latência e disparo especulativo
+Cada estágio recebe o prazo absoluto da requisição. Se o estágio atual não
+responder até o seu ponto de hedge (fração do orçamento), o próximo começa
+em paralelo; se falhar, o próximo começa na hora. Vence a primeira resposta
+válida dentro do orçamento.
+"""
+
+import os
+import time
+from collections import namedtuple
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+# name: identifica o estágio na resposta; fn(deadline) -> valor
+# hedge_at: fração do orçamento a partir da qual o estágio seguinte é disparado
+HedgeStage = namedtuple('HedgeStage', ['name', 'fn', 'hedge_at'])
+
+# Resultado: stage None quando nenhum estágio respondeu a tempo
+HedgeResult = namedtuple('HedgeResult', ['stage', 'value', 'elapsed', 'errors'])
+
+_executor = None
+_executor_pid = None
+
+
+def _get_executor():
+    # Pool criado sob demanda em cada worker (threads não sobrevivem ao fork)
+    global _executor, _executor_pid
+    pid = os.getpid()
+    if _executor is None or _executor_pid != pid:
+        _executor = ThreadPoolExecutor(
+            max_workers=int(os.getenv('HEDGE_MAX_WORKERS', '16')),
+            thread_name_prefix='hedge'
+        )
+        _executor_pid = pid
+    return _executor
+
+
+class DeadlineExceeded(Exception):
+    """Estágio que só começou depois do prazo (pool ocupado por estágios abandonados)"""
+
+
+def check_deadline(deadline):
+    if deadline is not None and time.monotonic() >= deadline:
+        raise DeadlineExceeded('prazo esgotado antes do início do estágio')
+
+
+def remaining(deadline, default=None, floor=0.5):
+    """
+    Segundos até o prazo (no mínimo floor) para usar como timeout. Depois do
+    prazo devolve default, ou floor se default não for dado: nunca None, para
+    que uma chamada atrasada (ex.: recarga em segundo plano do cache) não
+    volte ao timeout normal e prenda o pool.
+    """
+    late = floor if default is None else default
+    if deadline is None:
+        return default
+    left = deadline - time.monotonic()
+    if left <= 0:
+        return late
+    return max(floor, left)
+
+
+def _run_stage(fn, deadline):
+    # Na fila do pool o prazo pode ter passado: desiste sem fazer a chamada
+    check_deadline(deadline)
+    return fn(deadline)
+
+
+def run_hedged(stages, budget, is_valid=None):
+    """
+    Executa os estágios em ordem de prioridade dentro de budget segundos.
+    Respostas que levantam exceção ou não passam em is_valid contam como
+    falha. Estágios ainda em andamento ao final são abandonados (seus
+    timeouts já estão limitados pelo prazo).
+    """
+    executor = _get_executor()
+    start = time.monotonic()
+    deadline = start + budget
+    errors = {}
+    pending = {}
+    next_index = 0
+
+    def _launch():
+        nonlocal next_index
+        stage = stages[next_index]
+        next_index += 1
+        pending[executor.submit(_run_stage, stage.fn, deadline)] = stage
+
+    _launch()
+    while pending or next_index < len(stages):
+        now = time.monotonic()
+        if now >= deadline:
+            break
+        if not pending:
+            # Todos os estágios disparados falharam: o próximo começa já
+            _launch()
+            continue
+
+        wake = deadline
+        if next_index < len(stages):
+            hedge_at = start + budget * stages[next_index - 1].hedge_at
+            if now >= hedge_at:
+                _launch()
+                continue
+            wake = min(wake, hedge_at)
+
+        done, _ = wait(pending, timeout=max(0.0, wake - now), return_when=FIRST_COMPLETED)
+        # Entre os concluídos, respeita a ordem de prioridade dos estágios
+        for future in sorted(done, key=lambda f: stages.index(pending[f])):
+            stage = pending.pop(future)
+            try:
+                value = future.result()
+            except Exception as e:
+                errors[stage.name] = str(e)
+                continue
+            if is_valid is not None and not is_valid(value):
+                errors[stage.name] = 'resposta inválida'
+                continue
+            return HedgeResult(stage.name, value, time.monotonic() - start, errors)
+
+    for stage in pending.values():
+        errors.setdefault(stage.name, 'orçamento esgotado')
+    return HedgeResult(None, None, time.monotonic() - start, errors)
@@ -0,0 +1,450 @@
+#!/usr/bin/env python3
+"""
+Fila de jobs em segundo plano (sincronização de feeds)
+Enfileirar devolve o ID na hora; quem executa pega o job com um lease
+(status running + heartbeat) e grava o progresso para consulta por ID. Job
+"running" sem heartbeat (processo reciclado ou morto) volta para a fila.
+
+Dois armazenamentos com a mesma interface:
+- FirestoreJobStore (coleção jobs): visto por todos os processos e
+  instâncias, então o serviço de jobs (python server.py --jobs) pode rodar
+  separado dos workers web;
+- JobStore (sqlite local): só processos da mesma máquina; sem Firebase
+  (desenvolvimento) os jobs rodam em threads dos próprios workers web.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+from file_lock import persistent_state_dir
+
+STATUS_QUEUED = 'queued'
+STATUS_RUNNING = 'running'
+STATUS_DONE = 'done'
+STATUS_FAILED = 'failed'
+
+
+def _dumps(value):
+    return json.dumps(value, sort_keys=True, ensure_ascii=False, default=str)
+
+
+class JobStore:
+    """Tabela de jobs (sqlite); cada operação abre a própria conexão"""
+
+    # Só processos que enxergam o mesmo arquivo compartilham a fila
+    shared = False
+
+    def __init__(self, path=None):
+        self.path = path or os.getenv('JOB_DB_PATH', os.path.join(persistent_state_dir('jobs'), 'jobs.sqlite'))
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS jobs ('
+                ' id TEXT PRIMARY KEY, kind TEXT, params TEXT, status TEXT,'
+                ' progress TEXT, result TEXT, error TEXT, attempts INTEGER DEFAULT 0,'
+                ' created_at REAL, started_at REAL, finished_at REAL, heartbeat_at REAL, worker TEXT)'
+            )
+            conn.execute('CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created_at)')
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=10, isolation_level=None)
+
+    def _row(self, row):
+        if not row:
+            return None
+        (job_id, kind, params, status, progress, result, error, attempts,
+         created_at, started_at, finished_at, heartbeat_at, worker) = row
+        return {
+            'job_id': job_id,
+            'kind': kind,
+            'params': json.loads(params or '{}'),
+            'status': status,
+            'progress': json.loads(progress or '{}'),
+            'result': json.loads(result) if result else None,
+            'error': error,
+            'attempts': attempts,
+            'created_at': created_at,
+            'started_at': started_at,
+            'finished_at': finished_at,
+            'heartbeat_at': heartbeat_at,
+            'worker': worker,
+        }
+
+    def create(self, kind, params):
+        """Novo job, ou o ID do mesmo job (tipo + parâmetros) ainda na fila/rodando"""
+        params_json = _dumps(params)
+        with self._connect() as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            row = conn.execute(
+                'SELECT id FROM jobs WHERE kind = ? AND params = ? AND status IN (?, ?)',
+                (kind, params_json, STATUS_QUEUED, STATUS_RUNNING)
+            ).fetchone()
+            if row:
+                conn.execute('COMMIT')
+                return row[0], False
+            job_id = uuid.uuid4().hex
+            conn.execute(
+                'INSERT INTO jobs (id, kind, params, status, progress, created_at) VALUES (?, ?, ?, ?, ?, ?)',
+                (job_id, kind, params_json, STATUS_QUEUED, '{}', time.time())
+            )
+            conn.execute('COMMIT')
+            return job_id, True
+
+    def claim(self, worker, kinds):
+        """Marca o job mais antigo da fila como running para este worker"""
+        if not kinds:
+            return None
+        marks = ','.join('?' * len(kinds))
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            row = conn.execute(
+                f'SELECT id FROM jobs WHERE status = ? AND kind IN ({marks}) ORDER BY created_at LIMIT 1',
+                (STATUS_QUEUED, *kinds)
+            ).fetchone()
+            if not row:
+                conn.execute('COMMIT')
+                return None
+            conn.execute(
+                'UPDATE jobs SET status = ?, started_at = ?, heartbeat_at = ?, worker = ?, attempts = attempts + 1 WHERE id = ?',
+                (STATUS_RUNNING, now, now, worker, row[0])
+            )
+            conn.execute('COMMIT')
+        return self.get(row[0])
+
+    def heartbeat(self, job_id, progress):
+        with self._connect() as conn:
+            conn.execute(
+                'UPDATE jobs SET progress = ?, heartbeat_at = ? WHERE id = ? AND status = ?',
+                (_dumps(progress), time.time(), job_id, STATUS_RUNNING)
+            )
+
+    def finish(self, job_id, progress, result=None, error=None):
+        with self._connect() as conn:
+            conn.execute(
+                'UPDATE jobs SET status = ?, progress = ?, result = ?, error = ?, finished_at = ?, heartbeat_at = ? WHERE id = ?',
+                (STATUS_FAILED if error else STATUS_DONE, _dumps(progress),
+                 _dumps(result) if result is not None else None, error, time.time(), time.time(), job_id)
+            )
+
+    def requeue_stale(self, stale_after, max_attempts):
+        """Jobs running sem heartbeat há stale_after segundos: de volta à fila (ou falha)"""
+        cutoff = time.time() - stale_after
+        with self._connect() as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            conn.execute(
+                'UPDATE jobs SET status = ?, error = ?, finished_at = ? WHERE status = ? AND heartbeat_at < ? AND attempts >= ?',
+                (STATUS_FAILED, 'worker interrompido', time.time(), STATUS_RUNNING, cutoff, max_attempts)
+            )
+            requeued = conn.execute(
+                'UPDATE jobs SET status = ?, worker = NULL WHERE status = ? AND heartbeat_at < ?',
+                (STATUS_QUEUED, STATUS_RUNNING, cutoff)
+            ).rowcount
+            conn.execute('COMMIT')
+        return requeued
+
+    def get(self, job_id):
+        with self._connect() as conn:
+            return self._row(conn.execute('SELECT * FROM jobs WHERE id = ?', (job_id,)).fetchone())
+
+    def recent(self, limit=20, kind=None):
+        with self._connect() as conn:
+            if kind:
+                rows = conn.execute('SELECT * FROM jobs WHERE kind = ? ORDER BY created_at DESC LIMIT ?', (kind, limit)).fetchall()
+            else:
+                rows = conn.execute('SELECT * FROM jobs ORDER BY created_at DESC LIMIT ?', (limit,)).fetchall()
+        return [self._row(r) for r in rows]
+
+    def counts(self):
+        with self._connect() as conn:
+            return dict(conn.execute('SELECT status, COUNT(*) FROM jobs GROUP BY status').fetchall())
+
+
+class FirestoreJobStore:
+    """
+    Jobs na coleção do Firestore, com a mesma interface do JobStore.
+    Transições (claim, requeue) usam a pré-condição last_update_time: se
+    outro processo alterou o documento no meio, a escrita falha e o job fica
+    com quem chegou primeiro. Um documento em <coleção>_active por
+    (tipo, parâmetros) evita enfileirar o mesmo job duas vezes.
+    """
+
+    shared = True
+
+    def __init__(self, db, collection=None):
+        self.db = db
+        self.collection = collection or os.getenv('JOB_COLLECTION', 'jobs')
+
+    def _ref(self, job_id, collection=None):
+        col = self.db.collection(collection or self.collection)
+        # Fallback para versões antigas do Firebase Admin SDK
+        try:
+            return col.doc(job_id)
+        except AttributeError:
+            return col.document(job_id)
+
+    def _active_ref(self, kind, params_json):
+        key = hashlib.sha1(f'{kind}:{params_json}'.encode('utf-8')).hexdigest()
+        return self._ref(key, f'{self.collection}_active')
+
+    def _row(self, snap):
+        if not snap or not snap.exists:
+            return None
+        data = snap.to_dict() or {}
+        return {
+            'job_id': snap.id,
+            'kind': data.get('kind'),
+            'params': json.loads(data.get('params') or '{}'),
+            'status': data.get('status'),
+            'progress': json.loads(data.get('progress') or '{}'),
+            'result': json.loads(data['result']) if data.get('result') else None,
+            'error': data.get('error'),
+            'attempts': data.get('attempts') or 0,
+            'created_at': data.get('created_at'),
+            'started_at': data.get('started_at'),
+            'finished_at': data.get('finished_at'),
+            'heartbeat_at': data.get('heartbeat_at'),
+            'worker': data.get('worker'),
+        }
+
+    def _guarded_update(self, snap, fields):
+        """Atualiza só se o documento não mudou desde a leitura; False se perdeu a corrida"""
+        try:
+            snap.reference.update(fields, option=self.db.write_option(last_update_time=snap.update_time))
+            return True
+        except Exception:
+            return False
+
+    def create(self, kind, params):
+        params_json = _dumps(params)
+        active = self._active_ref(kind, params_json)
+        current = active.get()
+        if current.exists:
+            job = self.get((current.to_dict() or {}).get('job_id') or '')
+            if job and job['status'] in (STATUS_QUEUED, STATUS_RUNNING):
+                return job['job_id'], False
+        job_id = uuid.uuid4().hex
+        self._ref(job_id).set({
+            'kind': kind, 'params': params_json, 'status': STATUS_QUEUED, 'progress': '{}',
+            'result': None, 'error': None, 'attempts': 0, 'created_at': time.time(),
+            'started_at': None, 'finished_at': None, 'heartbeat_at': None, 'worker': None,
+            'active_key': active.id,
+        })
+        active.set({'job_id': job_id, 'kind': kind, 'created_at': time.time()})
+        return job_id, True
+
+    def claim(self, worker, kinds):
+        if not kinds:
+            return None
+        # Só igualdade no filtro (índice automático); ordem e tipo resolvidos aqui
+        snaps = list(self.db.collection(self.collection).where('status', '==', STATUS_QUEUED).limit(50).stream())
+        snaps = sorted((s for s in snaps if (s.to_dict() or {}).get('kind') in kinds),
+                       key=lambda s: (s.to_dict() or {}).get('created_at') or 0)
+        now = time.time()
+        for snap in snaps:
+            attempts = ((snap.to_dict() or {}).get('attempts') or 0) + 1
+            if self._guarded_update(snap, {'status': STATUS_RUNNING, 'started_at': now, 'heartbeat_at': now,
+                                           'worker': worker, 'attempts': attempts}):
+                return self.get(snap.id)
+        return None
+
+    def heartbeat(self, job_id, progress):
+        self._ref(job_id).update({'progress': _dumps(progress), 'heartbeat_at': time.time()})
+
+    def finish(self, job_id, progress, result=None, error=None):
+        ref = self._ref(job_id)
+        now = time.time()
+        ref.update({
+            'status': STATUS_FAILED if error else STATUS_DONE,
+            'progress': _dumps(progress),
+            'result': _dumps(result) if result is not None else None,
+            'error': error, 'finished_at': now, 'heartbeat_at': now,
+        })
+        self._release(ref.get())
+
+    def _release(self, snap):
+        """Libera a chave de deduplicação se ainda apontar para este job"""
+        key = (snap.to_dict() or {}).get('active_key') if snap and snap.exists else None
+        if not key:
+            return
+        active = self._ref(key, f'{self.collection}_active')
+        current = active.get()
+        if current.exists and (current.to_dict() or {}).get('job_id') == snap.id:
+            active.delete()
+
+    def requeue_stale(self, stale_after, max_attempts):
+        cutoff = time.time() - stale_after
+        requeued = 0
+        for snap in self.db.collection(self.collection).where('status', '==', STATUS_RUNNING).stream():
+            data = snap.to_dict() or {}
+            if (data.get('heartbeat_at') or 0) >= cutoff:
+                continue
+            if (data.get('attempts') or 0) >= max_attempts:
+                if self._guarded_update(snap, {'status': STATUS_FAILED, 'error': 'worker interrompido',
+                                               'finished_at': time.time()}):
+                    self._release(snap)
+            elif self._guarded_update(snap, {'status': STATUS_QUEUED, 'worker': None}):
+                requeued += 1
+        return requeued
+
+    def get(self, job_id):
+        if not job_id:
+            return None
+        return self._row(self._ref(job_id).get())
+
+    def recent(self, limit=20, kind=None):
+        query = self.db.collection(self.collection).order_by('created_at', direction='DESCENDING')
+        # Filtro por tipo feito aqui (evita índice composto tipo + data)
+        rows = [self._row(s) for s in query.limit(limit * 5 if kind else limit).stream()]
+        if kind:
+            rows = [r for r in rows if r['kind'] == kind]
+        return rows[:limit]
+
+    def counts(self):
+        counts = {}
+        for status in (STATUS_QUEUED, STATUS_RUNNING):
+            total = sum(1 for _ in self.db.collection(self.collection).where('status', '==', status).select([]).stream())
+            if total:
+                counts[status] = total
+        return counts
+
+
+class JobProgress:
+    """Callback de progresso passado ao handler: progress(pages=3, saved=120)"""
+
+    def __init__(self, store, job_id, interval):
+        self.store = store
+        self.job_id = job_id
+        self.interval = interval
+        self.values = {}
+        self._last_write = 0.0
+
+    def __call__(self, **fields):
+        self.values.update(fields)
+        # Grava no máximo a cada interval segundos (o heartbeat vai junto)
+        now = time.monotonic()
+        if now - self._last_write >= self.interval:
+            self._last_write = now
+            try:
+                self.store.heartbeat(self.job_id, self.values)
+            except Exception as e:
+                print(f'⚠️ Falha ao gravar progresso do job {self.job_id}: {e}')
+
+
+class JobQueue:
+    """Handlers registrados por tipo; workers iniciados sob demanda em cada processo"""
+
+    def __init__(self, store=None, workers=None, poll_interval=None, stale_after=None, max_attempts=None):
+        self.store = store or JobStore()
+        self.workers = workers if workers is not None else int(os.getenv('JOB_WORKERS', '1'))
+        self.poll_interval = poll_interval or float(os.getenv('JOB_POLL_INTERVAL', '2'))
+        self.stale_after = stale_after or float(os.getenv('JOB_STALE_AFTER', '300'))
+        self.max_attempts = max_attempts or int(os.getenv('JOB_MAX_ATTEMPTS', '2'))
+        self.progress_interval = float(os.getenv('JOB_PROGRESS_INTERVAL', '1'))
+        # off: web só enfileira e o serviço de jobs executa (padrão com fila compartilhada);
+        # thread: workers também dentro dos processos web (padrão com a fila sqlite local)
+        self.mode = os.getenv('JOB_WORKER_MODE') or ('off' if self.store.shared else 'thread')
+        self.handlers = {}
+        self._lock = threading.Lock()
+        self._threads = []
+        self._pid = None
+        self._stop = threading.Event()
+
+    def register(self, kind, fn):
+        """fn(params, progress) -> resultado serializável em JSON"""
+        self.handlers[kind] = fn
+
+    def enqueue(self, kind, params=None):
+        """(job_id, criado); job idêntico em andamento é reaproveitado"""
+        if kind not in self.handlers:
+            raise ValueError(f'Tipo de job desconhecido: {kind}')
+        job_id, created = self.store.create(kind, params or {})
+        self.autostart()
+        return job_id, created
+
+    def get(self, job_id):
+        return self.store.get(job_id)
+
+    def autostart(self):
+        """No modo thread, inicia os workers deste processo (chamado a cada requisição; barato)"""
+        if self.mode == 'thread' and self._pid != os.getpid():
+            self.start()
+
+    def start(self):
+        """Inicia os workers deste processo (de novo após fork do gunicorn)"""
+        pid = os.getpid()
+        if self._pid == pid:
+            return
+        with self._lock:
+            if self._pid == pid:
+                return
+            self._threads = []
+            for i in range(max(1, self.workers)):
+                thread = threading.Thread(target=self._loop, name=f'job-worker-{i}', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+            self._pid = pid
+
+    def run_forever(self):
+        """Processo dedicado: executa jobs até ser interrompido"""
+        self.start()
+        try:
+            while any(t.is_alive() for t in self._threads):
+                time.sleep(1)
+        except KeyboardInterrupt:
+            self._stop.set()
+
+    def _loop(self):
+        worker = f'{os.getpid()}:{threading.current_thread().name}'
+        last_sweep = 0.0
+        while not self._stop.is_set():
+            try:
+                if time.monotonic() - last_sweep >= self.stale_after / 2:
+                    last_sweep = time.monotonic()
+                    requeued = self.store.requeue_stale(self.stale_after, self.max_attempts)
+                    if requeued:
+                        print(f'🔁 {requeued} job(s) sem heartbeat devolvidos à fila')
+                job = self.store.claim(worker, list(self.handlers))
+            except Exception as e:
+                print(f'⚠️ Fila de jobs indisponível: {e}')
+                job = None
+            if not job:
+                self._stop.wait(self.poll_interval)
+                continue
+            self._run(job)
+
+    def _run(self, job):
+        job_id = job['job_id']
+        progress = JobProgress(self.store, job_id, self.progress_interval)
+        # Retomada após falha começa do progresso gravado
+        progress.values.update(job.get('progress') or {})
+        print(f'▶️ Job {job_id} ({job["kind"]}) iniciado')
+        try:
+            result = self.handlers[job['kind']](job['params'], progress)
+        except Exception as e:
+            print(f'❌ Job {job_id} ({job["kind"]}) falhou: {e}')
+            self.store.finish(job_id, progress.values, error=str(e) or type(e).__name__)
+            return
+        self.store.finish(job_id, progress.values, result=result)
+        print(f'✅ Job {job_id} ({job["kind"]}) concluído')
+
+    def stats(self):
+        try:
+            counts = self.store.counts()
+        except Exception:
+            counts = None
+        return {
+            'mode': self.mode,
+            'store': type(self.store).__name__,
+            'shared': self.store.shared,
+            'workers': self.workers,
+            'running_here': self._pid == os.getpid(),
+            'jobs': counts,
+        }
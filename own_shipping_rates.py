@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Motor de tarifas do frete próprio (vetorizado com NumPy)
+Tarifa por (serviço, zona): preço = base + por_kg × max(0, peso − franquia).
+Zona é a macrorregião do CEP (data/cep_ranges.csv); linhas com zona '*'
+valem para todas as zonas sem linha própria. O prazo é a coluna days da
+linha ou, vazia, o da tabela de faixas de CEP. Avalia milhares de
+combinações (CEP, peso, serviço) de uma vez.
+"""
+
+import csv
+import os
+
+import numpy as np
+
+from cep_regions import DEFAULT_DELIVERY_DAYS, normalize_cep, range_table
+
+OWN_RATES_FILE = os.getenv('OWN_RATES_FILE', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'own_shipping_rates.csv'))
+
+
+class OwnShippingRateEngine:
+    """Tabelas em arrays; quote_many devolve matrizes N × serviços"""
+
+    def __init__(self, path=None):
+        self.path = path or OWN_RATES_FILE
+        with open(self.path, newline='', encoding='utf-8') as f:
+            rows = list(csv.DictReader(f))
+
+        # Serviços na ordem do arquivo
+        self.services = []
+        for row in rows:
+            if row['service'] not in self.services:
+                self.services.append(row['service'])
+        self.service_info = {}
+
+        # Faixas de CEP → índice de zona
+        starts, ends, regions = range_table()
+        self.zones = sorted({r.region for r in regions})
+        self._starts = np.array(starts, dtype=np.int64)
+        self._ends = np.array(ends, dtype=np.int64)
+        self._range_zone = np.array([self.zones.index(r.region) for r in regions], dtype=np.int64)
+        # Coluna de prazo por serviço: economy/express da tabela de CEP
+        self._range_days = np.array([[r.economy_days, r.express_days] for r in regions], dtype=np.int64)
+
+        # Zona extra (último índice) para CEPs fora das faixas
+        n_zones = len(self.zones) + 1
+        shape = (len(self.services), n_zones)
+        self._base = np.full(shape, np.nan)
+        self._per_kg = np.full(shape, np.nan)
+        self._free_kg = np.zeros(shape)
+        # Prazo fixo por (serviço, zona); -1 = prazo da faixa de CEP
+        self._fixed_days = np.full(shape, -1, dtype=np.int64)
+        for row in sorted(rows, key=lambda r: r['zone'] != '*'):
+            s = self.services.index(row['service'])
+            cols = range(n_zones) if row['zone'] == '*' else [self.zones.index(row['zone'])]
+            for z in cols:
+                self._base[s, z] = float(row['base'])
+                self._per_kg[s, z] = float(row['per_kg'])
+                self._free_kg[s, z] = float(row.get('free_kg') or 0)
+                self._fixed_days[s, z] = int(row.get('days') or -1)
+            self.service_info.setdefault(row['service'], {
+                'carrier': row.get('carrier'),
+                'service_name': row.get('service_name'),
+                'service_code': row.get('service_code') or row['service'].upper(),
+            })
+
+        self._default_days = np.array([
+            DEFAULT_DELIVERY_DAYS['express'] if s == 'express' else DEFAULT_DELIVERY_DAYS['economy']
+            for s in self.services
+        ], dtype=np.int64)
+        self._days_column = np.array([1 if s == 'express' else 0 for s in self.services], dtype=np.int64)
+
+    def _lookup(self, ceps):
+        """Índice da faixa de cada CEP (-1 quando fora das faixas)"""
+        prefixes = np.array([
+            int(digits[:5]) if digits else -1
+            for digits in (normalize_cep(cep) for cep in ceps)
+        ], dtype=np.int64)
+        idx = np.searchsorted(self._starts, prefixes, side='right') - 1
+        valid = (idx >= 0) & (prefixes >= 0)
+        valid &= prefixes <= self._ends[np.clip(idx, 0, None)]
+        return np.where(valid, idx, -1)
+
+    def quote_many(self, ceps, weights):
+        """
+        Preços e prazos para cada par (ceps[i], weights[i]).
+        Devolve (prices, days): arrays N × len(self.services); preço NaN
+        quando o serviço não atende a zona.
+        """
+        weights = np.asarray(weights, dtype=float)
+        idx = self._lookup(ceps)
+        found = idx >= 0
+        safe = np.clip(idx, 0, None)
+
+        zone = np.where(found, self._range_zone[safe], len(self.zones))
+        base = self._base[:, zone].T
+        per_kg = self._per_kg[:, zone].T
+        free_kg = self._free_kg[:, zone].T
+        prices = np.round(base + per_kg * np.maximum(0.0, weights[:, None] - free_kg), 2)
+
+        days = self._range_days[safe][:, self._days_column]
+        days = np.where(found[:, None], days, self._default_days[None, :])
+        fixed = self._fixed_days[:, zone].T
+        days = np.where(fixed >= 0, fixed, days)
+        return prices, days
+
+    def cheapest_many(self, ceps, weights):
+        """Menor preço entre os serviços para cada par ("frete a partir de")"""
+        prices, _ = self.quote_many(ceps, weights)
+        return np.nanmin(prices, axis=1)
+
+    def quote(self, cep, weight):
+        """Um CEP/peso: {serviço: {price, days, carrier, service_name, service_code}}"""
+        prices, days = self.quote_many([cep], [weight])
+        result = {}
+        for s, service in enumerate(self.services):
+            if np.isnan(prices[0, s]):
+                continue
+            result[service] = dict(self.service_info[service], price=float(prices[0, s]), days=int(days[0, s]))
+        return result
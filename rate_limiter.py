@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+Rate limiter (token bucket) por método da API do AliExpress
+O estado de cada balde fica em /dev/shm (ou no diretório temporário) e é
+protegido por FileLock, então todos os workers do gunicorn dividem a mesma
+cota. A chamada só espera quando o balde está realmente vazio.
+"""
+
+import os
+import struct
+import threading
+import time
+
+from file_lock import FileLock, shared_state_dir
+
+# tokens disponíveis, instante do último reabastecimento
+_STATE = struct.Struct('<dd')
+
+DEFAULT_QPS = float(os.getenv('ALIEXPRESS_DEFAULT_QPS', '5'))
+
+# Métodos de leitura chamados em paralelo (detalhes em lote, frete por CEP):
+# cota própria, acima do padrão conservador usado para pedidos e demais
+# métodos. ALIEXPRESS_METHOD_QPS sobrescreve método a método.
+DEFAULT_METHOD_QPS = {
+    'aliexpress.ds.product.get': 20.0,
+    'aliexpress.ds.freight.query': 10.0,
+    'aliexpress.logistics.buyer.freight.calculate': 10.0,
+    'aliexpress.ds.feed.itemids.get': 10.0,
+}
+
+
+def parse_method_qps(raw):
+    """Lê 'metodo=qps,metodo=qps' (ex.: ALIEXPRESS_METHOD_QPS)"""
+    limits = {}
+    for part in (raw or '').split(','):
+        if '=' not in part:
+            continue
+        method, qps = part.split('=', 1)
+        try:
+            limits[method.strip()] = float(qps)
+        except ValueError:
+            print(f'⚠️ QPS inválido para {method.strip()}: {qps}')
+    return limits
+
+
+class TokenBucketLimiter:
+    """Token bucket compartilhado entre processos, um balde por método"""
+
+    def __init__(self, default_qps=DEFAULT_QPS, method_qps=None, state_dir=None, namespace='aliexpress-ratelimit'):
+        self.default_qps = default_qps
+        if method_qps is None:
+            method_qps = dict(DEFAULT_METHOD_QPS, **parse_method_qps(os.getenv('ALIEXPRESS_METHOD_QPS')))
+        self.method_qps = method_qps
+        self.namespace = namespace
+        self._state_dir = state_dir
+        if state_dir:
+            os.makedirs(state_dir, exist_ok=True)
+        self._locks = {}
+        self._guard = threading.Lock()
+        self._stats = {'acquired': 0, 'waited': 0, 'wait_ms': 0.0}
+
+    @property
+    def state_dir(self):
+        if self._state_dir is None:
+            self._state_dir = shared_state_dir(self.namespace)
+        return self._state_dir
+
+    def rate_for(self, method):
+        return self.method_qps.get(method, self.default_qps)
+
+    def _lock_for(self, method):
+        with self._guard:
+            lock = self._locks.get(method)
+            if lock is None:
+                lock = FileLock(os.path.join(self.state_dir, f'{method}.lock'))
+                self._locks[method] = lock
+            return lock
+
+    def _take(self, method, rate, burst):
+        """Tenta retirar um token; devolve 0 ou o tempo a esperar (s)"""
+        path = os.path.join(self.state_dir, f'{method}.bucket')
+        with self._lock_for(method):
+            now = time.time()
+            tokens, last = burst, now
+            try:
+                with open(path, 'rb') as f:
+                    tokens, last = _STATE.unpack(f.read(_STATE.size))
+            except (OSError, struct.error):
+                pass
+
+            tokens = min(burst, tokens + max(0.0, now - last) * rate)
+            if tokens >= 1:
+                tokens -= 1
+                wait_for = 0.0
+            else:
+                wait_for = (1 - tokens) / rate
+
+            with open(path, 'wb') as f:
+                f.write(_STATE.pack(tokens, now))
+            return wait_for
+
+    def acquire(self, method, max_wait=None):
+        """
+        Bloqueia até haver um token para o método.
+        Devolve o tempo total esperado em segundos. Com max_wait, desiste e
+        devolve None quando a espera passaria do limite.
+        """
+        rate = self.rate_for(method)
+        if rate <= 0:
+            return 0.0
+        burst = max(1.0, rate)
+
+        waited = 0.0
+        while True:
+            wait_for = self._take(method, rate, burst)
+            if wait_for <= 0:
+                break
+            if max_wait is not None and waited + wait_for > max_wait:
+                return None
+            time.sleep(wait_for)
+            waited += wait_for
+
+        with self._guard:
+            self._stats['acquired'] += 1
+            if waited:
+                self._stats['waited'] += 1
+                self._stats['wait_ms'] += waited * 1000
+        return waited
+
+    def stats(self):
+        with self._guard:
+            return {
+                'acquired': self._stats['acquired'],
+                'waited': self._stats['waited'],
+                'wait_ms': round(self._stats['wait_ms'], 1),
+                'default_qps': self.default_qps,
+                'method_qps': dict(self.method_qps),
+            }
@@ -50,16 +50,42 @@ def optimize_memory(func):
 
 #fjoiherferferuifiufuieruerierofrio
 import os
+import sys
 import json
 import requests
 import hashlib
+import hmac
+import math
 import time
 import urllib.parse
+import base64
 import re
+import copy
+import sqlite3
 from datetime import datetime
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, send_file
 from dotenv import load_dotenv
 from flask_cors import CORS
+from aliexpress_client import AliExpressClient
+from rate_limiter import TokenBucketLimiter
+from token_cache import TokenCache
+from capture import CaptureBuffer, redact_params
+from app_logging import get_logger, lazy_json, lazy_text
+from token_refresher import TokenRefresher
+from cache import TTLCache
+from fanout import DeadlineExceeded as FanOutDeadlineExceeded, fan_out
+from cep_regions import region_for_cep, uf_for_cep
+from shipping_matrix import ShippingMatrixStore, build_matrix
+from correios_client import CorreiosClient, SERVICE_NAMES
+from own_shipping_rates import OwnShippingRateEngine
+from feed_index import FeedHashIndex, content_hash
+from feed_crawler import CrawlCheckpointStore, FeedCrawler, FeedPage
+from feed_catalog import FeedCatalog, parse_feed_names
+from feed_id_index import FeedIdIndex, difference as id_difference, intersection as id_intersection, union as id_union
+from firestore_bulk import BulkWriter, doc_ref
+from file_lock import persistent_state_dir
+from job_queue import FirestoreJobStore, JobQueue
+from hedging import HedgeStage, remaining, run_hedged
 # Firebase Admin SDK (opcional)
 try:
 
@@ -228,6 +254,14 @@ def add_cors_headers(response):
     response.headers['Access-Control-Allow-Methods'] = 'GET, POST, PUT, DELETE, OPTIONS'
     return response
 
+# ===================== LOGGING =====================
+# Payloads completos só em DEBUG (LOG_LEVEL); amostragem por área em LOG_SAMPLE_RATES
+log_ali = get_logger('aliexpress')
+log_shipping = get_logger('shipping')
+log_orders = get_logger('orders')
+log_feeds = get_logger('feeds')
+log_payments = get_logger('payments')
+
 # ===================== CONFIGURAÇÕES =====================
 APP_KEY = os.getenv('APP_KEY', '517616')  # Substitua pela sua APP_KEY
 APP_SECRET = os.getenv('APP_SECRET', 'skAvaPWbGLkkx5TlKf8kvLmILQtTV2sq')
@@ -235,6 +269,18 @@ PORT = int(os.getenv('PORT', 5000))
 
 REDIRECT_URI = "https://service-api-aliexpress.mercadodasophia.com.br/api/aliexpress/oauth-callback"
 
+# Cliente único (pool keep-alive) para o gateway /sync do AliExpress
+# Cota por método compartilhada entre workers (ALIEXPRESS_DEFAULT_QPS / ALIEXPRESS_METHOD_QPS)
+ali_rate_limiter = TokenBucketLimiter()
+# Amostra de respostas do upstream (CAPTURE_SAMPLE_RATE), gravada em segundo plano
+capture_buffer = CaptureBuffer()
+ali_client = AliExpressClient(APP_KEY, APP_SECRET, rate_limiter=ali_rate_limiter, capture=capture_buffer)
+
+# Prazo global (segundos) para buscas de produtos em lote
+PRODUCT_BATCH_DEADLINE = float(os.getenv('PRODUCT_BATCH_DEADLINE', '20'))
+# Prazo comum (segundos) para o frete dos CEPs principais na importação
+MAIN_CEPS_SHIPPING_DEADLINE = float(os.getenv('MAIN_CEPS_SHIPPING_DEADLINE', '12'))
+
 TOKENS_FILE = 'tokens.json'
 
 # Endereço da LOJA para criação de pedidos no AliExpress (consignee)
@@ -263,13 +309,32 @@ def save_tokens(tokens):
                 db.collection('config').document('aliexpress_tokens').set(tokens, merge=True)
                 
             print('✅ Tokens salvos no Firestore com sucesso!')
+            # Próxima leitura busca o documento mesclado
+            token_cache.invalidate()
             return
         except Exception as e:
             print(f'⚠️ Falha ao salvar tokens no Firestore: {e}. Fallback para arquivo.')
     # Fallback desativado no Cloud Run para evitar erros de filesystem
     print('ℹ️ Salvamento local de tokens desativado neste ambiente.')
+    token_cache.invalidate()
+
+def _tokens_doc_ref():
+    db = firestore.client()
+    # Fallback para versões antigas do Firebase Admin SDK
+    try:
+        return db.collection('config').doc('aliexpress_tokens')
+    except AttributeError:
+        return db.collection('config').document('aliexpress_tokens')
 
 def load_tokens():
+    """Tokens em memória (TokenCache); só vai ao Firestore quando o cache expira."""
+    if FIREBASE_AVAILABLE:
+        token_refresher.start()
+        if TOKEN_CACHE_LISTEN:
+            token_cache.watch(_tokens_doc_ref)
+    return token_cache.get()
+
+def _load_tokens_from_store():
     """Carrega tokens do Firestore quando disponível, senão do arquivo local."""
     # Tentar Firestore primeiro
     if FIREBASE_AVAILABLE:
@@ -291,29 +356,23 @@ def load_tokens():
     print('ℹ️ Leitura local de tokens desativada neste ambiente.')
     return None
 
+# Tokens em memória até pouco antes de expire_time; invalidado em save_tokens
+token_cache = TokenCache(_load_tokens_from_store)
+TOKEN_CACHE_LISTEN = os.getenv('TOKEN_CACHE_LISTEN', 'false').lower() == 'true'
+
 
 def ensure_fresh_token(min_valid_seconds: int = 300):
     """Garante que o access_token tenha ao menos min_valid_seconds de validade.
-    Se estiver perto de expirar ou faltar, tenta refresh.
+    Não bloqueia: se estiver perto de expirar ou faltar, acorda o refresh em
+    segundo plano e segue com o token atual.
     """
     tokens = load_tokens() or {}
-    now_ms = int(time.time() * 1000)
-    expire_time = tokens.get('expire_time') or tokens.get('expires_at')
-    access_token = tokens.get('access_token')
-    if not access_token:
-        print('⚠️ Sem access_token. Tentando refresh...')
-        refresh_access_token()
-        return
-    if expire_time:
-        # expire_time em ms
-        remaining_ms = expire_time - now_ms
-        if remaining_ms < (min_valid_seconds * 1000):
-            print(f'⏰ Token expira em {remaining_ms/1000:.0f}s. Fazendo refresh...')
-            refresh_access_token()
-    else:
-        # Se não temos expire_time, tentar refresh preventivo
-        print('⚠️ Sem expire_time. Fazendo refresh preventivo...')
-        refresh_access_token()
+    if token_refresher.needs_refresh(tokens, min_valid_seconds):
+        if not tokens.get('access_token'):
+            print('⚠️ Sem access_token. Agendando refresh...')
+        else:
+            print('⏰ Token perto de expirar. Agendando refresh em segundo plano...')
+        token_refresher.kick()
 
 def refresh_access_token():
     """Função auxiliar para fazer refresh do access token"""
@@ -364,12 +423,182 @@ def refresh_access_token():
         print(f'❌ {error_msg}')
         return None, error_msg
 
+# Refresh proativo em segundo plano; o lock entre processos garante um refresh por vez
+token_refresher = TokenRefresher(
+    refresh_access_token,
+    load_fn=load_tokens,
+    reload_fn=_load_tokens_from_store,
+    on_refreshed=token_cache.set
+)
+
+# ===================== CACHE DE DETALHES DE PRODUTO =====================
+product_cache = TTLCache(
+    maxsize=int(os.getenv('PRODUCT_CACHE_SIZE', '256')),
+    ttl=int(os.getenv('PRODUCT_CACHE_TTL', '300')),
+    stale_ttl=int(os.getenv('PRODUCT_CACHE_STALE_TTL', '1800')),
+    name='product'
+)
+
+def _is_cacheable_product(response):
+    """Só guarda respostas válidas do product.get (nunca erros)"""
+    return (response is not None and response.status_code == 200
+            and 'aliexpress_ds_product_get_response' in response.data)
+
+def get_product_detail(product_id, access_token=None, ship_to='BR', currency='BRL', language='pt', timeout=None):
+    """aliexpress.ds.product.get lido através do cache de detalhes.
+    Chave: (product_id, ship_to_country, target_currency, target_language).
+    O AliExpressResponse é compartilhado entre requisições: somente leitura.
+    """
+    key = (str(product_id), ship_to, currency, language)
+
+    def _load():
+        # Recarga em segundo plano usa o token mais recente
+        token = (load_tokens() or {}).get('access_token') or access_token
+        return ali_client.call("aliexpress.ds.product.get", token, {
+            "product_id": str(product_id),
+            "ship_to_country": ship_to,
+            "target_currency": currency,
+            "target_language": language,
+            "remove_personal_benefit": "false"
+        }, timeout=timeout)
+
+    response, _ = product_cache.get_or_load(key, _load, cacheable=_is_cacheable_product)
+    return response
+
+def get_product_details(product_ids, access_token=None, ship_to='BR', currency='BRL', language='pt', deadline=None, timeout=None):
+    """Vários get_product_detail em paralelo; gerador de FanOutResult na ordem de chegada"""
+    return fan_out(
+        lambda product_id: get_product_detail(product_id, access_token, ship_to, currency, language, timeout),
+        product_ids,
+        deadline=deadline
+    )
+
+# ===================== CACHE DE COTAÇÕES DE FRETE =====================
+# TTL por origem da cotação (segundos)
+SHIPPING_CACHE_TTLS = {
+    'aliexpress_api': int(os.getenv('SHIPPING_CACHE_TTL_ALIEXPRESS', '1800')),
+    'correios_api': int(os.getenv('SHIPPING_CACHE_TTL_CORREIOS', '21600')),
+    'own': int(os.getenv('SHIPPING_CACHE_TTL_OWN', '86400')),
+}
+shipping_quote_cache = TTLCache(
+    maxsize=int(os.getenv('SHIPPING_CACHE_SIZE', '2048')),
+    ttl=SHIPPING_CACHE_TTLS['aliexpress_api'],
+    stale_ttl=int(os.getenv('SHIPPING_CACHE_STALE_TTL', '600')),
+    name='shipping'
+)
+
+# SKU usado no freight.query quando a requisição não informa um
+DEFAULT_FREIGHT_SKU_ID = '12000023999200390'
+# cityCode aceito pelo freight.query, por UF. Só entram códigos já confirmados
+# na API; nas demais UFs vai apenas o provinceCode.
+ALIEXPRESS_CITY_CODES = {'SP': 'SAO'}
+
+def quantity_bucket(quantity):
+    """Faixa de quantidade usada na chave do cache: 1, 2, 3-5, 6-10, 11+"""
+    if quantity <= 2:
+        return str(max(1, quantity))
+    if quantity <= 5:
+        return '3-5'
+    if quantity <= 10:
+        return '6-10'
+    return '11+'
+
+def _is_cacheable_quotes(quotes):
+    """Não guarda listas vazias nem o frete padrão de fallback"""
+    return bool(quotes) and not any('FALLBACK' in str(q.get('service_code', '')) for q in quotes)
+
+def get_cached_shipping_quotes(source, loader, product_id, destination_cep, items, sku_id=None):
+    """
+    Cotações lidas através do cache de frete.
+    Chave: (origem, product_id, selectedSkuId, UF do CEP, faixa de quantidade,
+    peso unitário dos itens); o AliExpress não recebe peso, então sua chave
+    não leva peso. O TTL depende da origem. Devolve (quotes, cached), sempre
+    com cópias das cotações guardadas.
+    """
+    uf = uf_for_cep(destination_cep)
+    if not uf:
+        # CEP fora das faixas conhecidas: consulta direta, sem cache
+        return loader(), False
+
+    quantity = sum(int(it.get('quantity', 1)) for it in items)
+    # Peso por unidade (não o total): quantidades da mesma faixa dividem a entrada
+    unit_weights = () if source == 'aliexpress_api' else tuple(
+        round(float(it.get('weight', 0.5)), 2) for it in items
+    )
+    key = (source, str(product_id), str(sku_id or ''), uf, quantity_bucket(quantity), unit_weights)
+
+    quotes, cached = shipping_quote_cache.get_or_load(
+        key, loader, cacheable=_is_cacheable_quotes, ttl=SHIPPING_CACHE_TTLS.get(source)
+    )
+    # Cotações são compartilhadas (inclusive a recém-guardada): copiar ajustando o CEP de destino
+    if quotes is not None:
+        quotes = [dict(q, destination_cep=destination_cep) for q in quotes]
+    return quotes, cached
+
+# Cliente dos Correios (pool, timeout adaptativo, cache e tabela local de preços)
+correios_client = CorreiosClient()
+
+# ===================== MATRIZ DE FRETE POR PRODUTO =====================
+def _shipping_matrix_collection():
+    return firestore.client().collection('shipping_matrix') if FIREBASE_AVAILABLE else None
+
+def _rebuild_shipping_matrix(product_id, matrix):
+    """Recalcula a matriz com o peso/dimensões usados na importação"""
+    weight = matrix.get('weight') or 0.5
+    dimensions = matrix.get('dimensions')
+    shipping_data, report = calculate_shipping_for_main_ceps(product_id, weight, dimensions)
+    return build_matrix(product_id, shipping_data, report, weight, dimensions, sku_id=DEFAULT_FREIGHT_SKU_ID)
+
+shipping_matrix_store = ShippingMatrixStore(
+    collection_factory=_shipping_matrix_collection,
+    rebuild_fn=_rebuild_shipping_matrix
+)
+
+def quote_from_shipping_matrix(product_id, destination_cep, items, sku_id=None):
+    """
+    Cotações a partir da matriz pré-calculada (UF mais próxima do destino).
+    A matriz é calculada para 1 unidade e para o SKU usado na importação;
+    outras quantidades e SKUs vão ao vivo.
+    Devolve (quotes, uf_da_matriz) ou (None, None).
+    """
+    if sum(int(it.get('quantity', 1)) for it in items) != 1:
+        return None, None
+    region, services = shipping_matrix_store.lookup(product_id, destination_cep, sku_id=sku_id)
+    if not services:
+        return None, None
+
+    quotes = []
+    for service, entry in services.items():
+        days = int(entry.get('days') or 25)
+        quotes.append({
+            'service_code': entry.get('service_code') or service.upper(),
+            'service_name': entry.get('service_name') or 'AliExpress',
+            'carrier': entry.get('carrier') or 'AliExpress',
+            'price': entry.get('price', 0.0),
+            'currency': 'BRL',
+            'estimated_days': days,
+            'max_delivery_days': days,
+            'tracking_available': True,
+            'free_shipping': not entry.get('price'),
+            'origin_cep': STORE_ORIGIN_CEP,
+            'destination_cep': destination_cep,
+            'notes': f'Frete pré-calculado na importação (região {region})'
+        })
+    return quotes, region
+
 # ===================== FRETE PRÓPRIO (ENVIO PELA LOJA) =====================
+# Tarifas do frete próprio carregadas uma vez em arrays NumPy
+own_rate_engine = OwnShippingRateEngine()
+# Frete próprio dos CEPs principais na importação (tarifa própria, sem franquia, prazo por região)
+own_import_rate_engine = OwnShippingRateEngine(os.getenv('OWN_RATES_IMPORT_FILE', os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), 'data', 'own_shipping_rates_import.csv'
+)))
+
 def calculate_own_shipping_quotes(destination_cep, items):
     """Calcula cotações de frete próprio a partir da loja.
 
-    Regras simples:
-      - preço base + adicional por kg acima de 1kg
+    Regras (data/own_shipping_rates.csv via OwnShippingRateEngine):
+      - preço base + adicional por kg, por serviço e zona do CEP
       - prazo = inbound (chegada do produto na loja) + manuseio + trânsito
     """
     origin_cep = os.getenv('STORE_ORIGIN_CEP', '01001-000')
@@ -382,37 +611,16 @@ def calculate_own_shipping_quotes(destination_cep, items):
         weight = float(it.get('weight', 0.5))
         total_weight += weight * qty
 
-    services = [
-        {
-            'code': 'OWN_ECONOMY',
-            'name': 'Entrega Padrão (Loja)',
-            'base': 19.9,
-            'perKg': 6.5,
-            'carrier': 'Correios/Parceiro',
-            'transitDays': 5,
-        },
-        {
-            'code': 'OWN_EXPRESS',
-            'name': 'Entrega Expressa (Loja)',
-            'base': 29.9,
-            'perKg': 9.9,
-            'carrier': 'Parceiro Expresso',
-            'transitDays': 2,
-        },
-    ]
-
     quotes = []
-    for s in services:
-        add_kg = max(0.0, total_weight - 1.0)
-        price = s['base'] + add_kg * s['perKg']
-        eta_days = inbound_days + handling_days + s['transitDays']
+    for service, rate in own_rate_engine.quote(destination_cep, total_weight).items():
+        eta_days = inbound_days + handling_days + rate['days']
         eta_ts = int(time.time()) + eta_days * 24 * 60 * 60
 
         quotes.append({
-            'service_code': s['code'],
-            'service_name': s['name'],
-            'carrier': s['carrier'],
-            'price': round(price, 2),
+            'service_code': rate['service_code'],
+            'service_name': f"{rate['service_name']} (Loja)",
+            'carrier': rate['carrier'],
+            'price': rate['price'],
             'currency': 'BRL',
             'estimated_days': eta_days,
             'estimated_delivery_timestamp': eta_ts,
@@ -424,133 +632,285 @@ def calculate_own_shipping_quotes(destination_cep, items):
     return quotes
 
 
+def is_aliexpress_product_id(product_id):
+    """AliExpress ID válido é um número longo (15-18 dígitos)"""
+    product_id = str(product_id or '')
+    return (product_id.isdigit() and 
+            15 <= len(product_id) <= 18 and
+            product_id != 'produto_sem_aliexpress' and 
+            product_id != 'produto_frete_gratis')
+
+# Orçamento total de latência do /shipping/quote e ponto de disparo do estágio seguinte
+SHIPPING_QUOTE_BUDGET = int(os.getenv('SHIPPING_QUOTE_BUDGET_MS', '8000')) / 1000
+SHIPPING_QUOTE_HEDGE_AT = float(os.getenv('SHIPPING_QUOTE_HEDGE_AT', '0.5'))
+# Timeout (s) de chamadas que rodam depois do prazo (recarga em segundo plano do cache)
+SHIPPING_QUOTE_LATE_TIMEOUT = float(os.getenv('SHIPPING_QUOTE_LATE_TIMEOUT', '2'))
+
+def _default_shipping_quote(destination_cep, service_code='FALLBACK_DEFAULT', carrier='Loja'):
+    """Frete padrão (último recurso, sem rede)"""
+    return [{
+        'service_code': service_code,
+        'service_name': 'Frete Padrão',
+        'carrier': carrier,
+        'price': 15.0,
+        'currency': 'BRL',
+        'estimated_days': 5,
+        'max_delivery_days': 7,
+        'tracking_available': True,
+        'free_shipping': False,
+        'origin_cep': STORE_ORIGIN_CEP,
+        'destination_cep': destination_cep,
+        'notes': 'Frete padrão (fallback final)'
+    }]
+
+def compute_shipping_quote(product_id, destination_cep, items, sku_id=None, budget=None):
+    """
+    Cotação de frete de um produto (fluxo do /shipping/quote): AliExpress
+    (matriz → cache → API, com Correios disparado em paralelo quando o
+    AliExpress passa do seu trecho do orçamento → padrão), frete grátis ou
+    Correios. Nenhum caminho passa de budget segundos.
+    Devolve dict com quotes, cached, mode, source, notes, stage e latency_ms.
+    """
+    # Verificar se o produto tem AliExpress ID
+    product_id = str(product_id)
+    first_item = items[0]
+    has_ali_express_id = is_aliexpress_product_id(product_id)
+    has_free_shipping = first_item.get('has_free_shipping', False)
+    budget = SHIPPING_QUOTE_BUDGET if budget is None else budget
+    
+    log_shipping.debug('quote.flow', product_id=product_id, aliexpress=has_ali_express_id, free_shipping=has_free_shipping)
+    
+    def _correios_stage(deadline):
+        return get_cached_shipping_quotes(
+            'correios_api',
+            lambda: calculate_correios_shipping_quotes(
+                destination_cep, items, timeout=remaining(deadline, default=SHIPPING_QUOTE_LATE_TIMEOUT)
+            ),
+            product_id, destination_cep, items
+        )
+    
+    if has_ali_express_id:
+        # FLUXO 1: Calcular frete pela API do AliExpress
+        matrix_quotes, matrix_region = quote_from_shipping_matrix(product_id, destination_cep, items, sku_id=sku_id)
+        if matrix_quotes:
+            return {'quotes': matrix_quotes, 'cached': True, 'mode': 'aliexpress_direct', 'source': 'shipping_matrix',
+                    'notes': f'Frete pré-calculado pelo AliExpress (região {matrix_region})',
+                    'stage': 'shipping_matrix', 'latency_ms': 0.0}
+        
+        def _aliexpress_stage(deadline):
+            return get_cached_shipping_quotes(
+                'aliexpress_api',
+                lambda: calculate_real_shipping_quotes(product_id, destination_cep, items, sku_id=sku_id,
+                                                       timeout=remaining(deadline, default=SHIPPING_QUOTE_LATE_TIMEOUT)),
+                product_id, destination_cep, items, sku_id=sku_id
+            )
+        
+        stages = [
+            HedgeStage('aliexpress_api', _aliexpress_stage, SHIPPING_QUOTE_HEDGE_AT),
+            HedgeStage('correios_api', _correios_stage, 1.0),
+        ]
+    elif has_free_shipping:
+        # FLUXO 2A: Frete grátis
+        quotes = [{
+            'service_code': 'FREE_SHIPPING',
+            'service_name': 'Frete Grátis',
+            'carrier': 'Loja',
+            'price': 0.0,
+            'currency': 'BRL',
+            'estimated_days': 5,
+            'max_delivery_days': 7,
+            'tracking_available': False,
+            'free_shipping': True,
+            'origin_cep': STORE_ORIGIN_CEP,
+            'destination_cep': destination_cep,
+            'notes': 'Frete gratuito para este produto'
+        }]
+        return {'quotes': quotes, 'cached': False, 'mode': 'own_shipping', 'source': 'store',
+                'notes': 'Frete gratuito', 'stage': 'store', 'latency_ms': 0.0}
+    else:
+        # FLUXO 2B: Calcular pelos Correios
+        stages = [HedgeStage('correios_api', _correios_stage, 1.0)]
+    
+    outcome = run_hedged(stages, budget, is_valid=lambda value: _is_cacheable_quotes(value[0]))
+    latency_ms = round(outcome.elapsed * 1000, 1)
+    log_shipping.info('quote.chain', product_id=product_id, stage=outcome.stage, latency_ms=latency_ms,
+                      errors=outcome.errors or None)
+    
+    if outcome.stage == 'aliexpress_api':
+        quotes, cached = outcome.value
+        return {'quotes': quotes, 'cached': cached, 'mode': 'aliexpress_direct', 'source': 'aliexpress_api',
+                'notes': 'Frete calculado via API oficial do AliExpress', 'stage': outcome.stage, 'latency_ms': latency_ms}
+    if outcome.stage == 'correios_api':
+        quotes, cached = outcome.value
+        notes = 'Frete calculado via API dos Correios' + (' (fallback)' if has_ali_express_id else '')
+        return {'quotes': quotes, 'cached': cached, 'mode': 'own_shipping', 'source': 'correios_api',
+                'notes': notes, 'stage': outcome.stage, 'latency_ms': latency_ms}
+    
+    # Nenhum estágio respondeu dentro do orçamento: frete padrão
+    print(f'❌ Sem cotação dentro do orçamento ({latency_ms} ms): {outcome.errors}')
+    if has_ali_express_id:
+        quotes = _default_shipping_quote(destination_cep)
+    else:
+        quotes = _default_shipping_quote(destination_cep, 'CORREIOS_FALLBACK', 'Correios')
+    return {'quotes': quotes, 'cached': False, 'mode': 'own_shipping', 'source': 'fallback',
+            'notes': quotes[0]['notes'], 'stage': 'fallback', 'latency_ms': latency_ms}
+
 @app.route('/shipping/quote', methods=['POST'])
 def shipping_quote():
     try:
-        print(f'📦 Recebendo requisição de frete: {request.get_data()}')
         data = request.get_json(silent=True) or {}
-        print(f'📦 Dados recebidos: {data}')
         
         destination_cep = data.get('destination_cep')
         items = data.get('items', [])
         product_id = data.get('product_id')  # Novo campo obrigatório
+        sku_id = data.get('sku_id') or (items[0].get('sku_id') if isinstance(items, list) and items else None)
         
-        print(f'📦 CEP destino: {destination_cep}')
-        print(f'📦 Items: {items}')
-        print(f'📦 Product ID: {product_id}')
+        log_shipping.debug('quote.request', product_id=product_id, cep=destination_cep, body=lazy_json(data))
         
         if not destination_cep or not isinstance(items, list) or len(items) == 0 or not product_id:
             error_msg = f'Parâmetros inválidos: destination_cep={destination_cep}, items={items}, product_id={product_id}'
             print(f'❌ {error_msg}')
             return jsonify({'success': False, 'message': error_msg}), 400
 
-        # Verificar se o produto tem AliExpress ID
-        first_item = items[0]
-        # AliExpress ID válido é um número longo (15-18 dígitos)
-        has_ali_express_id = (product_id and 
-                             product_id.isdigit() and 
-                             len(product_id) >= 15 and 
-                             len(product_id) <= 18 and
-                             product_id != 'produto_sem_aliexpress' and 
-                             product_id != 'produto_frete_gratis')
-        has_free_shipping = first_item.get('has_free_shipping', False)
-        
-        print(f'🔍 Produto tem AliExpress ID: {has_ali_express_id}')
-        print(f'📦 Frete grátis: {has_free_shipping}')
-        
-        if has_ali_express_id:
-            # FLUXO 1: Calcular frete pela API do AliExpress
-            print('🌐 Usando API do AliExpress para cálculo de frete')
-            try:
-                quotes = calculate_real_shipping_quotes(product_id, destination_cep, items)
-                fulfillment_mode = 'aliexpress_direct'
-                source = 'aliexpress_api'
-                notes = 'Frete calculado via API oficial do AliExpress'
-            except Exception as e:
-                print(f'❌ Erro na API AliExpress: {e}')
-                # Se houver erro na API do AliExpress, fazer fallback para Correios
-                print(f'🔄 Erro na API AliExpress. Fazendo fallback para Correios...')
-                try:
-                    quotes = calculate_correios_shipping_quotes(destination_cep, items)
-                    fulfillment_mode = 'own_shipping'
-                    source = 'correios_api'
-                    notes = 'Frete calculado via API dos Correios (fallback)'
-                except Exception as correios_error:
-                    print(f'❌ Erro também no fallback Correios: {correios_error}')
-                    # Retornar frete padrão como último recurso
-                    quotes = [{
-                        'service_code': 'FALLBACK_DEFAULT',
-                        'service_name': 'Frete Padrão',
-                        'carrier': 'Loja',
-                        'price': 15.0,
-                        'currency': 'BRL',
-                        'estimated_days': 5,
-                        'max_delivery_days': 7,
-                        'tracking_available': True,
-                        'free_shipping': False,
-                        'origin_cep': STORE_ORIGIN_CEP,
-                        'destination_cep': destination_cep,
-                        'notes': 'Frete padrão (fallback final)'
-                    }]
-                    fulfillment_mode = 'own_shipping'
-                    source = 'fallback'
-                    notes = 'Frete padrão (fallback final)'
-        elif has_free_shipping:
-            # FLUXO 2A: Frete grátis
-            print('🎁 Produto com frete grátis')
-            quotes = [{
-                'service_code': 'FREE_SHIPPING',
-                'service_name': 'Frete Grátis',
-                'carrier': 'Loja',
-                'price': 0.0,
-                'currency': 'BRL',
-                'estimated_days': 5,
-                'max_delivery_days': 7,
-                'tracking_available': False,
-                'free_shipping': True,
-                'origin_cep': STORE_ORIGIN_CEP,
-                'destination_cep': destination_cep,
-                'notes': 'Frete gratuito para este produto'
-            }]
-            fulfillment_mode = 'own_shipping'
-            source = 'store'
-            notes = 'Frete gratuito'
-        else:
-            # FLUXO 2B: Calcular pelos Correios
-            print('📮 Usando API dos Correios para cálculo de frete')
-            try:
-                quotes = calculate_correios_shipping_quotes(destination_cep, items)
-                fulfillment_mode = 'own_shipping'
-                source = 'correios_api'
-                notes = 'Frete calculado via API dos Correios'
-            except Exception as e:
-                print(f'❌ Erro na API dos Correios: {e}')
-                # Fallback para frete padrão
-                quotes = [{
-                    'service_code': 'CORREIOS_FALLBACK',
-                    'service_name': 'Frete Padrão',
-                    'carrier': 'Correios',
-                    'price': 15.0,
-                    'currency': 'BRL',
-                    'estimated_days': 5,
-                    'max_delivery_days': 7,
-                    'tracking_available': True,
-                    'free_shipping': False,
-                    'origin_cep': '01001-000',
-                    'destination_cep': destination_cep,
-                    'notes': 'Frete padrão (fallback)'
-                }]
-                fulfillment_mode = 'own_shipping'
-                source = 'fallback'
-                notes = 'Frete padrão (fallback)'
-        
-        print(f'✅ Cotações calculadas: {quotes}')
-        
-        return jsonify({'success': True, 'data': quotes, 'fulfillment': {
-            'mode': fulfillment_mode,
-            'source': source,
-            'notes': notes
+        result = compute_shipping_quote(product_id, destination_cep, items, sku_id=sku_id)
+        quotes, cached = result['quotes'], result['cached']
+        
+        log_shipping.info('quote.done', product_id=product_id, options=len(quotes), cached=cached,
+                          stage=result['stage'], latency_ms=result['latency_ms'])
+        
+        return jsonify({'success': True, 'data': quotes, 'cached': cached, 'fulfillment': {
+            'mode': result['mode'],
+            'source': result['source'],
+            'notes': result['notes'],
+            'stage': result['stage'],
+            'latency_ms': result['latency_ms']
         }})
+    except Exception as e:
+        print(f'❌ Erro ao calcular cotação de frete: {e}')
+        return jsonify({'success': False, 'message': f'Erro ao calcular frete: {str(e)}'}), 500
+
+# Prazo comum (segundos) para cotar todos os produtos do carrinho
+CART_QUOTE_DEADLINE = float(os.getenv('CART_QUOTE_DEADLINE', '15'))
+
+def _cart_quote_groups(items):
+    """
+    Agrupa as linhas do carrinho em envios: um por produto/SKU do AliExpress,
+    um pacote da loja (Correios) com todos os demais e um para frete grátis.
+    """
+    groups = {}
+    for index, item in enumerate(items):
+        product_id = str(item.get('product_id') or '')
+        if is_aliexpress_product_id(product_id):
+            key = f"{product_id}:{item.get('sku_id') or ''}"
+        elif item.get('has_free_shipping', False):
+            key = 'store_free'
+        else:
+            key = 'store'
+        group = groups.setdefault(key, {
+            'key': key,
+            'product_id': product_id or key,
+            'sku_id': item.get('sku_id'),
+            'items': [],
+            'indexes': []
+        })
+        group['items'].append(item)
+        group['indexes'].append(index)
+    return list(groups.values())
+
+def _consolidate_cart_quotes(groups):
+    """Totais do carrinho: mais barato e mais rápido por envio, somados"""
+    options = []
+    for service, service_name, pick in (
+        ('economy', 'Mais econômico', lambda q: (q.get('price', 0.0), q.get('estimated_days', 0))),
+        ('express', 'Mais rápido', lambda q: (q.get('estimated_days', 0), q.get('price', 0.0))),
+    ):
+        total, days, max_days, selection = 0.0, 0, 0, []
+        for group in groups:
+            if not group['quotes']:
+                continue
+            quote = min(group['quotes'], key=pick)
+            total += float(quote.get('price', 0.0))
+            days = max(days, int(quote.get('estimated_days', 0)))
+            max_days = max(max_days, int(quote.get('max_delivery_days', quote.get('estimated_days', 0))))
+            selection.append({
+                'group': group['key'],
+                'service_code': quote.get('service_code'),
+                'service_name': quote.get('service_name'),
+                'price': quote.get('price', 0.0)
+            })
+        option = {
+            'service': service,
+            'service_name': service_name,
+            'total_price': round(total, 2),
+            'currency': 'BRL',
+            'estimated_days': days,
+            'max_delivery_days': max_days,
+            'selection': selection
+        }
+        # Quando o mais rápido coincide com o mais barato, devolve só um
+        if options and [s['service_code'] for s in options[0]['selection']] == [s['service_code'] for s in selection]:
+            continue
+        options.append(option)
+    return options
+
+@app.route('/shipping/quote/cart', methods=['POST'])
+def shipping_quote_cart():
+    """Cotação do carrinho inteiro: envios cotados em paralelo e totais consolidados"""
+    try:
+        data = request.get_json(silent=True) or {}
+        destination_cep = data.get('destination_cep')
+        items = data.get('items', [])
+        
+        if not destination_cep or not isinstance(items, list) or len(items) == 0:
+            return jsonify({'success': False, 'message': 'Parâmetros inválidos: destination_cep e items são obrigatórios'}), 400
+        
+        groups = _cart_quote_groups(items)
+        print(f'🛒 Cotando carrinho: {len(items)} itens em {len(groups)} envios para {destination_cep}')
+        
+        by_key = {group['key']: group for group in groups}
+        deadline = time.monotonic() + CART_QUOTE_DEADLINE
+        for res in fan_out(
+            lambda g: compute_shipping_quote(g['product_id'], destination_cep, g['items'], sku_id=g['sku_id']),
+            groups, deadline=deadline
+        ):
+            group = by_key[res.item['key']]
+            group['latency_ms'] = round(res.elapsed * 1000, 1)
+            if res.error is None:
+                group.update(res.value)
+            else:
+                print(f'❌ Erro ao cotar envio {group["key"]}: {res.error}')
+                group.update({
+                    'quotes': _default_shipping_quote(destination_cep),
+                    'cached': False,
+                    'mode': 'own_shipping',
+                    'source': 'fallback',
+                    'notes': 'Frete padrão (fallback final)',
+                    'error': str(res.error)
+                })
+        
+        options = _consolidate_cart_quotes(groups)
+        breakdown = [{
+            'group': g['key'],
+            'product_id': g['product_id'],
+            'sku_id': g['sku_id'],
+            'items': g['indexes'],
+            'quantity': sum(int(it.get('quantity', 1)) for it in g['items']),
+            'quotes': g['quotes'],
+            'cached': g['cached'],
+            'fulfillment': {'mode': g['mode'], 'source': g['source'], 'notes': g['notes']},
+            'latency_ms': g['latency_ms'],
+            **({'error': g['error']} if 'error' in g else {})
+        } for g in groups]
+        
+        print(f'✅ Carrinho cotado: {len(options)} opções consolidadas')
+        return jsonify({
+            'success': True,
+            'data': {'options': options, 'breakdown': breakdown},
+            'cached': all(g['cached'] for g in groups)
+        })
+    except Exception as e:
+        print(f'❌ Erro ao cotar carrinho: {e}')
+        return jsonify({'success': False, 'message': f'Erro ao calcular frete do carrinho: {str(e)}'}), 500
 
 def generate_gop_signature(params, app_secret):
     """Gera assinatura GOP para AliExpress API"""
@@ -570,19 +930,6 @@ def generate_gop_signature(params, app_secret):
     
     return signature
 
-def generate_api_signature(params, app_secret):
-    """Gerar assinatura para APIs de negócios do AliExpress"""
-    # 1. Ordenar e concatenar key+value
-    sorted_params = "".join(f"{k}{str(v)}" for k, v in sorted(params.items()))
-    
-    # 2. Concatenar secret + params + secret
-    to_sign = f"{app_secret}{sorted_params}{app_secret}"
-    
-    # 3. Gerar MD5 maiúsculo
-    signature = hashlib.md5(to_sign.encode("utf-8")).hexdigest().upper()
-    
-    return signature
-
 def create_test_page():
     """Cria página HTML de teste"""
     base_url = os.getenv('RENDER_EXTERNAL_URL', 'https://service-api-aliexpress.mercadodasophia.com.br')
@@ -1315,20 +1662,9 @@ def token_status():
     # Verificar se o token ainda é válido (opcional)
     try:
         # Fazer uma requisição de teste para verificar se o token ainda funciona
-        params = {
-            "method": "aliexpress.ds.category.get",
-            "app_key": APP_KEY,
-            "timestamp": int(time.time() * 1000),
-            "sign_method": "md5",
-            "format": "json",
-            "v": "2.0",
-            "access_token": access_token,
+        response = ali_client.call("aliexpress.ds.category.get", access_token, {
             "parent_category_id": "0"
-        }
-        
-        params["sign"] = generate_api_signature(params, APP_SECRET)
-        
-        response = requests.get('https://api-sg.aliexpress.com/sync', params=params)
+        })
         
         if response.status_code == 200:
             data = response.json()
@@ -1338,7 +1674,7 @@ def token_status():
                     # Tentar refresh token automaticamente
                     if refresh_token:
                         print(f'🔄 Token expirado, tentando refresh automaticamente...')
-                        new_tokens, error = refresh_access_token()
+                        new_tokens, error = token_refresher.refresh_now(force=True)
                         
                         if new_tokens:
                             return jsonify({
@@ -1514,7 +1850,7 @@ def oauth_callback():
 @app.route('/api/aliexpress/token/refresh', methods=['POST'])
 def refresh_token():
     """Refresh token usando o refresh_token existente"""
-    new_tokens, error = refresh_access_token()
+    new_tokens, error = token_refresher.refresh_now(force=True)
     
     if not new_tokens:
         return jsonify({
@@ -1641,14 +1977,7 @@ def products():
 
     try:
         # Parâmetros para a API conforme documentação
-        params = {
-            "method": "aliexpress.ds.text.search",
-            "app_key": APP_KEY,
-            "timestamp": int(time.time() * 1000),
-            "sign_method": "md5",
-            "format": "json",
-            "v": "2.0",
-            "access_token": tokens['access_token'],
+        params = ali_client.build_params("aliexpress.ds.text.search", tokens['access_token'], {
             "keyWord": request.args.get('q', 'electronics'),  # Correto conforme documenta├º├úo
             "countryCode": "BR",  # obrigatório para Brasil
 "currency": "BRL",    # obrigatório para Brasil
@@ -1656,43 +1985,19 @@ def products():
 "pageSize": "400",    # Tamanho da página (aumentado para 100)
 "pageIndex": "1",     # índice da página
             "sortBy": "orders,desc"  # Ordenar por popularidade
-        }
-        
-        # Gerar assinatura
-        params["sign"] = generate_api_signature(params, APP_SECRET)
-        
-        # Fazer requisição HTTP direta para /sync
-        response = requests.get('https://api-sg.aliexpress.com/sync', params=params)
+        })
         
-        # Salvar resposta completa em arquivo JSON (apenas em desenvolvimento)
-        if os.getenv('FLASK_ENV') == 'development':
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            query = request.args.get('q', 'electronics')
-            log_filename = f"logs/product_search_{query}_{timestamp}.json"
-            
-            # Criar diretório logs se não existir
-            os.makedirs("logs", exist_ok=True)
-            
-            # Salvar resposta bruta (limitada a 1MB)
-            response_text = response.text[:1024*1024]  # Limitar a 1MB
-            with open(log_filename, 'w', encoding='utf-8') as f:
-                f.write(response_text)
+        # Fazer requisição HTTP direta para /sync (resposta amostrada pelo capture_buffer)
+        response = ali_client.send(params)
         
         print(f'📡 Status da resposta: {response.status_code}')
         print(f'📄 Tamanho da resposta: {len(response.text)} caracteres')
-        print(f'💾 Resposta completa salva em: {log_filename}')
         
         if response.status_code == 200:
             data = response.json()
             
-            # Salvar dados processados também
-            processed_log_filename = f"logs/product_search_processed_{query}_{timestamp}.json"
-            with open(processed_log_filename, 'w', encoding='utf-8') as f:
-                json.dump(data, f, indent=2, ensure_ascii=False)
-            
             print(f'🔍 ANÁLISE ESTRUTURAL - BUSCA PRODUTOS:')
             print(f'📊 Keys do nível raiz: {list(data.keys())}')
-            print(f'💾 Dados processados salvos em: {processed_log_filename}')
             
             # Verificar se há produtos na resposta
             if 'aliexpress_ds_text_search_response' in data:
@@ -1757,14 +2062,10 @@ def products():
                         'discount', 'evaluateRate', 'orders', 'productUrl', 'imageUrl'
                     ]
                     
-                    for field in important_fields:
-                        value = first_product.get(field, 'N/A')
-                        print(f'  - {field}: {value}')
-                    
-                    # Mostrar estrutura completa do primeiro produto
-                    print(f'📄 ESTRUTURA COMPLETA DO PRIMEIRO PRODUTO:')
-                    print(json.dumps(first_product, indent=2, ensure_ascii=False))
-                    print(f'  - Keys dispon├¡veis: {list(first_product.keys())}')
+                    log_ali.debug('products.first_product',
+                                  fields={field: first_product.get(field, 'N/A') for field in important_fields},
+                                  keys=list(first_product.keys()),
+                                  payload=lazy_json(first_product))
                 
                 return jsonify({
                     'success': True, 
@@ -1790,23 +2091,13 @@ def categories():
 
     try:
         # Parâmetros para a API conforme documentação
-        params = {
-            "method": "aliexpress.ds.category.get",
-            "app_key": APP_KEY,
-            "timestamp": int(time.time() * 1000),
-            "sign_method": "md5",
-            "format": "json",
-            "v": "2.0",
-            "access_token": tokens['access_token'],
+        params = ali_client.build_params("aliexpress.ds.category.get", tokens['access_token'], {
             "language": "en"
-        }
-        
-        # Gerar assinatura
-        params["sign"] = generate_api_signature(params, APP_SECRET)
+        })
         
         # Fazer requisição HTTP direta para /sync
-        response = requests.get('https://api-sg.aliexpress.com/sync', params=params)
-        print(f'Ô£à Resposta categorias: {response.text}')
+        response = ali_client.send(params)
+        log_ali.debug('categories.response', status=response.status_code, body=lazy_text(response.text))
         
         if response.status_code == 200:
             data = response.json()
@@ -1830,43 +2121,20 @@ def get_category_name(category_id):
 
     try:
         # Parâmetros para a API conforme documentação
-        params = {
-            "method": "aliexpress.ds.category.get",
-            "app_key": APP_KEY,
-            "timestamp": int(time.time() * 1000),
-            "sign_method": "md5",
-            "format": "json",
-            "v": "2.0",
-            "access_token": tokens['access_token'],
+        params = ali_client.build_params("aliexpress.ds.category.get", tokens['access_token'], {
             "categoryId": category_id,
             "language": "pt"  # Português
-        }
-        
-        # Gerar assinatura
-        params["sign"] = generate_api_signature(params, APP_SECRET)
+        })
         
-        print(f'🔍 Debug - Parâmetros enviados para categoria {category_id}: {params}')
+        log_ali.debug('category.request', category_id=category_id, params=lazy_json(redact_params(params)))
         
         # Fazer requisição HTTP direta para /sync
-        response = requests.get('https://api-sg.aliexpress.com/sync', params=params)
-        
-        # Salvar resposta completa em arquivo JSON
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        log_filename = f"logs/category_get_{category_id}_{timestamp}.json"
-        
-        # Criar diretório logs se não existir
-        os.makedirs("logs", exist_ok=True)
+        response = ali_client.send(params)
         
-        # Salvar resposta bruta
-        with open(log_filename, 'w', encoding='utf-8') as f:
-            f.write(response.text)
-        
-        print(f'📡 Resposta categoria {category_id}: {response.text}')
-        print(f'💾 Resposta completa salva em: {log_filename}')
+        log_ali.debug('category.response', category_id=category_id, status=response.status_code, body=lazy_text(response.text))
         
         if response.status_code == 200:
             data = response.json()
-            print(f'📊 Dados parseados: {data}')
             
             # Verificar se a resposta tem a estrutura esperada
             aliexpress_response = data.get('aliexpress_ds_category_get_response', {})
@@ -1916,60 +2184,21 @@ def product_details(product_id):
     if not tokens or not tokens.get('access_token'):
         return jsonify({'success': False, 'message': 'Token não encontrado. Faça autorização primeiro.'}), 401
     try:
-        # Parâmetros para a API conforme documentação
-        params = {
-            "method": "aliexpress.ds.product.get",
-            "app_key": APP_KEY,
-            "timestamp": int(time.time() * 1000),
-            "sign_method": "md5",
-            "format": "json",
-            "v": "2.0",
-            "access_token": tokens['access_token'],
-            "product_id": product_id,
-            "ship_to_country": "BR",   # obrigatório para Brasil
-            "target_currency": "BRL",  # obrigatório para Brasil
-            "target_language": "pt",   # obrigatório para Brasil
-            "remove_personal_benefit": "false"
-        }
-        
-        # Gerar assinatura
-        params["sign"] = generate_api_signature(params, APP_SECRET)
+        # Detalhes via cache (BR/BRL/pt obrigatórios para Brasil)
+        response = get_product_detail(product_id, tokens['access_token'])
         
-        # Fazer requisição HTTP direta para /sync
-        response = requests.get('https://api-sg.aliexpress.com/sync', params=params)
-        
-        # Salvar resposta completa em arquivo JSON
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        log_filename = f"logs/product_details_{product_id}_{timestamp}.json"
-        
-        # Criar diretório logs se não existir
-        os.makedirs("logs", exist_ok=True)
-        
-        # Salvar resposta bruta
-        with open(log_filename, 'w', encoding='utf-8') as f:
-            f.write(response.text)
-        
-        print(f'📡 Resposta detalhes produto {product_id}: {response.text[:500]}...')
-        print(f'💾 Resposta completa salva em: {log_filename}')
+        log_ali.info('product_details.response', product_id=product_id, status=response.status_code)
 
         if response.status_code == 200:
             data = response.json()
             
-            # Salvar dados processados também
-            processed_log_filename = f"logs/product_details_processed_{product_id}_{timestamp}.json"
-            with open(processed_log_filename, 'w', encoding='utf-8') as f:
-                json.dump(data, f, indent=2, ensure_ascii=False)
-            
-            print(f'✅ ESTRUTURA COMPLETA - DETALHES PRODUTO {product_id}:')
-            print(json.dumps(data, indent=2, ensure_ascii=False))
-            print(f'💾 Dados processados salvos em: {processed_log_filename}')
+            log_ali.debug('product_details.payload', product_id=product_id, payload=lazy_json(data))
             
             # Verificar se há dados na resposta
             if 'aliexpress_ds_product_get_response' in data:
                 product_response = data['aliexpress_ds_product_get_response']
                 result = product_response.get('result', {})
-                print(f'🔍 ANÁLISE ESTRUTURA - RESULT:')
-                print(f'  - Keys disponíveis: {list(result.keys())}')
+                log_ali.debug('product_details.result_keys', product_id=product_id, keys=list(result.keys()))
             else:
                 print(f'❌ ESTRUTURA INESPERADA: {list(data.keys())}')
                 return jsonify({'success': False, 'error': data}), 400
@@ -2064,13 +2293,13 @@ def product_details(product_id):
                 sku_info = result['ae_item_sku_info_dtos']
                 if 'ae_item_sku_info_d_t_o' in sku_info:
                     skus = sku_info['ae_item_sku_info_d_t_o']
-                    skus_list = skus if isinstance(skus, list) else [skus]
+                    # Cópia da lista: a resposta pode ser compartilhada entre requisições
+                    skus_list = list(skus) if isinstance(skus, list) else [skus]
                     
-                    print(f'🔍 PROCESSANDO {len(skus_list)} SKUs COM DADOS COMPLETOS')
+                    log_ali.debug('product_details.skus', product_id=product_id, count=len(skus_list))
                     
                     # Processar cada SKU com todos os campos da documentação
                     for i, sku in enumerate(skus_list):
-                        print(f'  SKU {i+1}: {sku.get("sku_id", "N/A")}')
                         
                         # Garantir que todos os campos estão presentes
                         processed_sku = {
@@ -2100,8 +2329,6 @@ def product_details(product_id):
                             if isinstance(properties, list):
                                 processed_properties = []
                                 for prop in properties:
-                                    print(f'    Propriedade: {prop.get("sku_property_name")} = {prop.get("sku_property_value")} (def: {prop.get("property_value_definition_name")})')
-                                    
                                     processed_prop = {
                                         'sku_property_name': prop.get('sku_property_name', ''),
                                         'sku_property_value': prop.get('sku_property_value', ''),
@@ -2116,11 +2343,9 @@ def product_details(product_id):
                                         real_color = prop.get('property_value_definition_name')
                                         if real_color and real_color.lower() not in ['branco', 'white']:
                                             processed_prop['sku_property_value'] = real_color
-                                            print(f'      ✅ Cor corrigida: {real_color}')
                                     # Para outros atributos, garantir que o valor está correto
                                     elif prop.get('property_value_definition_name'):
                                         processed_prop['sku_property_value'] = prop.get('property_value_definition_name')
-                                        print(f'      ✅ Atributo corrigido: {prop.get("property_value_definition_name")}')
                                     
                                     processed_properties.append(processed_prop)
                                 
@@ -2132,18 +2357,13 @@ def product_details(product_id):
                     
                     processed_data['variations'] = skus_list
             
-            print(f'📊 DADOS PROCESSADOS PARA FRONTEND:')
-            print(f'  - Título: {processed_data["basic_info"]["title"][:50]}...')
-            print(f'  - Categoria ID: {processed_data["basic_info"]["category_id"]}')
-            print(f'  - Avaliação: {processed_data["ratings"]["avg_evaluation_rating"]}/5 ({processed_data["ratings"]["evaluation_count"]} avaliações)')
-            print(f'  - Vendas: {processed_data["ratings"]["sales_count"]}')
-            print(f'  - Loja: {processed_data["store_info"]["store_name"]}')
-            print(f'  - Imagens encontradas: {len(processed_data["images"])}')
-            print(f'  - Vídeos encontrados: {len(processed_data["videos"])}')
-            print(f'  - Propriedades encontradas: {len(processed_data["properties"])}')
-            print(f'  - Variações encontradas: {len(processed_data["variations"])}')
-            print(f'  - Peso: {processed_data["package_info"]["gross_weight"]}')
-            print(f'  - Dimensões: {processed_data["package_info"]["package_length"]}x{processed_data["package_info"]["package_width"]}x{processed_data["package_info"]["package_height"]}')
+            log_ali.info('product_details.processed',
+                         product_id=product_id,
+                         title=processed_data["basic_info"]["title"][:50],
+                         images=len(processed_data["images"]),
+                         videos=len(processed_data["videos"]),
+                         properties=len(processed_data["properties"]),
+                         variations=len(processed_data["variations"]))
             
             return jsonify({'success': True, 'data': processed_data})
         
@@ -2179,29 +2399,10 @@ def product_from_url():
     if not tokens or not tokens.get('access_token'):
         return jsonify({'success': False, 'message': 'Token não encontrado'}), 401
 
-    # Montar chamada da API
-    params = {
-        "method": "aliexpress.ds.product.get",
-        "app_key": APP_KEY,
-        "timestamp": int(time.time() * 1000),
-        "sign_method": "md5",
-        "format": "json",
-        "v": "2.0",
-        "access_token": tokens['access_token'],
-        "product_id": product_id,
-        "ship_to_country": "BR",
-        "target_currency": "BRL",
-        "target_language": "pt"
-    }
-    params["sign"] = generate_api_signature(params, APP_SECRET)
-
-    print(f'🔍 PARÂMETROS ENVIADOS PARA API ALIEXPRESS:')
-    print(f'🔍 URL: https://api-sg.aliexpress.com/sync')
-    print(f'🔍 Parâmetros: {json.dumps(params, indent=2, ensure_ascii=False)}')
-    print(f'🔍 ==========================================')
+    print(f'🔍 Buscando produto {product_id} (BR/BRL/pt) via cache de detalhes')
 
     try:
-        response = requests.get('https://api-sg.aliexpress.com/sync', params=params, timeout=20)
+        response = get_product_detail(product_id, tokens['access_token'], timeout=20)
         print(f'📡 Resposta da API AliExpress: {response.status_code}')
 
         if response.status_code != 200:
@@ -2209,12 +2410,7 @@ def product_from_url():
             return jsonify({'success': False, 'error': response.text}), response.status_code
 
         data = response.json()
-        print(f'📦 RESPOSTA COMPLETA DA API ALIEXPRESS:')
-        print(f'📦 Status Code: {response.status_code}')
-        print(f'📦 Headers: {dict(response.headers)}')
-        print(f'📦 Dados brutos recebidos:')
-        print(json.dumps(data, indent=2, ensure_ascii=False))
-        print(f'📦 ==========================================')
+        log_ali.debug('product_from_url.payload', product_id=product_id, payload=lazy_json(data))
 
         result = data.get('aliexpress_ds_product_get_response', {}).get('result', {})
         
@@ -2222,7 +2418,7 @@ def product_from_url():
             print('❌ Nenhum resultado encontrado na resposta')
             print(f'❌ Estrutura da resposta: {list(data.keys())}')
             if 'aliexpress_ds_product_get_response' in data:
-                print(f'❌ Conteúdo de aliexpress_ds_product_get_response: {data["aliexpress_ds_product_get_response"]}')
+                log_ali.debug('product_from_url.empty_result', product_id=product_id, envelope=lazy_json(data["aliexpress_ds_product_get_response"]))
             return jsonify({'success': False, 'message': 'Produto não encontrado'}), 404
 
         # Extrair informações básicas
@@ -2315,32 +2511,21 @@ def product_wholesale_details(product_id):
         return jsonify({'success': False, 'message': 'Token não encontrado. Faça autorização primeiro.'}), 401
     try:
         # Parâmetros para a API conforme documentação
-        params = {
-            "method": "aliexpress.ds.product.wholesale.get",
-            "app_key": APP_KEY,
-            "timestamp": int(time.time() * 1000),
-            "sign_method": "md5",
-            "format": "json",
-            "v": "2.0",
-            "access_token": tokens['access_token'],
+        params = ali_client.build_params("aliexpress.ds.product.wholesale.get", tokens['access_token'], {
             "product_id": product_id,
             "ship_to_country": "BR",   # obrigatório para Brasil
             "target_currency": "BRL",  # obrigatório para Brasil
             "target_language": "pt",   # obrigatório para Brasil
             "remove_personal_benefit": "false"
-        }
-        
-        # Gerar assinatura
-        params["sign"] = generate_api_signature(params, APP_SECRET)
+        })
         
         # Fazer requisição HTTP direta para /sync
-        response = requests.get('https://api-sg.aliexpress.com/sync', params=params)
-        print(f'📡 Resposta wholesale produto {product_id}: {response.text[:500]}...')
+        response = ali_client.send(params)
+        log_ali.info('wholesale.response', product_id=product_id, status=response.status_code)
 
         if response.status_code == 200:
             data = response.json()
-            print(f'✅ ESTRUTURA COMPLETA - WHOLESALE PRODUTO {product_id}:')
-            print(json.dumps(data, indent=2, ensure_ascii=False))
+            log_ali.debug('wholesale.payload', product_id=product_id, payload=lazy_json(data))
             
             # Verificar se há dados na resposta
             if 'aliexpress_ds_product_wholesale_get_response' in data:
@@ -2402,6 +2587,73 @@ def product_wholesale_details(product_id):
         print(f'❌ Erro ao buscar detalhes wholesale do produto {product_id}: {e}')
         return jsonify({'success': False, 'message': str(e)}), 500
 
+# ===================== SKU DE FRETE POR PRODUTO =====================
+# SKU que já retornou opções de frete para cada produto (testado primeiro)
+freight_sku_memory = TTLCache(
+    maxsize=int(os.getenv('FREIGHT_SKU_MEMORY_SIZE', '4096')),
+    ttl=int(os.getenv('FREIGHT_SKU_MEMORY_TTL', '86400')),
+    name='freight-sku'
+)
+FREIGHT_PROBE_WAVE = int(os.getenv('FREIGHT_PROBE_WAVE', '4'))
+FREIGHT_PROBE_DEADLINE = float(os.getenv('FREIGHT_PROBE_DEADLINE', '20'))
+
+def _freight_response_has_options(response):
+    if response.status_code != 200:
+        return False
+    result = response.data.get('aliexpress_logistics_buyer_freight_calculate_response', {}).get('result', {})
+    return bool(result.get('success', False) or 'aeop_freight_calculate_result_for_buyer_d_t_o_list' in result)
+
+def probe_freight_skus(product_id, sku_ids, price, access_token):
+    """
+    Chama freight.calculate para os SKUs em ondas de FREIGHT_PROBE_WAVE em
+    paralelo e para no primeiro que retorna opções de frete; as chamadas
+    restantes da onda são canceladas ou ignoradas. O SKU vencedor fica
+    guardado e é testado sozinho primeiro na próxima vez.
+    Devolve (sku_id, AliExpressResponse) ou (None, None).
+    """
+    def _probe(sku_id):
+        freight_params = {
+            "country_code": "BR",
+            "product_id": product_id,
+            "product_num": 1,
+            "send_goods_country_code": "CN",
+            "sku_id": sku_id,  # SKU ID (opcional mas recomendado)
+            "price": price,  # Preço (opcional)
+            "price_currency": "USD"  # Moeda (opcional)
+        }
+        response = ali_client.call("aliexpress.logistics.buyer.freight.calculate", access_token, {
+            "param_aeop_freight_calculate_for_buyer_d_t_o": json.dumps(freight_params)
+        })
+        log_shipping.debug('freight_calculation.response', product_id=product_id, sku_id=sku_id,
+                           status=response.status_code, body=lazy_text(response.text))
+        return response
+
+    remembered = freight_sku_memory.get(str(product_id))
+    waves = []
+    if remembered in sku_ids:
+        waves.append([remembered])
+        sku_ids = [s for s in sku_ids if s != remembered]
+    waves.extend(sku_ids[i:i + FREIGHT_PROBE_WAVE] for i in range(0, len(sku_ids), FREIGHT_PROBE_WAVE))
+
+    deadline = time.monotonic() + FREIGHT_PROBE_DEADLINE
+    for wave in waves:
+        results = fan_out(_probe, wave, max_workers=len(wave), deadline=deadline)
+        try:
+            for res in results:
+                if res.error is None and _freight_response_has_options(res.value):
+                    freight_sku_memory.set(str(product_id), res.item)
+                    return res.item, res.value
+                print(f'❌ SKU {res.item} sem opções de frete: {res.error or res.value.status_code}')
+        finally:
+            # Fecha o gerador: cancela o que ainda não começou
+            results.close()
+        if time.monotonic() >= deadline:
+            break
+
+    if remembered:
+        freight_sku_memory.delete(str(product_id))
+    return None, None
+
 @app.route('/api/aliexpress/freight/<product_id>')
 def freight_calculation(product_id):
     """Calcular frete para um produto"""
@@ -2422,23 +2674,7 @@ def freight_calculation(product_id):
             return jsonify({'success': False, 'error': f'ID do produto inválido: {product_id}'}), 400
         
         # Primeiro, buscar detalhes do produto para obter o skuId
-        product_params = {
-            "method": "aliexpress.ds.product.get",
-            "app_key": APP_KEY,
-            "timestamp": int(time.time() * 1000),
-            "sign_method": "md5",
-            "format": "json",
-            "v": "2.0",
-            "access_token": tokens['access_token'],
-            "product_id": product_id_int,
-            "ship_to_country": "BR",
-            "target_currency": "BRL",
-            "target_language": "pt",
-            "remove_personal_benefit": "false"
-        }
-        
-        product_params["sign"] = generate_api_signature(product_params, APP_SECRET)
-        product_response = requests.get('https://api-sg.aliexpress.com/sync', params=product_params)
+        product_response = get_product_detail(product_id_int, tokens['access_token'])
         
         if product_response.status_code != 200:
             return jsonify({'success': False, 'error': 'Erro ao buscar detalhes do produto'}), 400
@@ -2454,21 +2690,12 @@ def freight_calculation(product_id):
         if not sku_info:
             return jsonify({'success': False, 'error': 'Nenhum SKU encontrado para o produto'}), 400
             
-        # Tentar todos os SKUs disponíveis até encontrar um com frete
+        # SKUs candidatos ao cálculo de frete
         sku_list = sku_info if isinstance(sku_info, list) else [sku_info]
-        sku_id = None
-        
-        for i, sku in enumerate(sku_list):
-            current_sku_id = sku.get('sku_id')
-            if current_sku_id:
-                print(f'Ô£à Testando SKU {i+1}/{len(sku_list)}: {current_sku_id}')
-                sku_id = current_sku_id
-                break
+        sku_ids = [sku.get('sku_id') for sku in sku_list if sku.get('sku_id')]
         
-        if not sku_id:
+        if not sku_ids:
             return jsonify({'success': False, 'error': 'Nenhum SKU ID encontrado'}), 400
-            
-        print(f'Ô£à SKU ID selecionado: {sku_id}')
         
         # Extrair preço do produto se disponível
         product_price = "0.00"  # Preço padrão
@@ -2505,81 +2732,9 @@ def freight_calculation(product_id):
         
         print(f'💰 Preço final do produto para frete: {product_price}')
         
-        # Tentar calcular frete com diferentes SKUs
-        for i, sku in enumerate(sku_list):
-            current_sku_id = sku.get('sku_id')
-            if not current_sku_id:
-                continue
-                
-            print(f'🚚 Tentativa {i+1}/{len(sku_list)} - SKU: {current_sku_id}')
-            
-            # Calcular frete com o SKU atual (conforme documentação oficial)
-            freight_params = {
-                "country_code": "BR",
-                "product_id": product_id_int,
-                "product_num": 1,
-                "send_goods_country_code": "CN",
-                "sku_id": current_sku_id,  # SKU ID (opcional mas recomendado)
-                "price": product_price,  # Preço (opcional)
-                "price_currency": "USD"  # Moeda (opcional)
-            }
-            
-            print(f'🚚 PARÂMETROS DE FRETE ENVIADOS:')
-            print(f'  - Product ID: {product_id} (tipo: {type(product_id)})')
-            print(f'  - Product ID convertido: {int(product_id)} (tipo: {type(int(product_id))})')
-            print(f'  - SKU ID: {current_sku_id}')
-            print(f'  - Price: {product_price}')
-            print(f'  - Country: BR')
-            print(f'  - Send from: CN')
-            
-            params = {
-                "method": "aliexpress.logistics.buyer.freight.calculate",
-                "app_key": APP_KEY,
-                "timestamp": int(time.time() * 1000),
-                "sign_method": "md5",
-                "format": "json",
-                "v": "2.0",
-                "access_token": tokens['access_token'],
-                "param_aeop_freight_calculate_for_buyer_d_t_o": json.dumps(freight_params)
-            }
-            
-            # Gerar assinatura
-            params["sign"] = generate_api_signature(params, APP_SECRET)
-            
-            # Fazer requisição HTTP direta para /sync
-            response = requests.get('https://api-sg.aliexpress.com/sync', params=params)
-            
-            # Salvar resposta completa em arquivo JSON
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            log_filename = f"logs/freight_calculation_{product_id}_{current_sku_id}_{timestamp}.json"
-            
-            # Criar diretório logs se não existir
-            os.makedirs("logs", exist_ok=True)
-            
-            # Salvar resposta bruta
-            with open(log_filename, 'w', encoding='utf-8') as f:
-                f.write(response.text)
-            
-            print(f'🚚 Resposta frete produto {product_id} (sku: {current_sku_id}): {response.text[:500]}...')
-            print(f'💾 Resposta completa salva em: {log_filename}')
-            
-            if response.status_code == 200:
-                data = response.json()
-                if 'aliexpress_logistics_buyer_freight_calculate_response' in data:
-                    freight_response = data['aliexpress_logistics_buyer_freight_calculate_response']
-                    result = freight_response.get('result', {})
-                    
-                    # Se encontrou opções de frete, usar este SKU
-                    if result.get('success', False) or 'aeop_freight_calculate_result_for_buyer_d_t_o_list' in result:
-                        print(f'✅ SKU {current_sku_id} tem opções de frete!')
-                        break
-                    else:
-                        print(f'❌ SKU {current_sku_id} sem opções de frete: {result.get("error_desc", "N/A")}')
-                        continue
-            else:
-                print(f'❌ Erro HTTP {response.status_code} para SKU {current_sku_id}')
-                continue
-        else:
+        # Testar SKUs em paralelo (em ondas); o primeiro com opções de frete vence
+        sku_id, response = probe_freight_skus(product_id_int, sku_ids, product_price, tokens['access_token'])
+        if response is None:
             # Se chegou aqui, nenhum SKU funcionou
             print(f'❌ Nenhum SKU encontrou opções de frete para o produto {product_id}')
             return jsonify({
@@ -2587,10 +2742,11 @@ def freight_calculation(product_id):
                 'error': 'Nenhuma opção de frete disponível para este produto'
             }), 400
         
+        print(f'✅ SKU {sku_id} tem opções de frete!')
+        
         if response.status_code == 200:
             data = response.json()
-            print(f'­ƒôè ESTRUTURA COMPLETA - FRETE PRODUTO {product_id}:')
-            print(json.dumps(data, indent=2, ensure_ascii=False))
+            log_shipping.debug('freight_calculation.payload', product_id=product_id, payload=lazy_json(data))
             
             # Verificar se h├í dados na resposta
             if 'aliexpress_logistics_buyer_freight_calculate_response' in data:
@@ -2608,6 +2764,7 @@ def freight_calculation(product_id):
                     'success': result.get('success', False),
                     'error_message': result.get('error_desc', ''),
                     'freight_options': [],
+                    'sku_id': sku_id,
                     'raw_data': result
                 }
                 
@@ -2617,9 +2774,9 @@ def freight_calculation(product_id):
                     if 'aeop_freight_calculate_result_for_buyer_dto' in freight_list:
                         options = freight_list['aeop_freight_calculate_result_for_buyer_dto']
                         if isinstance(options, list):
-                            processed_freight['freight_options'] = options
+                            processed_freight['freight_options'] = copy.deepcopy(options)
                         else:
-                            processed_freight['freight_options'] = [options]
+                            processed_freight['freight_options'] = [copy.deepcopy(options)]
                         
                         # Converter valores de USD para BRL se necessário
                         for option in processed_freight['freight_options']:
@@ -2688,30 +2845,20 @@ def sku_attributes(category_id):
     
     try:
         # Parâmetros para a consulta de atributos SKU
-        params = {
-            "method": "aliexpress.solution.sku.attribute.query",
-            "app_key": APP_KEY,
-            "timestamp": int(time.time() * 1000),
-            "sign_method": "md5",
-            "format": "json",
-            "v": "2.0",
-            "access_token": tokens['access_token'],
+        params = ali_client.build_params("aliexpress.solution.sku.attribute.query", tokens['access_token'], {
             "query_sku_attribute_info_request": json.dumps({
                 "aliexpress_category_id": category_id
             })
-        }
-        
-        params["sign"] = generate_api_signature(params, APP_SECRET)
+        })
         
         print(f'🔍 Consultando atributos SKU para categoria: {category_id}')
-        response = requests.get('https://api-sg.aliexpress.com/sync', params=params)
+        response = ali_client.send(params)
         
-        print(f'📡 Resposta atributos SKU categoria {category_id}: {response.text[:500]}...')
+        log_ali.info('sku_attributes.response', category_id=category_id, status=response.status_code)
         
         if response.status_code == 200:
             data = response.json()
-            print(f'✅ ESTRUTURA COMPLETA - ATRIBUTOS SKU CATEGORIA {category_id}:')
-            print(json.dumps(data, indent=2, ensure_ascii=False))
+            log_ali.debug('sku_attributes.payload', category_id=category_id, payload=lazy_json(data))
             
             if 'aliexpress_solution_sku_attribute_query_response' in data:
                 result = data['aliexpress_solution_sku_attribute_query_response'].get('result', {})
@@ -2779,23 +2926,14 @@ def sku_attributes_batch():
         for category_id in category_ids:
             try:
                 # Parâmetros para a consulta de atributos SKU
-                params = {
-                    "method": "aliexpress.solution.sku.attribute.query",
-                    "app_key": APP_KEY,
-                    "timestamp": int(time.time() * 1000),
-                    "sign_method": "md5",
-                    "format": "json",
-                    "v": "2.0",
-                    "access_token": tokens['access_token'],
+                params = ali_client.build_params("aliexpress.solution.sku.attribute.query", tokens['access_token'], {
                     "query_sku_attribute_info_request": json.dumps({
                         "aliexpress_category_id": str(category_id)
                     })
-                }
-                
-                params["sign"] = generate_api_signature(params, APP_SECRET)
+                })
                 
                 print(f'🔍 Consultando atributos SKU para categoria: {category_id}')
-                response = requests.get('https://api-sg.aliexpress.com/sync', params=params)
+                response = ali_client.send(params)
                 
                 if response.status_code == 200:
                     data = response.json()
@@ -2844,9 +2982,6 @@ def sku_attributes_batch():
                         'error': f'HTTP {response.status_code}'
                     }
                 
-                # Rate limiting
-                time.sleep(0.5)
-                
             except Exception as e:
                 print(f'❌ Erro ao consultar categoria {category_id}: {e}')
                 results[str(category_id)] = {
@@ -2867,6 +3002,29 @@ def sku_attributes_batch():
 
 # ===================== FEEDS ALIEXPRESS =====================
 
+# ===================== CATÁLOGO DE FEEDS =====================
+# Timeout (s) da consulta ao feedname.get feita pelo catálogo
+FEED_CATALOG_TIMEOUT = float(os.getenv('FEED_CATALOG_TIMEOUT', '10'))
+
+def fetch_feed_catalog():
+    """Lista de feeds direto da API (aliexpress.ds.feedname.get), normalizada"""
+    tokens = load_tokens()
+    if not tokens or not tokens.get('access_token'):
+        raise Exception('Token não encontrado. Faça autorização primeiro.')
+    response = ali_client.call("aliexpress.ds.feedname.get", tokens['access_token'], timeout=FEED_CATALOG_TIMEOUT)
+    log_feeds.info('feed_catalog.response', status=response.status_code)
+    if response.status_code != 200:
+        raise Exception(f'Erro {response.status_code} ao buscar feeds')
+    data = response.json()
+    log_feeds.debug('feed_catalog.payload', payload=lazy_json(data))
+    return parse_feed_names(data)
+
+def _feed_catalog_collection():
+    return firestore.client().collection('aliexpress_feed_catalog') if FIREBASE_AVAILABLE else None
+
+# Lista de feeds em cache (TTL + recálculo em segundo plano + último snapshot bom)
+feed_catalog = FeedCatalog(fetch_feed_catalog, collection_factory=_feed_catalog_collection)
+
 @app.route('/api/aliexpress/feeds/list', methods=['GET'])
 def get_available_feeds():
     """Obter lista de feeds disponíveis do AliExpress e sincronizar produtos"""
@@ -2877,6 +3035,7 @@ def get_available_feeds():
     
     # Parâmetros de controle
     sync_products = request.args.get('sync_products', 'false').lower() == 'true'
+    sync_async = request.args.get('async', 'false').lower() == 'true'
     page_size = int(request.args.get('page_size', 20))
     max_pages = int(request.args.get('max_pages', 5))  # Proteção contra timeout
     ship_to = request.args.get('ship_to_country', 'BR')
@@ -2885,134 +3044,63 @@ def get_available_feeds():
 
     print(f'🔍 ETAPA 1: Buscando feeds disponíveis...')
     
-    # ETAPA 1: Buscar feeds disponíveis via API
+    # ETAPA 1: Feeds disponíveis pelo catálogo em cache (último snapshot bom se a API falhar)
     try:
-        params = {
-            "method": "aliexpress.ds.feedname.get",
-            "app_key": APP_KEY,
-            "timestamp": int(time.time() * 1000),
-            "sign_method": "md5",
-            "format": "json",
-            "v": "2.0",
-            "access_token": tokens['access_token']
-        }
-        params["sign"] = generate_api_signature(params, APP_SECRET)
-        
-        response = requests.get('https://api-sg.aliexpress.com/sync', params=params, timeout=30)
-        
-        if response.status_code == 200:
-            data = response.json()
-            feeds = []
-            
-            # Processar resposta conforme documentação
-            if 'aliexpress_ds_feedname_get_response' in data:
-                feed_response = data['aliexpress_ds_feedname_get_response']
-                resp_result = feed_response.get('resp_result', {})
-                result = resp_result.get('result', {})
-                
-                if 'promos' in result:
-                    promos_data = result['promos']
-                    if isinstance(promos_data, list):
-                        feeds = [
-                            {
-                                'feed_name': promo.get('promo_name', ''),
-                                'feed_id': str(i + 1),
-                                'display_name': promo.get('promo_name', ''),
-                                'description': promo.get('promo_desc', ''),
-                                'product_count': int(promo.get('product_num', 0))
-                            }
-                            for i, promo in enumerate(promos_data)
-                        ]
-                    elif isinstance(promos_data, dict) and 'promo' in promos_data:
-                        promo_list = promos_data['promo']
-                        if isinstance(promo_list, list):
-                            feeds = [
-                                {
-                                    'feed_name': promo.get('promo_name', ''),
-                                    'feed_id': str(i + 1),
-                                    'display_name': promo.get('promo_name', ''),
-                                    'description': promo.get('promo_desc', ''),
-                                    'product_count': int(promo.get('product_num', 0))
-                                }
-                                for i, promo in enumerate(promo_list)
-                            ]
-                        else:
-                            feeds = [{
-                                'feed_name': promo_list.get('promo_name', ''),
-                                'feed_id': '1',
-                                'display_name': promo_list.get('promo_name', ''),
-                                'description': promo_list.get('promo_desc', ''),
-                                'product_count': int(promo_list.get('product_num', 0))
-                            }]
-            
-            # Se não encontrou feeds via API, usar lista padrão
-            if not feeds:
-                print(f'⚠️ Nenhum feed encontrado via API, usando lista padrão...')
-                feeds = [
-        {
-            "feed_name": "DS_Brazil_topsellers",
-            "feed_id": "1",
-            "display_name": "Mais Vendidos Brasil",
-            "description": "Produtos mais vendidos no Brasil",
-            "product_count": 14544
-        },
-        {
-            "feed_name": "DS_NewArrivals", 
-            "feed_id": "2",
-            "display_name": "Novidades",
-            "description": "Produtos recém-chegados",
-            "product_count": 14818
-        },
-        {
-            "feed_name": "DS_ConsumerElectronics_bestsellers",
-            "feed_id": "3", 
-            "display_name": "Eletrônicos",
-            "description": "Eletrônicos mais vendidos",
-            "product_count": 20633
-        },
-        {
-            "feed_name": "DS_Home&Kitchen_bestsellers",
-            "feed_id": "4",
-            "display_name": "Casa e Cozinha", 
-            "description": "Produtos para casa e cozinha",
-            "product_count": 12751
-        }
-    ]
-    
-            print(f'📦 Feeds encontrados: {len(feeds)}')
-            
-            # ETAPA 2 e 3: Sincronizar produtos se solicitado
-            if sync_products:
-                print(f'🔄 ETAPA 2 e 3: Sincronizando produtos dos feeds...')
-                total_saved = 0
-                
-                for feed in feeds[:3]:  # Limitar a 3 feeds para evitar timeout
-                    feed_name = feed.get('feed_name')
-                    if not feed_name:
-                        continue
-                        
-                    print(f'📦 Sincronizando feed: {feed_name}')
-                    saved_count = sync_feed_products(tokens['access_token'], feed_name, page_size, max_pages, ship_to, currency, language)
-                    total_saved += saved_count
-                    feed['synced_products'] = saved_count
-                    
-                    # Pequena pausa entre feeds para evitar rate limit
-                    time.sleep(1)
-                
-                print(f'✅ Total de produtos sincronizados: {total_saved}')
-            
-            return jsonify({
-                'success': True,
-                'feeds': feeds,
-                'sync_products': sync_products,
-                'total_feeds': len(feeds)
-            })
-        else:
+        catalog, catalog_meta = feed_catalog.get()
+        if not catalog:
             return jsonify({
                 'success': False,
-                'message': f'Erro {response.status_code} ao buscar feeds',
-                'error': response.text
-            }), response.status_code
+                'message': 'Catálogo de feeds indisponível',
+                'error': catalog_meta['error']
+            }), 503
+        
+        feeds = [
+            {
+                'feed_name': feed['feed_name'],
+                'feed_id': str(i + 1),
+                'display_name': feed['feed_name'],
+                'description': feed['description'],
+                'product_count': feed['product_count']
+            }
+            for i, feed in enumerate(catalog)
+        ]
+        print(f'📦 Feeds encontrados: {len(feeds)} (catálogo: {catalog_meta["source"]})')
+        
+        # ETAPA 2 e 3: Sincronizar produtos se solicitado; ?async=true enfileira todos
+        # os feeds na fila de jobs (precisa do serviço de jobs rodando)
+        if sync_products and sync_async:
+            print(f'🔄 ETAPA 2 e 3: Enfileirando sincronização dos feeds...')
+            for feed in feeds:
+                job_params = {'feed_name': feed['feed_name'], 'page_size': page_size,
+                              'ship_to': ship_to, 'currency': currency, 'language': language}
+                # Sem max_pages explícito o job lê o feed inteiro
+                if 'max_pages' in request.args:
+                    job_params['max_pages'] = max_pages
+                job_id, _ = job_queue.enqueue('feed_sync', job_params)
+                feed['sync_job_id'] = job_id
+                feed['sync_status_url'] = f'/api/aliexpress/jobs/{job_id}'
+        elif sync_products:
+            print(f'🔄 ETAPA 2 e 3: Sincronizando produtos dos feeds...')
+            total_saved = 0
+            for feed in feeds[:3]:  # Limitar a 3 feeds para evitar timeout
+                print(f'📦 Sincronizando feed: {feed["feed_name"]}')
+                report = sync_feed_products(
+                    tokens['access_token'], feed['feed_name'], page_size, max_pages, ship_to, currency, language,
+                    page_limit=10, details_budget=PRODUCT_BATCH_DEADLINE, crawl_budget=FEED_CRAWL_REQUEST_BUDGET
+                )
+                feed['synced_products'] = report['new'] + report['changed']
+                feed['sync_report'] = report
+                total_saved += feed['synced_products']
+            print(f'✅ Total de produtos sincronizados: {total_saved}')
+        
+        return jsonify({
+            'success': True,
+            'feeds': feeds,
+            'sync_products': sync_products,
+            'async': sync_products and sync_async,
+            'total_feeds': len(feeds),
+            'catalog': catalog_meta
+        })
             
     except Exception as e:
         print(f'❌ Erro ao buscar feeds: {e}')
@@ -3022,104 +3110,136 @@ def get_available_feeds():
         }), 500
 
 
+# Hashes do último conteúdo gravado de cada produto de feed (sincronização incremental)
+feed_hash_index = FeedHashIndex()
+
+# Prazo (s) da leitura de IDs dentro de uma requisição; jobs não têm prazo
+FEED_CRAWL_REQUEST_BUDGET = float(os.getenv('FEED_CRAWL_REQUEST_BUDGET', '15'))
+
+def _parse_int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+def fetch_feed_ids_page(feed_name, page_no, search_id, page_size):
+    """Uma página do aliexpress.ds.feed.itemids.get (token atual) como FeedPage"""
+    tokens = load_tokens()
+    if not tokens or not tokens.get('access_token'):
+        raise Exception('Token não encontrado. Faça autorização primeiro.')
+    params = {"feed_name": feed_name, "page_size": page_size}
+    if search_id:
+        params["search_id"] = search_id
+    else:
+        params["page_no"] = page_no
+    response = ali_client.call("aliexpress.ds.feed.itemids.get", tokens['access_token'], params, timeout=30)
+    if response.status_code != 200:
+        raise Exception(f'HTTP {response.status_code} na página {page_no} do feed {feed_name}')
+    data = response.json()
+    if 'error_response' in data:
+        raise Exception(f'Erro da API no feed {feed_name}: {data["error_response"]}')
+    result = data.get("aliexpress_ds_feed_itemids_get_response", {}).get("result", {}) or {}
+    ids = (result.get("products") or {}).get("number", []) if isinstance(result.get("products"), dict) else []
+    return FeedPage([str(i) for i in ids if i], result.get("search_id") or None, _parse_int(result.get("total")))
+
+# Checkpoint por feed: cada execução continua de onde a anterior parou
+feed_crawler = FeedCrawler(fetch_feed_ids_page)
+
+# IDs de cada feed na última leitura completa (uint64 ordenados em disco, memmap)
+feed_id_index = FeedIdIndex()
+
+def _feed_product_from_result(feed_name, product_id, result, ship_to='BR'):
+    """Campos do produto de feed a partir do resultado do aliexpress.ds.product.get"""
+    return {
+        "feed_name": feed_name,
+        "product_id": str(product_id),
+        "title": result.get("product_title") or result.get("ae_item_base_info_dto", {}).get("subject", ""),
+        "main_image": result.get("product_main_image_url") or "",
+        "images": (result.get("ae_multimedia_info_dto", {}).get("image_urls", "") or "").split(";") if result.get("ae_multimedia_info_dto") else [],
+        "price": float(result.get("sale_price", "0") or 0),
+        "currency": result.get("currency", "BRL"),
+        "original_price": float(result.get("original_price", "0") or 0),
+        "discount": float(str(result.get("discount", "0")).replace("%","") or 0),
+        "detail_url": result.get("detail_url", ""),
+        "store_id": str(result.get("store_info_dto", {}).get("store_id", "")),
+        "store_name": result.get("store_info_dto", {}).get("store_name", ""),
+        "rating": float(result.get("product_rating", 0) or 0),
+        "orders": int(result.get("orders", 0) or 0),
+        "ship_to_country": ship_to,
+    }
+
 @optimize_memory
-def sync_feed_products(access_token, feed_name, page_size=20, max_pages=5, ship_to='BR', currency='BRL', language='pt'):
-    """ETAPA 2 e 3: Sincronizar produtos de um feed específico"""
+def sync_feed_products(access_token, feed_name, page_size=20, max_pages=None, ship_to='BR', currency='BRL', language='pt',
+                       page_limit=None, details_budget=None, crawl_budget=None, progress=None):
+    """
+    ETAPA 2 e 3: Sincronizar produtos de um feed específico
+    Só grava no Firestore produtos novos ou com conteúdo alterado (hash).
+    Devolve o relatório: new, changed, unchanged, removed e errors.
+    A leitura dos IDs retoma do checkpoint do feed (feed_crawler) e cada
+    execução avança no máximo max_pages páginas (limitadas a page_limit) /
+    crawl_budget segundos; os detalhes têm prazo de details_budget segundos.
+    None em qualquer limite = sem limite (fila de jobs: feed inteiro); quem
+    chama dentro de uma requisição passa os limites dela. progress(**campos)
+    acompanha o andamento.
+    """
     print(f'🔄 Sincronizando produtos do feed: {feed_name}')
+    progress = progress or (lambda **fields: None)
     
     # Limitar uso de memória
     page_size = min(page_size, 50)  # Máximo 50 produtos por página
-    max_pages = min(max_pages, 10)  # Máximo 10 páginas
+    if page_limit is not None:
+        max_pages = min(max_pages, page_limit) if max_pages is not None else page_limit
     
-    total_saved = 0
-    page = 1
-    all_ids = []
+    report = {'new': 0, 'changed': 0, 'unchanged': 0, 'removed': 0, 'errors': 0, 'write_failed': 0}
     
-    # ETAPA 2: Buscar todos os item_ids do feed
-    while page <= max_pages:
-        try:
-            print(f'📄 Buscando página {page} do feed {feed_name}...')
-            
-            params = {
-                "method": "aliexpress.ds.feed.itemids.get",
-                "app_key": APP_KEY,
-                "timestamp": int(time.time() * 1000),
-                "sign_method": "md5",
-                "format": "json",
-                "v": "2.0",
-                "access_token": access_token,
-                "feed_name": feed_name,
-                "page_no": page,
-                "page_size": page_size
-            }
-            params["sign"] = generate_api_signature(params, APP_SECRET)
-            
-            response = requests.get('https://api-sg.aliexpress.com/sync', params=params, timeout=30)
-            
-            if response.status_code == 200:
-                data = response.json()
-                
-                # Extrair IDs dos produtos - caminho correto conforme resposta da API
-                ids = []
-                try:
-                    ids = data.get("aliexpress_ds_feed_itemids_get_response", {}) \
-                              .get("result", {}) \
-                              .get("products", {}) \
-                              .get("number", [])
-                    # Converter para string
-                    ids = [str(id) for id in ids if id]
-                    print(f'✅ IDs extraídos corretamente: {len(ids)} IDs encontrados')
-                except Exception as e:
-                    print(f"⚠️ Erro extraindo IDs: {e}")
-                    ids = []
-                if not ids:
-                    print(f'⚠️ Nenhum ID encontrado na página {page}')
-                    break
-                
-                all_ids.extend(ids)
-                print(f'📦 IDs encontrados na página {page}: {len(ids)}')
-                page += 1
-                
-                # Pequena pausa para evitar rate limit
-                time.sleep(0.1)
-            else:
-                print(f'❌ Erro na página {page}: {response.status_code}')
-                break
-                
-        except Exception as e:
-            print(f'❌ Erro ao buscar página {page}: {e}')
-            break
+    # ETAPA 2: IDs do feed a partir do checkpoint (pendentes de execuções anteriores
+    # + os ainda não vistos no ciclo atual)
+    crawl = feed_crawler.crawl(
+        feed_name, page_size, page_budget=max_pages, time_budget=crawl_budget, progress=progress,
+        retry_limit=max_pages * page_size if max_pages is not None else None
+    )
+    all_ids = crawl['ids']
+    # Só com o feed lido até o fim dá para saber quais produtos saíram dele
+    crawl_complete = crawl['complete']
+    report['crawl'] = {k: crawl[k] for k in ('cycle', 'pages', 'cycle_pages', 'complete', 'retried', 'error')}
+    if crawl['error']:
+        print(f'⚠️ Leitura do feed {feed_name} interrompida: {crawl["error"]} (checkpoint preservado)')
+    print(f'📦 IDs a processar no ciclo {crawl["cycle"]}: {len(all_ids)} ({crawl["retried"]} pendentes de execuções '
+          f'anteriores, {crawl["pages"]} páginas nesta execução)')
+    # Novos no feed desde a última leitura completa
+    report['new_in_feed'] = len(feed_id_index.new_ids(feed_name, all_ids[crawl['retried']:]))
+    if crawl_complete:
+        snapshot = feed_id_index.save(feed_name, crawl['cycle_ids'])
+        report['snapshot'] = {'size': snapshot['size'], 'added': len(snapshot['added']), 'removed': len(snapshot['removed'])}
     
-    all_ids = list(dict.fromkeys(all_ids))  # Remover duplicatas
-    print(f'📦 Total de IDs únicos encontrados: {len(all_ids)}')
+    if not all_ids and not crawl_complete:
+        return report
     
-    if not all_ids:
-        return 0
+    try:
+        known_hashes = feed_hash_index.hashes(feed_name)
+    except sqlite3.Error as e:
+        print(f'⚠️ Índice de hashes indisponível, gravando tudo: {e}')
+        known_hashes = {}
+    written_hashes = {}
+    unchanged_ids = []
+    attempted_ids = set()
+    writer = BulkWriter(db)
     
-    # ETAPA 3: Buscar detalhes dos produtos e salvar no Firestore
-    # Limitar a 10 produtos para evitar timeout do servidor
-    for i, product_id in enumerate(all_ids[:10]):  
+    # ETAPA 3: Buscar detalhes dos produtos em paralelo e salvar no Firestore em lotes
+    print(f'🔄 Buscando detalhes de {len(all_ids)} produtos em paralelo...')
+    deadline = time.monotonic() + details_budget if details_budget is not None else None
+    for item in get_product_details(all_ids, access_token, ship_to, currency, language, deadline=deadline, timeout=10):
+        product_id = item.item
+        if not isinstance(item.error, FanOutDeadlineExceeded):
+            attempted_ids.add(str(product_id))
+        progress(**report)
+        if item.error:
+            print(f'❌ Erro ao buscar produto {product_id}: {item.error}')
+            report['errors'] += 1
+            continue
+        
+        response = item.value
         try:
-            print(f'🔄 Buscando detalhes do produto {i+1}/{min(10, len(all_ids))}: {product_id}')
-            
-            params = {
-                "method": "aliexpress.ds.product.get",
-                "app_key": APP_KEY,
-                "timestamp": int(time.time() * 1000),
-                "sign_method": "md5",
-                "format": "json",
-                "v": "2.0",
-                "access_token": access_token,
-                "product_id": product_id,
-                "ship_to_country": ship_to,
-                "target_currency": currency,
-                "target_language": language,
-                "remove_personal_benefit": "false"
-            }
-            params["sign"] = generate_api_signature(params, APP_SECRET)
-            
-            response = requests.get('https://api-sg.aliexpress.com/sync', params=params, timeout=10)
-            
             if response.status_code == 200:
                 data = response.json()
                 
@@ -3127,51 +3247,221 @@ def sync_feed_products(access_token, feed_name, page_size=20, max_pages=5, ship_
                 result = data.get("aliexpress_ds_product_get_response", {}).get("result", {}) or {}
                 
                 # Processar dados do produto
-                product_data = {
-                    "feed_name": feed_name,
-                    "product_id": str(product_id),
-                    "title": result.get("product_title") or result.get("ae_item_base_info_dto", {}).get("subject", ""),
-                    "main_image": result.get("product_main_image_url") or "",
-                    "images": (result.get("ae_multimedia_info_dto", {}).get("image_urls", "") or "").split(";") if result.get("ae_multimedia_info_dto") else [],
-                    "price": float(result.get("sale_price", "0") or 0),
-                    "currency": result.get("currency", "BRL"),
-                    "original_price": float(result.get("original_price", "0") or 0),
-                    "discount": float(str(result.get("discount", "0")).replace("%","") or 0),
-                    "detail_url": result.get("detail_url", ""),
-                    "store_id": str(result.get("store_info_dto", {}).get("store_id", "")),
-                    "store_name": result.get("store_info_dto", {}).get("store_name", ""),
-                    "rating": float(result.get("product_rating", 0) or 0),
-                    "orders": int(result.get("orders", 0) or 0),
-                    "ship_to_country": ship_to,
-                    "updated_at": datetime.now()
-                }
+                product_data = _feed_product_from_result(feed_name, product_id, result, ship_to)
+                digest = content_hash(product_data)
+                previous = known_hashes.get(str(product_id))
+                if previous == digest:
+                    report['unchanged'] += 1
+                    unchanged_ids.append(str(product_id))
+                    continue
+                product_data["content_hash"] = digest
+                product_data["updated_at"] = datetime.now()
                 
-                # Salvar no Firestore
+                # Salvar no Firestore (só conteúdo novo ou alterado); o índice só
+                # recebe o hash depois que o lote for aceito
                 doc_id = f"{feed_name}_{product_id}"
-                db.collection("aliexpress_feed_products").document(doc_id).set(product_data, merge=True)
-                total_saved += 1
+                writer.set("aliexpress_feed_products", doc_id, product_data, merge=True,
+                           on_success=lambda _, pid=str(product_id), h=digest: written_hashes.__setitem__(pid, h))
+                report['changed' if previous else 'new'] += 1
                 
-                print(f'✅ Produto salvo: {product_data.get("title", "")[:50]}...')
+                print(f'✅ Produto na fila de gravação ({item.elapsed:.2f}s): {product_data.get("title", "")[:50]}...')
                 
             else:
                 print(f'❌ Erro ao buscar produto {product_id}: {response.status_code}')
+                report['errors'] += 1
                 
         except Exception as e:
             print(f'❌ Erro ao processar produto {product_id}: {e}')
+            report['errors'] += 1
             continue
-        
-        # Pausa reduzida entre produtos
-        time.sleep(0.1)
+    
+    write_report = writer.flush()
+    report['write_failed'] = write_report['failed']
+    
+    # Só sai da pendência o que foi gravado (ou não mudou); o resto volta na próxima
+    # execução (falhas contam tentativa; o que o prazo não alcançou, não)
+    done_ids = set(unchanged_ids) | set(written_hashes)
+    try:
+        feed_crawler.mark_done(feed_name, done_ids)
+        feed_crawler.mark_failed(feed_name, attempted_ids - done_ids)
+    except sqlite3.Error as e:
+        print(f'⚠️ Falha ao atualizar pendências do feed {feed_name}: {e}')
+    
+    removed = set(known_hashes) - crawl['cycle_ids'] if crawl_complete else set()
+    report['removed'] = len(removed)
+    try:
+        feed_hash_index.update(feed_name, written_hashes)
+        feed_hash_index.remove(feed_name, removed)
+    except sqlite3.Error as e:
+        print(f'⚠️ Falha ao atualizar índice de hashes do feed {feed_name}: {e}')
     
     # Atualizar cabeçalho do feed no Firestore
     db.collection("aliexpress_feeds").document(feed_name).set({
         "name": feed_name,
         "updated_at": datetime.now(),
-        "total_products": total_saved
+        "total_products": report['new'] + report['changed'] + report['unchanged'],
+        "last_sync": dict(report)
     }, merge=True)
     
-    print(f'✅ Feed {feed_name} sincronizado: {total_saved} produtos salvos')
-    return total_saved
+    progress(**report)
+    log_feeds.info('feed.sync', feed_name=feed_name, complete=crawl_complete, **report)
+    print(f'✅ Feed {feed_name} sincronizado: {report["new"]} novos, {report["changed"]} alterados, '
+          f'{report["unchanged"]} sem mudança, {report["removed"]} removidos')
+    return report
+
+
+# ===================== FILA DE JOBS (SINCRONIZAÇÃO EM SEGUNDO PLANO) =====================
+# Fila no Firestore (coleção jobs) quando disponível: o serviço de jobs (python
+# server.py --jobs) e todas as instâncias web enxergam os mesmos jobs.
+# JOB_STORE=sqlite força a fila local (um processo/instância só).
+JOB_STORE = os.getenv('JOB_STORE', 'firestore')
+job_queue = JobQueue(store=FirestoreJobStore(db) if db is not None and JOB_STORE != 'sqlite' else None)
+
+def _feed_sync_job(params, progress):
+    """Job feed_sync: feed inteiro (ou max_pages, se informado), sem prazo de requisição"""
+    tokens = load_tokens()
+    if not tokens or not tokens.get('access_token'):
+        raise Exception('Token não encontrado. Faça autorização primeiro.')
+    report = sync_feed_products(
+        tokens['access_token'], params['feed_name'],
+        page_size=int(params.get('page_size', 50)),
+        max_pages=int(params['max_pages']) if params.get('max_pages') else None,
+        ship_to=params.get('ship_to', 'BR'),
+        currency=params.get('currency', 'BRL'),
+        language=params.get('language', 'pt'),
+        progress=progress
+    )
+    # Leitura interrompida não conta como concluída: o job falha com o motivo
+    # (o checkpoint guarda o que foi lido e o próximo job continua dali)
+    if report['crawl']['error']:
+        raise Exception(f'Leitura do feed {params["feed_name"]} interrompida na página '
+                        f'{report["crawl"]["cycle_pages"] + 1}: {report["crawl"]["error"]}')
+    return report
+
+def _firebase_sync_job(params, progress):
+    """Job firebase_sync: todos os feeds e páginas, sem os limites da requisição"""
+    report = run_firebase_sync(params, progress)
+    interrupted = {name: feed['crawl_error'] for name, feed in report['feeds'].items() if feed['crawl_error']}
+    if interrupted:
+        raise Exception(f'Leitura interrompida em {len(interrupted)} feed(s): {interrupted}')
+    return report
+
+job_queue.register('feed_sync', _feed_sync_job)
+job_queue.register('firebase_sync', _firebase_sync_job)
+
+@app.before_request
+def start_job_workers():
+    """Modo thread (padrão com a fila sqlite): workers e varredura de jobs órfãos desde a primeira requisição do worker"""
+    job_queue.autostart()
+
+
+@app.route('/api/aliexpress/jobs/feed-sync', methods=['POST'])
+def enqueue_feed_sync():
+    """Enfileira a sincronização de um ou mais feeds; responde 202 com os IDs dos jobs"""
+    req = request.get_json(silent=True) or {}
+    feed_names = req.get('feeds') or ([req['feed_name']] if req.get('feed_name') else [])
+    if not feed_names:
+        return jsonify({'success': False, 'message': 'Informe feed_name ou feeds'}), 400
+    try:
+        jobs = []
+        for feed_name in feed_names:
+            job_params = {
+                'feed_name': feed_name,
+                'page_size': int(req.get('page_size', 50)),
+                'ship_to': req.get('ship_to_country', 'BR'),
+                'currency': req.get('target_currency', 'BRL'),
+                'language': req.get('target_language', 'pt'),
+            }
+            # Sem max_pages o job lê o feed inteiro
+            if req.get('max_pages'):
+                job_params['max_pages'] = int(req['max_pages'])
+            job_id, created = job_queue.enqueue('feed_sync', job_params)
+            jobs.append({'feed_name': feed_name, 'job_id': job_id, 'created': created,
+                         'status_url': f'/api/aliexpress/jobs/{job_id}'})
+        return jsonify({'success': True, 'jobs': jobs}), 202
+    except Exception as e:
+        print(f'❌ Erro ao enfileirar sincronização: {e}')
+        return jsonify({'success': False, 'message': str(e)}), 500
+
+
+@app.route('/api/aliexpress/jobs/<job_id>', methods=['GET'])
+def get_job_status(job_id):
+    """Status e progresso de um job (páginas, produtos gravados, erros)"""
+    job = job_queue.get(job_id)
+    if not job:
+        return jsonify({'success': False, 'message': 'Job não encontrado'}), 404
+    return jsonify({'success': True, 'job': job})
+
+
+@app.route('/api/aliexpress/jobs', methods=['GET'])
+def list_jobs():
+    """Jobs mais recentes (opcional: ?kind=feed_sync&limit=20)"""
+    limit = min(int(request.args.get('limit', 20)), 200)
+    return jsonify({'success': True, 'jobs': job_queue.store.recent(limit, request.args.get('kind')),
+                    'queue': job_queue.stats()})
+
+
+@app.route('/api/aliexpress/feeds/<feed_name>/crawl', methods=['GET'])
+def get_feed_crawl_status(feed_name):
+    """Checkpoint da leitura de IDs do feed (ciclo, cursor/página, IDs vistos)"""
+    try:
+        return jsonify({'success': True, 'feed_name': feed_name, 'checkpoint': feed_crawler.status(feed_name)})
+    except sqlite3.Error as e:
+        return jsonify({'success': False, 'message': str(e)}), 500
+
+
+def _id_list(array, limit):
+    return [str(pid) for pid in array[:limit].tolist()]
+
+
+@app.route('/api/aliexpress/feeds/index', methods=['GET'])
+def get_feed_id_index():
+    """Feeds no índice de IDs e quantos IDs cada um tinha na última leitura completa"""
+    return jsonify({'success': True, 'feeds': feed_id_index.feeds()})
+
+
+@app.route('/api/aliexpress/feeds/<feed_name>/ids/diff', methods=['GET'])
+def get_feed_ids_diff(feed_name):
+    """Novos e removidos entre as duas últimas leituras completas do feed (?limit=100)"""
+    limit = min(int(request.args.get('limit', 100)), 10000)
+    started = time.perf_counter()
+    diff = feed_id_index.diff(feed_name)
+    return jsonify({
+        'success': True,
+        'feed_name': feed_name,
+        'added_count': len(diff['added']),
+        'removed_count': len(diff['removed']),
+        'added': _id_list(diff['added'], limit),
+        'removed': _id_list(diff['removed'], limit),
+        'elapsed_ms': round((time.perf_counter() - started) * 1000, 2)
+    })
+
+
+@app.route('/api/aliexpress/feeds/index/compare', methods=['GET'])
+def compare_feed_ids():
+    """Operação de conjunto entre feeds: ?feeds=A,B&op=intersection|difference|union&limit=100"""
+    feed_names = [f for f in request.args.get('feeds', '').split(',') if f]
+    op = request.args.get('op', 'intersection')
+    limit = min(int(request.args.get('limit', 100)), 10000)
+    if len(feed_names) < 2 or op not in ('intersection', 'difference', 'union'):
+        return jsonify({'success': False, 'message': 'Informe feeds=A,B e op=intersection|difference|union'}), 400
+
+    started = time.perf_counter()
+    arrays = [feed_id_index.load(name) for name in feed_names]
+    if op == 'union':
+        result = id_union(*arrays)
+    else:
+        result = arrays[0]
+        for other in arrays[1:]:
+            result = id_intersection(result, other) if op == 'intersection' else id_difference(result, other)
+    return jsonify({
+        'success': True,
+        'feeds': {name: len(a) for name, a in zip(feed_names, arrays)},
+        'op': op,
+        'count': len(result),
+        'item_ids': _id_list(result, limit),
+        'elapsed_ms': round((time.perf_counter() - started) * 1000, 2)
+    })
 
 
 # ===================== LEITURA RÁPIDA: PRODUTOS SALVOS =====================
@@ -3195,39 +3485,83 @@ def get_saved_feeds():
         return jsonify({"success": False, "message": str(e)}), 500
 
 
+# Ordenações suportadas: (campo, direção); o ID do documento desempata
+FEED_PRODUCT_SORTS = {
+    'updated_at_desc': ('updated_at', 'DESCENDING'),
+    'price_asc': ('price', 'ASCENDING'),
+    'orders_desc': ('orders', 'DESCENDING'),
+}
+
+def _encode_feed_cursor(sort, snapshot):
+    """Cursor opaco: ordenação, valor do campo de ordenação e ID do último documento"""
+    field = FEED_PRODUCT_SORTS[sort][0]
+    value = (snapshot.to_dict() or {}).get(field)
+    if isinstance(value, datetime):
+        value = {'t': value.isoformat()}
+    raw = json.dumps({'s': sort, 'v': value, 'id': snapshot.id}, separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+def _decode_feed_cursor(token):
+    """(ordenação, valor, doc_id) do cursor; ValueError se inválido"""
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        data = json.loads(raw)
+        value = data['v']
+        if isinstance(value, dict):
+            value = datetime.fromisoformat(value['t'])
+        return data['s'], value, data['id']
+    except Exception:
+        raise ValueError('cursor inválido')
+
 @app.route('/api/aliexpress/feeds/<feed_name>/products/saved', methods=['GET'])
 def get_saved_feed_products(feed_name):
-    """Listar produtos salvos de um feed específico (paginado)"""
+    """
+    Listar produtos salvos de um feed específico (paginado por cursor)
+    Passe o next_cursor da resposta em ?cursor=; ?page= (offset) fica só por
+    compatibilidade: o Firestore lê e cobra todos os documentos pulados.
+    """
     try:
-        page = int(request.args.get("page", 1))
         page_size = min(int(request.args.get("page_size", 20)), 100)
         sort = request.args.get("sort", "updated_at_desc")  # updated_at_desc | price_asc | orders_desc
+        if sort not in FEED_PRODUCT_SORTS:
+            sort = "updated_at_desc"
+        cursor = request.args.get("cursor")
+        legacy_page = request.args.get("page") if not cursor else None
 
-        q = db.collection("aliexpress_feed_products").where("feed_name", "==", feed_name)
+        field, direction = FEED_PRODUCT_SORTS[sort]
+        q = db.collection("aliexpress_feed_products").where("feed_name", "==", feed_name) \
+              .order_by(field, direction=direction) \
+              .order_by("__name__", direction=direction)
 
-        if sort == "price_asc":
-            q = q.order_by("price")
-        elif sort == "orders_desc":
-            q = q.order_by("orders", direction=firestore.Query.DESCENDING)
-        else:
-            q = q.order_by("updated_at", direction=firestore.Query.DESCENDING)
-
-        # Paginação simples por offset
-        offset = (page - 1) * page_size
-        docs = list(q.offset(offset).limit(page_size).stream())
-
-        items = []
-        for d in docs:
-            items.append(d.to_dict())
-    
-        return jsonify({
+        if cursor:
+            try:
+                cursor_sort, value, doc_id = _decode_feed_cursor(cursor)
+            except ValueError as e:
+                return jsonify({"success": False, "message": str(e)}), 400
+            if cursor_sort != sort:
+                return jsonify({"success": False, "message": "cursor gerado com outra ordenação"}), 400
+            q = q.start_after({field: value, "__name__": doc_ref(db, "aliexpress_feed_products", doc_id)})
+        elif legacy_page:
+            # Paginação legada por offset
+            q = q.offset((max(1, int(legacy_page)) - 1) * page_size)
+
+        docs = list(q.limit(page_size).stream())
+        items = [d.to_dict() for d in docs]
+        next_cursor = _encode_feed_cursor(sort, docs[-1]) if len(docs) == page_size else None
+
+        response = {
             "success": True,
             "feed_name": feed_name,
-            "page": page,
             "page_size": page_size,
+            "sort": sort,
             "items": items,
-            "count": len(items)
-        })
+            "count": len(items),
+            "next_cursor": next_cursor,
+            "pagination": "offset" if legacy_page else "cursor"
+        }
+        if legacy_page:
+            response["page"] = int(legacy_page)
+        return jsonify(response)
     except Exception as e:
         print(f'❌ Erro ao listar produtos do feed {feed_name}: {e}')
         return jsonify({"success": False, "message": str(e)}), 500
@@ -3382,227 +3716,89 @@ def home():
 
 # ===================== ENDPOINTS PARA PAINEL ADMIN =====================
 
+def _capture_access_denied():
+    """Exige o header X-Admin-Token igual a CAPTURE_ADMIN_TOKEN; sem token configurado, nega sempre"""
+    expected = os.getenv('CAPTURE_ADMIN_TOKEN')
+    if not expected:
+        return jsonify({'success': False, 'message': 'Acesso às capturas desabilitado (CAPTURE_ADMIN_TOKEN não configurado)'}), 403
+    if not hmac.compare_digest(request.headers.get('X-Admin-Token', ''), expected):
+        return jsonify({'success': False, 'message': 'Acesso negado'}), 403
+    return None
+
+@app.route('/api/admin/captures', methods=['GET'])
+def admin_captures_list():
+    """Lista segmentos de captura gravados e as capturas ainda em memória"""
+    denied = _capture_access_denied()
+    if denied:
+        return denied
+
+    # ?flush=true grava o anel agora (útil antes de baixar o segmento mais novo)
+    if request.args.get('flush', 'false').lower() == 'true':
+        capture_buffer.flush()
+
+    limit = min(int(request.args.get('limit', 20)), capture_buffer.ring_size)
+    return jsonify({
+        'success': True,
+        'pid': os.getpid(),
+        'stats': capture_buffer.stats(),
+        'segments': capture_buffer.list_segments(),
+        'recent': capture_buffer.recent(limit) if request.args.get('recent', 'false').lower() == 'true' else []
+    })
+
+@app.route('/api/admin/captures/<name>', methods=['GET'])
+def admin_capture_download(name):
+    """Download de um segmento .jsonl.gz"""
+    denied = _capture_access_denied()
+    if denied:
+        return denied
+
+    path = capture_buffer.segment_path(name)
+    if not path:
+        return jsonify({'success': False, 'message': 'Segmento não encontrado'}), 404
+    return send_file(os.path.abspath(path), mimetype='application/gzip', as_attachment=True, download_name=name)
+
 @app.route('/api/admin/feeds/list', methods=['GET'])
 def admin_feeds_list():
-    """Endpoint para painel admin - lista feeds com chips"""
+    """Endpoint para painel admin - lista feeds com chips (?refresh=true força consulta à API)"""
     try:
         print(f'📋 ADMIN: Listando feeds para painel admin...')
         
-        # Tentar carregar tokens
-        tokens = load_tokens()
-        if not tokens or not tokens.get('access_token'):
-            print(f'⚠️ ADMIN: Tokens não encontrados, usando lista padrão de feeds')
-            # Retornar lista padrão se não há tokens
-            feeds = [
-                {
-                    'id': '1',
-                    'name': 'DS_Brazil_topsellers',
-                    'display_name': 'Mais Vendidos Brasil',
-                    'description': 'Produtos mais vendidos no Brasil',
-                    'product_count': 17605,
-                    'category': 'aliexpress',
-                    'is_active': True
-                },
-                {
-                    'id': '2',
-                    'name': 'DS_ConsumerElectronics_bestsellers',
-                    'display_name': 'Eletrônicos',
-                    'description': 'Eletrônicos mais vendidos',
-                    'product_count': 66299,
-                    'category': 'aliexpress',
-                    'is_active': True
-                },
-                {
-                    'id': '3',
-                    'name': 'DS_HomeGarden_bestsellers',
-                    'display_name': 'Casa e Jardim',
-                    'description': 'Produtos para casa e jardim',
-                    'product_count': 44523,
-                    'category': 'aliexpress',
-                    'is_active': True
-                },
-                {
-                    'id': '4',
-                    'name': 'DS_Fashion_bestsellers',
-                    'display_name': 'Moda',
-                    'description': 'Produtos de moda e acessórios',
-                    'product_count': 88912,
-                    'category': 'aliexpress',
-                    'is_active': True
-                }
-            ]
+        # Catálogo em cache; sem token ou com a API fora, serve o último snapshot bom
+        force = request.args.get('refresh', 'false').lower() == 'true'
+        catalog, catalog_meta = feed_catalog.get(force=force)
+        if not catalog:
             return jsonify({
-                'success': True,
-                'feeds': feeds,
-                'message': 'Lista padrão de feeds (tokens não disponíveis)'
-            })
-        
-        # Tentar renovar token se necessário
-        try:
-            ensure_fresh_token()
-            tokens = load_tokens()  # Recarregar tokens após renovação
-        except Exception as e:
-            print(f'⚠️ ADMIN: Erro ao renovar token: {e}')
-            # Continuar com tokens existentes
-        
-        # Buscar feeds via API
-        params = {
-            "method": "aliexpress.ds.feedname.get",
-            "app_key": APP_KEY,
-            "timestamp": int(time.time() * 1000),
-            "sign_method": "md5",
-            "format": "json",
-            "v": "2.0",
-            "access_token": tokens['access_token']
-        }
-        params["sign"] = generate_api_signature(params, APP_SECRET)
+                'success': False,
+                'message': 'Catálogo de feeds indisponível (nenhuma consulta bem-sucedida ainda)',
+                'error': catalog_meta['error']
+            }), 503
         
-        try:
-            response = requests.get('https://api-sg.aliexpress.com/sync', params=params, timeout=30)
-        except Exception as e:
-            print(f'❌ ADMIN: Erro na requisição da API: {e}')
-            # Retornar lista padrão em caso de erro na API
-            feeds = [
-                {
-                    'id': '1',
-                    'name': 'DS_Brazil_topsellers',
-                    'display_name': 'Mais Vendidos Brasil',
-                    'description': 'Produtos mais vendidos no Brasil',
-                    'product_count': 17605,
-                    'category': 'aliexpress',
-                    'is_active': True
-                },
-                {
-                    'id': '2',
-                    'name': 'DS_ConsumerElectronics_bestsellers',
-                    'display_name': 'Eletrônicos',
-                    'description': 'Eletrônicos mais vendidos',
-                    'product_count': 66299,
-                    'category': 'aliexpress',
-                    'is_active': True
-                },
-                {
-                    'id': '3',
-                    'name': 'DS_HomeGarden_bestsellers',
-                    'display_name': 'Casa e Jardim',
-                    'description': 'Produtos para casa e jardim',
-                    'product_count': 44523,
-                    'category': 'aliexpress',
-                    'is_active': True
-                },
-                {
-                    'id': '4',
-                    'name': 'DS_Fashion_bestsellers',
-                    'display_name': 'Moda',
-                    'description': 'Produtos de moda e acessórios',
-                    'product_count': 88912,
-                    'category': 'aliexpress',
-                    'is_active': True
-                }
-            ]
-            return jsonify({
-                'success': True,
-                'feeds': feeds,
-                'message': 'Lista padrão de feeds (erro na API)'
-            })
+        feeds = [
+            {
+                'id': str(i + 1),
+                'name': feed['feed_name'],
+                'display_name': feed['feed_name'],
+                'description': feed['description'],
+                'product_count': feed['product_count'],
+                'category': 'aliexpress',
+                'is_active': True
+            }
+            for i, feed in enumerate(catalog)
+        ]
         
-        if response.status_code == 200:
-            data = response.json()
-            feeds = []
-            
-            # Processar resposta
-            if 'aliexpress_ds_feedname_get_response' in data:
-                feed_response = data['aliexpress_ds_feedname_get_response']
-                resp_result = feed_response.get('resp_result', {})
-                result = resp_result.get('result', {})
-                
-                if 'promos' in result:
-                    promos_data = result['promos']
-                    if isinstance(promos_data, list):
-                        feeds = [
-                            {
-                                'id': str(i + 1),
-                                'name': promo.get('promo_name', ''),
-                                'display_name': promo.get('promo_name', ''),
-                                'description': promo.get('promo_desc', ''),
-                                'product_count': int(promo.get('product_num', 0)),
-                                'category': 'aliexpress',
-                                'is_active': True
-                            }
-                            for i, promo in enumerate(promos_data)
-                        ]
-                    elif isinstance(promos_data, dict) and 'promo' in promos_data:
-                        promo_list = promos_data['promo']
-                        if isinstance(promo_list, list):
-                            feeds = [
-                                {
-                                    'id': str(i + 1),
-                                    'name': promo.get('promo_name', ''),
-                                    'display_name': promo.get('promo_name', ''),
-                                    'description': promo.get('promo_desc', ''),
-                                    'product_count': int(promo.get('product_num', 0)),
-                                    'category': 'aliexpress',
-                                    'is_active': True
-                                }
-                                for i, promo in enumerate(promo_list)
-                            ]
-                        else:
-                            feeds = [{
-                                'id': '1',
-                                'name': promo_list.get('promo_name', ''),
-                                'display_name': promo_list.get('promo_name', ''),
-                                'description': promo_list.get('promo_desc', ''),
-                                'product_count': int(promo_list.get('product_num', 0)),
-                                'category': 'aliexpress',
-                                'is_active': True
-                            }]
-            
-            # Se não encontrou feeds via API, usar lista padrão
-            if not feeds:
-                feeds = [
-                    {
-                        'id': '1',
-                        'name': 'DS_Brazil_topsellers',
-                        'display_name': 'Mais Vendidos Brasil',
-                        'description': 'Produtos mais vendidos no Brasil',
-                        'product_count': 17605,
-                        'category': 'aliexpress',
-                        'is_active': True
-                    },
-                    {
-                        'id': '2',
-                        'name': 'DS_ConsumerElectronics_bestsellers',
-                        'display_name': 'Eletrônicos',
-                        'description': 'Eletrônicos mais vendidos',
-                        'product_count': 66299,
-                        'category': 'aliexpress',
-                        'is_active': True
-                    },
-                    {
-                        'id': '3',
-                        'name': 'DS_Home&Kitchen_bestsellers',
-                        'display_name': 'Casa e Cozinha',
-                        'description': 'Produtos para casa e cozinha',
-                        'product_count': 39643,
-                        'category': 'aliexpress',
-                        'is_active': True
-                    }
-                ]
-    
-                return jsonify({
+        if catalog_meta['error']:
+            message = f'Feeds do último snapshot ({catalog_meta["error"]})'
+        else:
+            message = 'Feeds carregados com sucesso'
+        return jsonify({
             'success': True,
             'data': {
                 'feeds': feeds,
                 'total_feeds': len(feeds)
             },
-            'message': 'Feeds carregados com sucesso'
+            'catalog': catalog_meta,
+            'message': message
         })
-        else:
-            return jsonify({
-                'success': False,
-                'message': f'Erro {response.status_code} ao buscar feeds',
-                'error': response.text
-            }), response.status_code
         
     except Exception as e:
         print(f'❌ Erro ao listar feeds para admin: {e}')
@@ -3627,21 +3823,11 @@ def admin_feed_products(feed_name):
         print(f'📦 ADMIN: Buscando produtos do feed {feed_name} - página {page}')
         
         # Buscar IDs dos produtos
-        params = {
-            "method": "aliexpress.ds.feed.itemids.get",
-            "app_key": APP_KEY,
-            "timestamp": int(time.time() * 1000),
-            "sign_method": "md5",
-            "format": "json",
-            "v": "2.0",
-            "access_token": tokens['access_token'],
+        response = ali_client.call("aliexpress.ds.feed.itemids.get", tokens['access_token'], {
             "feed_name": feed_name,
             "page_no": page,
             "page_size": page_size
-        }
-        params["sign"] = generate_api_signature(params, APP_SECRET)
-        
-        response = requests.get('https://api-sg.aliexpress.com/sync', params=params, timeout=15)
+        }, timeout=15)
         
         if response.status_code == 200:
             data = response.json()
@@ -3657,37 +3843,23 @@ def admin_feed_products(feed_name):
             except Exception as e:
                 print(f"⚠️ Erro extraindo IDs: {e}")
             
-            # Buscar detalhes dos produtos (limitado a 10 para evitar timeout)
-            products = []
-            max_products = min(10, page_size)  # Limitar a 10 produtos por vez
+            # Buscar detalhes dos produtos em paralelo (uma ida e volta de tempo)
+            products_by_id = {}
+            deadline = time.monotonic() + PRODUCT_BATCH_DEADLINE
             
-            for product_id in product_ids[:max_products]:
+            for item in get_product_details(product_ids[:page_size], tokens['access_token'], deadline=deadline, timeout=10):
+                product_id = item.item
+                if item.error:
+                    print(f'❌ Erro ao buscar produto {product_id}: {item.error}')
+                    continue
                 try:
-                    product_params = {
-                        "method": "aliexpress.ds.product.get",
-                        "app_key": APP_KEY,
-                        "timestamp": int(time.time() * 1000),
-                        "sign_method": "md5",
-                        "format": "json",
-                        "v": "2.0",
-                        "access_token": tokens['access_token'],
-                        "product_id": product_id,
-                        "ship_to_country": "BR",
-                        "target_currency": "BRL",
-                        "target_language": "pt",
-                        "remove_personal_benefit": "false"
-                    }
-                    product_params["sign"] = generate_api_signature(product_params, APP_SECRET)
-                    
-                    product_response = requests.get('https://api-sg.aliexpress.com/sync', params=product_params, timeout=10)
+                    product_response = item.value
                     
                     if product_response.status_code == 200:
                         product_data = product_response.json()
                         result = product_data.get("aliexpress_ds_product_get_response", {}).get("result", {}) or {}
                         
-                        # Debug: verificar estrutura dos dados
-                        print(f'🔍 DEBUG: Estrutura do produto {product_id}:')
-                        print(f'  - Keys disponíveis: {list(result.keys())}')
+                        log_feeds.debug('admin_feed_product.keys', product_id=product_id, keys=lazy_json(list(result.keys())))
                         
                         # Extrair preços das variações (SKUs)
                         sale_price = 0.0
@@ -3699,8 +3871,6 @@ def admin_feed_products(feed_name):
                                 first_sku = skus[0]
                                 sale_price = float(first_sku.get('offer_sale_price', 0))
                                 original_price = float(first_sku.get('sku_price', 0))
-                                print(f'  - offer_sale_price: {sale_price}')
-                                print(f'  - sku_price: {original_price}')
                         
                         # Formatar produto para o painel admin
                         product = {
@@ -3719,14 +3889,14 @@ def admin_feed_products(feed_name):
                             'feed_name': feed_name,
                             'is_imported': False  # Status para controle no painel admin
                         }
-                        products.append(product)
+                        products_by_id[product_id] = product
                         
                 except Exception as e:
                     print(f'❌ Erro ao buscar produto {product_id}: {e}')
                     continue
-                
-                # Pequena pausa para evitar rate limit
-                time.sleep(0.1)
+            
+            # Manter a ordem do feed
+            products = [products_by_id[pid] for pid in product_ids if pid in products_by_id]
             
             return jsonify({
                 'success': True,
@@ -3768,22 +3938,13 @@ def test_feed_api():
         print(f'🧪 Testando API do AliExpress para feeds...')
         
         # Teste 1: Buscar feeds disponíveis
-        params = {
-            "method": "aliexpress.ds.feedname.get",
-            "app_key": APP_KEY,
-            "timestamp": int(time.time() * 1000),
-            "sign_method": "md5",
-            "format": "json",
-            "v": "2.0",
-            "access_token": tokens['access_token']
-        }
-        params["sign"] = generate_api_signature(params, APP_SECRET)
+        params = ali_client.build_params("aliexpress.ds.feedname.get", tokens['access_token'])
         
         print(f'📡 Teste 1: Buscando feeds...')
-        response = requests.get('https://api-sg.aliexpress.com/sync', params=params, timeout=15)
+        response = ali_client.send(params, timeout=15)
         
         print(f'📡 Status: {response.status_code}')
-        print(f'📄 Resposta: {response.text}')
+        log_feeds.debug('test_feed_api.response', body=lazy_text(response.text))
         
         if response.status_code == 200:
             data = response.json()
@@ -3802,21 +3963,11 @@ def test_feed_api():
                         if first_feed:
                             print(f'📦 Teste 2: Buscando IDs do feed {first_feed}...')
                             
-                            params2 = {
-                                "method": "aliexpress.ds.feed.itemids.get",
-                                "app_key": APP_KEY,
-                                "timestamp": int(time.time() * 1000),
-                                "sign_method": "md5",
-                                "format": "json",
-                                "v": "2.0",
-                                "access_token": tokens['access_token'],
+                            response2 = ali_client.call("aliexpress.ds.feed.itemids.get", tokens['access_token'], {
                                 "feed_name": first_feed,
                                 "page_no": 1,
                                 "page_size": 5
-                            }
-                            params2["sign"] = generate_api_signature(params2, APP_SECRET)
-                            
-                            response2 = requests.get('https://api-sg.aliexpress.com/sync', params=params2, timeout=30)
+                            }, timeout=30)
                             
                             print(f'📡 Status 2: {response2.status_code}')
                             print(f'📄 Resposta 2: {response2.text}')
@@ -3846,40 +3997,16 @@ def test_feed_api():
 
     try:
         # Parâmetros para a API de feeds
-        params = {
-            "method": "aliexpress.ds.feedname.get",
-            "app_key": APP_KEY,
-            "timestamp": int(time.time() * 1000),
-            "sign_method": "md5",
-            "format": "json",
-            "v": "2.0",
-            "access_token": tokens['access_token']
-        }
-        
-        # Gerar assinatura
-        params["sign"] = generate_api_signature(params, APP_SECRET)
+        params = ali_client.build_params("aliexpress.ds.feedname.get", tokens['access_token'])
         
         print(f'📡 Consultando feeds disponíveis...')
-        response = requests.get('https://api-sg.aliexpress.com/sync', params=params)
+        response = ali_client.send(params)
         
-        # Salvar resposta completa em arquivo JSON
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        log_filename = f"logs/feeds_list_{timestamp}.json"
-        
-        # Criar diretório logs se não existir
-        os.makedirs("logs", exist_ok=True)
-        
-        # Salvar resposta bruta
-        with open(log_filename, 'w', encoding='utf-8') as f:
-            f.write(response.text)
-        
-        print(f'📡 Resposta feeds: {response.text[:500]}...')
-        print(f'💾 Resposta completa salva em: {log_filename}')
+        log_feeds.info('feeds_list.response', status=response.status_code)
         
         if response.status_code == 200:
             data = response.json()
-            print(f'✅ ESTRUTURA COMPLETA - FEEDS DISPONÍVEIS:')
-            print(json.dumps(data, indent=2, ensure_ascii=False))
+            log_feeds.debug('feeds_list.payload', payload=lazy_json(data))
             
             # Verificar se há dados na resposta
             if 'aliexpress_ds_feedname_get_response' in data:
@@ -3987,14 +4114,7 @@ def get_feed_products(feed_name):
     
     try:
         # Parâmetros para busca de produtos
-        search_params = {
-            "method": "aliexpress.ds.text.search",
-            "app_key": APP_KEY,
-            "timestamp": int(time.time() * 1000),
-            "sign_method": "md5",
-            "format": "json",
-            "v": "2.0",
-            "access_token": tokens['access_token'],
+        search_response = ali_client.call("aliexpress.ds.text.search", tokens['access_token'], {
             "keyWord": "electronics",  # Termo base para busca
             "countryCode": "BR",
             "currency": "BRL",
@@ -4002,10 +4122,7 @@ def get_feed_products(feed_name):
             "pageSize": str(page_size),
             "pageIndex": str(page),
             "sortBy": "orders,desc"
-        }
-        
-        search_params["sign"] = generate_api_signature(search_params, APP_SECRET)
-        search_response = requests.get('https://api-sg.aliexpress.com/sync', params=search_params)
+        })
         
         if search_response.status_code == 200:
             search_data = search_response.json()
@@ -4083,20 +4200,11 @@ def get_feed_details(feed_name):
 
     try:
         # 1) Buscar item_ids do feed
-        params = {
-            "method": "aliexpress.ds.feed.itemids.get",
-            "app_key": APP_KEY,
-            "timestamp": int(time.time() * 1000),
-            "sign_method": "md5",
-            "format": "json",
-            "v": "2.0",
-            "access_token": tokens['access_token'],
+        ids_resp = ali_client.call("aliexpress.ds.feed.itemids.get", tokens['access_token'], {
             "feed_name": feed_name,
             "page_no": page,
             "page_size": page_size
-        }
-        params["sign"] = generate_api_signature(params, APP_SECRET)
-        ids_resp = requests.get('https://api-sg.aliexpress.com/sync', params=params, timeout=15)
+        }, timeout=15)
         ids = []
         if ids_resp.status_code == 200:
             ids_json = ids_resp.json()
@@ -4118,22 +4226,13 @@ def get_feed_details(feed_name):
         detailed = []
         for product_id in ids[:limit]:
             try:
-                p = {
-                    "method": "aliexpress.ds.product.get",
-                    "app_key": APP_KEY,
-                    "timestamp": int(time.time() * 1000),
-                    "sign_method": "md5",
-                    "format": "json",
-                    "v": "2.0",
-                    "access_token": tokens['access_token'],
+                r = ali_client.call("aliexpress.ds.product.get", tokens['access_token'], {
                     "product_id": str(product_id),
                     "ship_to_country": "BR",
                     "target_currency": "BRL",
                     "target_language": "pt",
                     "remove_personal_benefit": "false"
-                }
-                p["sign"] = generate_api_signature(p, APP_SECRET)
-                r = requests.get('https://api-sg.aliexpress.com/sync', params=p, timeout=15)
+                }, timeout=15)
                 if r.status_code == 200:
                     j = r.json()
                     res = j.get('aliexpress_ds_product_get_response', {}).get('result', {})
@@ -4168,14 +4267,7 @@ def test_search():
     
     try:
         # Parâmetros para busca de produtos
-        search_params = {
-            "method": "aliexpress.ds.text.search",
-            "app_key": APP_KEY,
-            "timestamp": int(time.time() * 1000),
-            "sign_method": "md5",
-            "format": "json",
-            "v": "2.0",
-            "access_token": tokens['access_token'],
+        search_response = ali_client.call("aliexpress.ds.text.search", tokens['access_token'], {
             "keyWord": "smartphone",
             "countryCode": "BR",
             "currency": "BRL",
@@ -4183,18 +4275,13 @@ def test_search():
             "pageSize": "5",
             "pageIndex": "1",
             "sortBy": "orders,desc"
-        }
-        
-        search_params["sign"] = generate_api_signature(search_params, APP_SECRET)
-        search_response = requests.get('https://api-sg.aliexpress.com/sync', params=search_params)
+        })
         
         print(f'🔍 TESTE - Status da busca: {search_response.status_code}')
-        print(f'🔍 TESTE - URL da requisição: {search_response.url}')
         
         if search_response.status_code == 200:
             search_data = search_response.json()
-            print(f'🔍 TESTE - JSON COMPLETO DA RESPOSTA:')
-            print(json.dumps(search_data, indent=2, ensure_ascii=False))
+            log_feeds.debug('test_feed_search.payload', payload=lazy_json(search_data))
             
             return jsonify({
                 'success': True,
@@ -4230,28 +4317,16 @@ def test_feed_products():
         feed_id = request.args.get('feed_id', '1')
         
         # Parâmetros para buscar produtos do feed
-        products_params = {
-            "method": "aliexpress.ds.feed.itemids.get",
-            "app_key": APP_KEY,
-            "timestamp": int(time.time() * 1000),
-            "sign_method": "md5",
-            "format": "json",
-            "v": "2.0",
-            "access_token": tokens['access_token'],
+        products_response = ali_client.call("aliexpress.ds.feed.itemids.get", tokens['access_token'], {
             "feed_name": "AEB_ ComputerAccessories_EG",
             "page_size": "5"
-        }
-        
-        products_params["sign"] = generate_api_signature(products_params, APP_SECRET)
-        products_response = requests.get('https://api-sg.aliexpress.com/sync', params=products_params)
+        })
         
         print(f'🔍 TESTE FEED PRODUTOS - Status: {products_response.status_code}')
-        print(f'🔍 TESTE FEED PRODUTOS - URL: {products_response.url}')
         
         if products_response.status_code == 200:
             products_data = products_response.json()
-            print(f'🔍 TESTE FEED PRODUTOS - JSON COMPLETO:')
-            print(json.dumps(products_data, indent=2, ensure_ascii=False))
+            log_feeds.debug('test_feed_products.payload', feed_id=feed_id, payload=lazy_json(products_data))
             
             return jsonify({
                 'success': True,
@@ -4656,8 +4731,8 @@ def translate_attributes():
         return jsonify({'success': False, 'message': str(e)}), 500
 
 # ===================== FRETE REAL (API ALIEXPRESS) =====================
-def calculate_real_shipping_quotes(product_id, destination_cep, items):
-    """Calcula cotações de frete usando API real do AliExpress"""
+def calculate_real_shipping_quotes(product_id, destination_cep, items, sku_id=None, timeout=None):
+    """Calcula cotações de frete usando API real do AliExpress (timeout: o que resta do orçamento)"""
     tokens = load_tokens()
     if not tokens or not tokens.get('access_token'):
         raise Exception('Token não encontrado. Faça autorização primeiro.')
@@ -4666,47 +4741,45 @@ def calculate_real_shipping_quotes(product_id, destination_cep, items):
         # Calcular peso total dos itens
         total_weight = sum(item.get('weight', 0.5) * item.get('quantity', 1) for item in items)
         
+        # UF do destino pela tabela de faixas de CEP (São Paulo se fora das faixas)
+        region = region_for_cep(destination_cep)
+        province_code = region.uf if region else 'SP'
+        
         # Parâmetros para a API de frete conforme documentação oficial (Dropshipping API)
         # Ordem correta conforme documentação: quantity, shipToCountry, productId, provinceCode, cityCode, language, locale, selectedSkuId, currency
-        query_delivery_req_json = json.dumps({
+        query_delivery_req = {
             "quantity": str(sum(item.get('quantity', 1) for item in items)),
             "shipToCountry": "BR",
             "productId": product_id,
-            "provinceCode": "SP",  # São Paulo como padrão
-            "cityCode": "SAO",     # São Paulo como padrão
+            "provinceCode": province_code,
+        }
+        if province_code in ALIEXPRESS_CITY_CODES:
+            query_delivery_req["cityCode"] = ALIEXPRESS_CITY_CODES[province_code]
+        query_delivery_req.update({
             "language": "pt_BR",
             "locale": "pt_BR",
-            "selectedSkuId": "12000023999200390",  # SKU padrão
+            "selectedSkuId": str(sku_id or DEFAULT_FREIGHT_SKU_ID),
             "currency": "BRL"
         })
+        query_delivery_req_json = json.dumps(query_delivery_req)
         
-        params = {
-            "method": "aliexpress.ds.freight.query",
-            "app_key": APP_KEY,
-            "timestamp": int(time.time() * 1000),
-            "sign_method": "md5",
-            "format": "json",
-            "v": "2.0",
-            "access_token": tokens['access_token'],
+        params = ali_client.build_params("aliexpress.ds.freight.query", tokens['access_token'], {
             "queryDeliveryReq": query_delivery_req_json
-        }
-        
-        # Gerar assinatura
-        params["sign"] = generate_api_signature(params, APP_SECRET)
+        })
         
-        print(f'🚚 Calculando frete real para produto {product_id}')
-        print(f'🚚 Parâmetros: {params}')
+        log_shipping.info('freight_query.request', product_id=product_id, cep=destination_cep)
+        log_shipping.debug('freight_query.params', product_id=product_id, params=lazy_json(redact_params(params)))
         
         # Fazer requisição para API de frete
-        response = requests.get('https://api-sg.aliexpress.com/sync', params=params)
-        print(f'🚚 Status Code: {response.status_code}')
-        print(f'🚚 Headers: {dict(response.headers)}')
-        print(f'🚚 Resposta completa: {response.text}')
+        response = ali_client.send(params, timeout=timeout)
+        log_shipping.info('freight_query.response', product_id=product_id, status=response.status_code,
+                          elapsed_ms=round(response.elapsed * 1000, 1))
+        log_shipping.debug('freight_query.headers', product_id=product_id, headers=lazy_json(dict(response.headers)))
         
         if response.status_code == 200:
             try:
                 data = response.json()
-                print(f'🚚 Dados JSON: {json.dumps(data, indent=2)}')
+                log_shipping.debug('freight_query.payload', product_id=product_id, payload=lazy_json(data))
                 
                 if 'aliexpress_ds_freight_query_response' in data:
                     freight_response = data['aliexpress_ds_freight_query_response']
@@ -4759,16 +4832,16 @@ def calculate_real_shipping_quotes(product_id, destination_cep, items):
                         else:
                             raise Exception(f'Erro na API de frete: {error_msg}')
                 else:
-                    print(f'❌ Estrutura inesperada. Keys disponíveis: {list(data.keys())}')
-                    print(f'❌ Conteúdo completo: {json.dumps(data, indent=2)}')
+                    log_shipping.warning('freight_query.unexpected', product_id=product_id, keys=list(data.keys()),
+                                         payload=lazy_json(data, limit=2000))
                     raise Exception('Resposta inesperada da API de frete')
             except json.JSONDecodeError as e:
-                print(f'❌ Erro ao decodificar JSON: {e}')
-                print(f'❌ Resposta raw: {response.text}')
+                log_shipping.error('freight_query.invalid_json', product_id=product_id, error=str(e),
+                                   body=lazy_text(response.text, limit=2000))
                 raise Exception(f'Erro ao decodificar resposta JSON: {e}')
         else:
-            print(f'❌ Erro HTTP {response.status_code}')
-            print(f'❌ Resposta de erro: {response.text}')
+            log_shipping.error('freight_query.http_error', product_id=product_id, status=response.status_code,
+                               body=lazy_text(response.text, limit=2000))
             raise Exception(f'Erro HTTP {response.status_code}: {response.text}')
             
     except Exception as e:
@@ -4776,82 +4849,46 @@ def calculate_real_shipping_quotes(product_id, destination_cep, items):
         # Propagar erro para função principal fazer o fallback
         raise e
 
-def calculate_correios_shipping_quotes(destination_cep, items):
-    """Calcula cotações de frete usando API dos Correios"""
+def calculate_correios_shipping_quotes(destination_cep, items, timeout=None):
+    """Calcula cotações de frete dos Correios (cache → serviço → tabela local)"""
+    origin_cep = f'{correios_client.origin_cep[:5]}-{correios_client.origin_cep[5:]}'
     try:
         # Calcular peso total
         total_weight = sum(item.get('weight', 0.5) * item.get('quantity', 1) for item in items)
         
-        # Parâmetros para API dos Correios
-        correios_params = {
-            'nCdEmpresa': '',
-            'sDsSenha': '',
-            'nCdServico': '04510',  # PAC
-            'sCepOrigem': '01001000',  # CEP de origem
-            'sCepDestino': destination_cep.replace('-', ''),
-            'nVlPeso': str(total_weight),
-            'nCdFormato': '1',  # Caixa/Pacote
-            'nVlComprimento': '20',
-            'nVlAltura': '10',
-            'nVlLargura': '15',
-            'nVlDiametro': '0',
-            'sCdMaoPropria': 'N',
-            'nVlValorDeclarado': '0',
-            'sCdAvisoRecebimento': 'N'
-        }
-        
         print(f'📮 Calculando frete Correios para CEP: {destination_cep}')
-        print(f'📮 Parâmetros: {correios_params}')
-        
-        # Fazer requisição para API dos Correios
-        response = requests.get('https://ws.correios.com.br/calculador/CalcPrecoPrazo.asmx/CalcPrecoPrazo', 
-                               params=correios_params, timeout=30)
+        results = correios_client.quote(destination_cep, total_weight, timeout=timeout)
+        log_shipping.info('correios.quote', cep=destination_cep, weight=total_weight,
+                          sources=[r['source'] for r in results])
+        
+        quotes = []
+        for r in results:
+            codigo = r['service']
+            service_name = f"{SERVICE_NAMES.get(codigo, f'Serviço {codigo}')} - Correios"
+            if r['source'] == 'rate_table':
+                note = f'Frete estimado pela tabela local dos Correios - {service_name}'
+            else:
+                note = f'Frete calculado via API dos Correios - {service_name}'
+            quotes.append({
+                'service_code': f'CORREIOS_{codigo}',
+                'service_name': service_name,
+                'carrier': 'Correios',
+                'price': r['price'],
+                'currency': 'BRL',
+                'estimated_days': int(r['days']),
+                'max_delivery_days': int(r['days']) + 2,
+                'tracking_available': True,
+                'free_shipping': False,
+                'origin_cep': origin_cep,
+                'destination_cep': destination_cep,
+                'notes': note
+            })
         
-        print(f'📮 Status Code: {response.status_code}')
-        print(f'📮 Resposta: {response.text}')
+        if not quotes:
+            raise Exception('Correios indisponível e sem preço na tabela local para o destino')
         
-        if response.status_code == 200:
-            # Parsear resposta XML dos Correios
-            import xml.etree.ElementTree as ET
-            root = ET.fromstring(response.text)
-            
-            quotes = []
-            for servico in root.findall('.//cServico'):
-                codigo = servico.find('Codigo').text if servico.find('Codigo') is not None else '04510'
-                valor = servico.find('Valor').text if servico.find('Valor') is not None else '0'
-                prazo = servico.find('PrazoEntrega').text if servico.find('PrazoEntrega') is not None else '5'
-                erro = servico.find('Erro').text if servico.find('Erro') is not None else '0'
-                
-                if erro == '0':  # Sem erro
-                    # Converter valor de string (ex: "R$ 15,50") para float
-                    valor_limpo = valor.replace('R$', '').replace(',', '.').strip()
-                    try:
-                        valor_float = float(valor_limpo)
-                    except:
-                        valor_float = 0.0
-                    
-                    service_name = 'PAC - Correios' if codigo == '04510' else f'Serviço {codigo} - Correios'
-                    
-                    quotes.append({
-                        'service_code': f'CORREIOS_{codigo}',
-                        'service_name': service_name,
-                        'carrier': 'Correios',
-                        'price': valor_float,
-                        'currency': 'BRL',
-                        'estimated_days': int(prazo),
-                        'max_delivery_days': int(prazo) + 2,
-                        'tracking_available': True,
-                        'free_shipping': False,
-                        'origin_cep': '01001-000',
-                        'destination_cep': destination_cep,
-                        'notes': f'Frete calculado via API dos Correios - {service_name}'
-                    })
-            
-            print(f'✅ Frete Correios calculado: {len(quotes)} opções')
-            return quotes
-        else:
-            print(f'❌ Erro HTTP Correios: {response.status_code}')
-            raise Exception(f'Erro HTTP {response.status_code} na API dos Correios')
+        print(f'✅ Frete Correios calculado: {len(quotes)} opções')
+        return quotes
             
     except Exception as e:
         print(f'❌ Erro ao calcular frete Correios: {e}')
@@ -4866,7 +4903,7 @@ def calculate_correios_shipping_quotes(destination_cep, items):
             'max_delivery_days': 7,
             'tracking_available': True,
             'free_shipping': False,
-            'origin_cep': '01001-000',
+            'origin_cep': origin_cep,
             'destination_cep': destination_cep,
             'notes': 'Frete padrão (fallback)'
         }]
@@ -4909,22 +4946,12 @@ def test_product():
             return jsonify({'success': False, 'message': 'Token não encontrado'}), 401
         
         # Montar chamada da API
-        params = {
-            "method": "aliexpress.ds.product.get",
-            "app_key": APP_KEY,
-            "timestamp": int(time.time() * 1000),
-            "sign_method": "md5",
-            "format": "json",
-            "v": "2.0",
-            "access_token": tokens['access_token'],
+        response = ali_client.call("aliexpress.ds.product.get", tokens['access_token'], {
             "product_id": product_id,
             "ship_to_country": "BR",
             "target_currency": "BRL",
             "target_language": "pt"
-        }
-        params["sign"] = generate_api_signature(params, APP_SECRET)
-        
-        response = requests.get('https://api-sg.aliexpress.com/sync', params=params, timeout=45)
+        }, timeout=45)
         
         if response.status_code != 200:
             return jsonify({'success': False, 'error': response.text}), response.status_code
@@ -4968,24 +4995,14 @@ def debug_tokens():
             })
         
         # Testar se o token ainda é válido
-        test_params = {
-            "method": "aliexpress.ds.freight.query",
-            "app_key": APP_KEY,
-            "timestamp": int(time.time() * 1000),
-            "sign_method": "md5",
-            "format": "json",
-            "v": "2.0",
-            "access_token": tokens['access_token'],
+        test_params = ali_client.build_params("aliexpress.ds.freight.query", tokens['access_token'], {
             "product_id": "3256802900954148",
             "destination_cep": "01001-000"
-        }
-        
-        # Gerar assinatura
-        test_params['sign'] = generate_api_signature(test_params, APP_SECRET)
+        })
         
         print(f"🔍 Testando tokens com params: {test_params}")
         
-        response = requests.get('https://api-sg.aliexpress.com/sync', params=test_params)
+        response = ali_client.send(test_params)
         
         return jsonify({
             'success': True,
@@ -5007,6 +5024,23 @@ def debug_tokens():
             'tokens': None
         })
 
+@app.route('/debug/upstream', methods=['GET'])
+def debug_upstream():
+    """Estatísticas das chamadas ao AliExpress neste worker (pool, cota, coalescência)"""
+    return jsonify({
+        'success': True,
+        'pid': os.getpid(),
+        'client': ali_client.stats(),
+        'rate_limiter': ali_rate_limiter.stats(),
+        'token_cache': token_cache.stats(),
+        'token_refresher': token_refresher.stats(),
+        'product_cache': product_cache.stats(),
+        'shipping_quote_cache': shipping_quote_cache.stats(),
+        'shipping_matrix': shipping_matrix_store.stats(),
+        'correios': correios_client.stats(),
+        'feed_catalog': feed_catalog.stats()
+    })
+
 @app.route('/debug/order', methods=['GET'])
 def debug_order():
     """Debug endpoint para testar criação de pedidos"""
@@ -5062,14 +5096,7 @@ def debug_freight():
             })
         
         # Testar API de frete com parâmetros fixos
-        test_params = {
-            "method": "aliexpress.ds.freight.query",
-            "app_key": APP_KEY,
-            "timestamp": int(time.time() * 1000),
-            "sign_method": "md5",
-            "format": "json",
-            "v": "2.0",
-            "access_token": tokens['access_token'],
+        test_params = ali_client.build_params("aliexpress.ds.freight.query", tokens['access_token'], {
             "queryDeliveryReq": json.dumps({
                 "productId": "3256802900954148",
                 "quantity": "1",
@@ -5081,14 +5108,11 @@ def debug_freight():
                 "currency": "BRL",
                 "locale": "pt_BR"
             })
-        }
-        
-        # Gerar assinatura
-        test_params['sign'] = generate_api_signature(test_params, APP_SECRET)
+        })
         
         print(f"🔍 Debug frete - Parâmetros: {json.dumps(test_params, indent=2)}")
         
-        response = requests.get('https://api-sg.aliexpress.com/sync', params=test_params)
+        response = ali_client.send(test_params)
         
         return jsonify({
             'success': True,
@@ -5180,35 +5204,20 @@ def create_aliexpress_order(order_data):
         }
         
         # Parâmetros da requisição
-        params = {
-            "method": "aliexpress.ds.order.create",
-            "app_key": APP_KEY,
-            "timestamp": int(time.time() * 1000),
-            "sign_method": "md5",
-            "format": "json",
-            "v": "2.0",
-            "access_token": tokens['access_token'],
+        params = ali_client.build_params("aliexpress.ds.order.create", tokens['access_token'], {
             "param_place_order_request4_open_api_d_t_o": json.dumps(param_place_order_request),
             "ds_extend_request": json.dumps(ds_extend_request)
-        }
-        
-        # Gerar assinatura
-        params["sign"] = generate_api_signature(params, APP_SECRET)
+        })
         
-        print(f'🛒 Criando pedido AliExpress: {json.dumps(params, indent=2)}')
-        print(f'🛒 Logistics Address: {json.dumps(logistics_address, indent=2)}')
+        log_orders.info('order_create.request', items=len(product_items))
+        log_orders.debug('order_create.params', params=lazy_json(redact_params(params)),
+                         logistics_address=lazy_json(logistics_address))
         
         # Fazer requisição
-        response = requests.get('https://api-sg.aliexpress.com/sync', params=params)
-        print(f'🛒 Status Code: {response.status_code}')
-        print(f'🛒 Resposta: {response.text}')
-        
-        # Log da resposta completa para debug
-        try:
-            response_data = response.json()
-            print(f'🛒 Resposta JSON: {json.dumps(response_data, indent=2)}')
-        except:
-            print(f'🛒 Resposta não é JSON válido: {response.text}')
+        response = ali_client.send(params)
+        log_orders.info('order_create.response', status=response.status_code,
+                        elapsed_ms=round(response.elapsed * 1000, 1))
+        log_orders.debug('order_create.body', body=lazy_text(response.text, limit=4000))
         
         if response.status_code == 200:
             data = response.json()
@@ -5274,7 +5283,7 @@ def create_order():
                 'message': 'Lista de itens deve conter pelo menos um item'
             }), 400
         
-        print(f'🛒 Recebendo pedido: {json.dumps(data, indent=2)}')
+        log_orders.debug('order_create.received', payload=lazy_json(data))
         
         # Criar pedido no AliExpress
         result = create_aliexpress_order(data)
@@ -5296,28 +5305,18 @@ def get_aliexpress_order_tracking(order_id):
     
     try:
         # Parâmetros da API
-        params = {
-            "method": "aliexpress.ds.order.tracking.get",
-            "app_key": APP_KEY,
-            "timestamp": int(time.time() * 1000),
-            "sign_method": "md5",
-            "format": "json",
-            "v": "2.0",
-            "access_token": tokens['access_token'],
+        params = ali_client.build_params("aliexpress.ds.order.tracking.get", tokens['access_token'], {
             "ae_order_id": str(order_id),
             "language": "en_US"
-        }
-        
-        # Gerar assinatura
-        params["sign"] = generate_api_signature(params, APP_SECRET)
+        })
         
         print(f'📋 Buscando tracking do pedido AliExpress: {order_id}')
-        print(f'📋 Parâmetros: {json.dumps(params, indent=2)}')
+        log_orders.debug('tracking.params', order_id=order_id, params=lazy_json(redact_params(params)))
         
         # Fazer requisição
-        response = requests.get('https://api-sg.aliexpress.com/sync', params=params)
-        print(f'📋 Status Code: {response.status_code}')
-        print(f'📋 Resposta: {response.text}')
+        response = ali_client.send(params)
+        log_orders.info('tracking.response', order_id=order_id, status=response.status_code)
+        log_orders.debug('tracking.body', order_id=order_id, body=lazy_text(response.text, limit=4000))
         
         if response.status_code == 200:
             data = response.json()
@@ -5402,25 +5401,10 @@ def get_product_skus(product_id):
                 'message': 'Token não encontrado. Faça autorização primeiro.'
             }), 401
         
-        # Parâmetros para buscar SKUs
-        params = {
-            "method": "aliexpress.ds.product.get",
-            "app_key": APP_KEY,
-            "timestamp": int(time.time() * 1000),
-            "sign_method": "md5",
-            "format": "json",
-            "v": "2.0",
-            "access_token": tokens['access_token'],
-            "product_id": product_id
-        }
-        
-        # Gerar assinatura
-        params["sign"] = generate_api_signature(params, APP_SECRET)
-        
         print(f'🔍 Buscando SKUs para produto {product_id}')
         
-        # Fazer requisição
-        response = requests.get('https://api-sg.aliexpress.com/sync', params=params)
+        # Mesma entrada de cache usada pelos detalhes do produto
+        response = get_product_detail(product_id, tokens['access_token'])
         
         if response.status_code == 200:
             data = response.json()
@@ -5901,7 +5885,8 @@ def mp_webhook():
     try:
         data = request.get_json()
         
-        print(f'📡 Webhook Mercado Pago recebido: {json.dumps(data, indent=2)}')
+        log_payments.info('mp_webhook.received', type=(data or {}).get('type'), action=(data or {}).get('action'))
+        log_payments.debug('mp_webhook.payload', payload=lazy_json(data))
         
         # Validar assinatura do webhook (opcional, mas recomendado)
         # signature = request.headers.get('X-Signature')
@@ -6576,7 +6561,12 @@ def _save_payment_order_relation(payment_id, external_reference, order_id):
 
 # ===================== CÁLCULO DE FRETE PARA CEPs PRINCIPAIS =====================
 def calculate_shipping_for_main_ceps(product_id, product_weight=0.5, product_dimensions=None):
-    """Calcula frete para CEPs principais do Brasil no momento da importação"""
+    """
+    Calcula frete para CEPs principais do Brasil no momento da importação.
+    As consultas ao AliExpress rodam em paralelo com um prazo comum; CEPs que
+    falham ou estouram o prazo usam o frete próprio.
+    Devolve (shipping_data, report) onde report traz origem e latência por CEP.
+    """
     
     # CEPs principais do Brasil
     main_ceps = {
@@ -6600,245 +6590,119 @@ def calculate_shipping_for_main_ceps(product_id, product_weight=0.5, product_dim
             'height': 5.0    # cm
         }
     
+    items = [{
+        'product_id': product_id,
+        'quantity': 1,
+        'weight': product_weight,
+        'length': product_dimensions['length'],
+        'height': product_dimensions['height'],
+        'width': product_dimensions['width']
+    }]
     shipping_data = {}
+    report = {}
     
     try:
         tokens = load_tokens()
         if not tokens or not tokens.get('access_token'):
             print(f"⚠️ Token não disponível para calcular frete do produto {product_id}")
             # Usar cálculo próprio como fallback
-            return _calculate_own_shipping_for_ceps(main_ceps, product_weight, product_dimensions)
+            for cep, location in main_ceps.items():
+                report[cep] = {'location': location, 'source': 'own', 'latency_ms': 0.0, 'cached': False}
+            return _calculate_own_shipping_for_ceps(main_ceps, product_weight, product_dimensions), report
         
         print(f"🚚 Calculando frete AliExpress para produto {product_id} em {len(main_ceps)} CEPs...")
         
-        for cep, location in main_ceps.items():
-            try:
-                # Calcular frete via API AliExpress
-                quotes = calculate_real_shipping_quotes(product_id, cep, [{
-                    'product_id': product_id,
-                    'quantity': 1,
-                    'weight': product_weight,
-                    'length': product_dimensions['length'],
-                    'height': product_dimensions['height'],
-                    'width': product_dimensions['width']
-                }])
-                
-                # Processar opções de frete
-                shipping_options = {}
-                for quote in quotes:
-                    service_code = quote.get('service_code', 'UNKNOWN')
-                    if 'ECONOMY' in service_code.upper() or 'STANDARD' in service_code.upper():
-                        shipping_options['economy'] = {
-                            'price': quote.get('price', 0.0),
-                            'days': quote.get('estimated_days', 30),
-                            'carrier': quote.get('carrier', 'AliExpress'),
-                            'service_name': quote.get('service_name', 'Entrega Padrão')
-                        }
-                    elif 'EXPRESS' in service_code.upper() or 'FAST' in service_code.upper():
-                        shipping_options['express'] = {
-                            'price': quote.get('price', 0.0),
-                            'days': quote.get('estimated_days', 15),
-                            'carrier': quote.get('carrier', 'AliExpress'),
-                            'service_name': quote.get('service_name', 'Entrega Expressa')
-                        }
-                
-                # Se não encontrou opções específicas, usar as primeiras disponíveis
-                if not shipping_options and quotes:
-                    first_quote = quotes[0]
-                    shipping_options['standard'] = {
-                        'price': first_quote.get('price', 0.0),
-                        'days': first_quote.get('estimated_days', 25),
-                        'carrier': first_quote.get('carrier', 'AliExpress'),
-                        'service_name': first_quote.get('service_name', 'Entrega Padrão')
-                    }
-                
-                shipping_data[cep] = shipping_options
-                print(f"✅ CEP {cep} ({location}): {len(shipping_options)} opções")
-                
-            except Exception as e:
-                print(f"❌ Erro ao calcular frete para CEP {cep}: {e}")
+        def _quote(cep):
+            return get_cached_shipping_quotes(
+                'aliexpress_api',
+                lambda: calculate_real_shipping_quotes(product_id, cep, items),
+                product_id, cep, items
+            )
+        
+        deadline = time.monotonic() + MAIN_CEPS_SHIPPING_DEADLINE
+        for res in fan_out(_quote, list(main_ceps), max_workers=len(main_ceps), deadline=deadline):
+            cep = res.item
+            entry = {'location': main_ceps[cep], 'latency_ms': round(res.elapsed * 1000, 1), 'cached': False}
+            if res.error is None:
+                quotes, entry['cached'] = res.value
+                shipping_data[cep] = _shipping_options_from_quotes(quotes)
+                entry['source'] = 'aliexpress_api'
+                print(f"✅ CEP {cep} ({main_ceps[cep]}): {len(shipping_data[cep])} opções")
+            else:
+                print(f"❌ Erro ao calcular frete para CEP {cep}: {res.error}")
                 # Usar cálculo próprio como fallback para este CEP
                 shipping_data[cep] = _calculate_own_shipping_for_cep(cep, product_weight, product_dimensions)
+                entry['source'] = 'own_fallback'
+                entry['error'] = str(res.error)
+            report[cep] = entry
         
         print(f"✅ Frete calculado para {len(shipping_data)} CEPs")
-        return shipping_data
+        return shipping_data, report
         
     except Exception as e:
         print(f"❌ Erro geral no cálculo de frete: {e}")
         # Fallback completo para cálculo próprio
-        return _calculate_own_shipping_for_ceps(main_ceps, product_weight, product_dimensions)
+        for cep, location in main_ceps.items():
+            report[cep] = {'location': location, 'source': 'own_fallback', 'latency_ms': 0.0, 'cached': False}
+        return _calculate_own_shipping_for_ceps(main_ceps, product_weight, product_dimensions), report
+
+def _shipping_options_from_quotes(quotes):
+    """Agrupa as cotações do AliExpress em economy/express (ou standard)"""
+    shipping_options = {}
+    for quote in quotes:
+        service_code = quote.get('service_code', 'UNKNOWN')
+        if 'ECONOMY' in service_code.upper() or 'STANDARD' in service_code.upper():
+            shipping_options['economy'] = {
+                'price': quote.get('price', 0.0),
+                'days': quote.get('estimated_days', 30),
+                'carrier': quote.get('carrier', 'AliExpress'),
+                'service_name': quote.get('service_name', 'Entrega Padrão'),
+                'service_code': service_code
+            }
+        elif 'EXPRESS' in service_code.upper() or 'FAST' in service_code.upper():
+            shipping_options['express'] = {
+                'price': quote.get('price', 0.0),
+                'days': quote.get('estimated_days', 15),
+                'carrier': quote.get('carrier', 'AliExpress'),
+                'service_name': quote.get('service_name', 'Entrega Expressa'),
+                'service_code': service_code
+            }
+    
+    # Se não encontrou opções específicas, usar as primeiras disponíveis
+    if not shipping_options and quotes:
+        first_quote = quotes[0]
+        shipping_options['standard'] = {
+            'price': first_quote.get('price', 0.0),
+            'days': first_quote.get('estimated_days', 25),
+            'carrier': first_quote.get('carrier', 'AliExpress'),
+            'service_name': first_quote.get('service_name', 'Entrega Padrão'),
+            'service_code': first_quote.get('service_code')
+        }
+    return shipping_options
 
 def _calculate_own_shipping_for_ceps(ceps, weight, dimensions):
-    """Calcula frete próprio para múltiplos CEPs"""
-    shipping_data = {}
-    
-    for cep in ceps.keys():
-        shipping_data[cep] = _calculate_own_shipping_for_cep(cep, weight, dimensions)
+    """Calcula frete próprio para múltiplos CEPs (uma avaliação vetorizada)"""
+    ceps = list(ceps)
+    prices, days = own_import_rate_engine.quote_many(ceps, [weight] * len(ceps))
     
+    shipping_data = {}
+    for i, cep in enumerate(ceps):
+        shipping_data[cep] = {
+            service: {
+                'price': float(prices[i, s]),
+                'days': int(days[i, s]),
+                'carrier': own_import_rate_engine.service_info[service]['carrier'],
+                'service_name': own_import_rate_engine.service_info[service]['service_name']
+            }
+            for s, service in enumerate(own_import_rate_engine.services)
+            # Serviço sem tarifa para a zona do CEP (NaN não é JSON válido)
+            if not math.isnan(prices[i, s])
+        }
     return shipping_data
 
 def _calculate_own_shipping_for_cep(cep, weight, dimensions):
     """Calcula frete próprio para um CEP específico"""
-    
-    # Regras de frete próprio
-    base_price = 19.90
-    price_per_kg = 6.50
-    express_multiplier = 1.5
-    
-    # Calcular preço baseado no peso
-    total_price = base_price + (weight * price_per_kg)
-    
-    # Determinar prazo baseado na região
-    region_days = _get_region_delivery_days(cep)
-    
-    return {
-        'economy': {
-            'price': round(total_price, 2),
-            'days': region_days['economy'],
-            'carrier': 'Correios/Parceiro',
-            'service_name': 'Entrega Padrão'
-        },
-        'express': {
-            'price': round(total_price * express_multiplier, 2),
-            'days': region_days['express'],
-            'carrier': 'Parceiro Expresso',
-            'service_name': 'Entrega Expressa'
-        }
-    }
-
-def _get_region_delivery_days(cep):
-    """Determina prazo de entrega baseado na região do CEP"""
-    
-    # Extrair região do CEP (primeiros 2 dígitos)
-    region = cep[:2]
-    
-    # Prazos por região (em dias úteis)
-    region_prazos = {
-        # Sudeste
-        '01': {'economy': 3, 'express': 1},   # São Paulo
-        '02': {'economy': 3, 'express': 1},   # São Paulo
-        '03': {'economy': 3, 'express': 1},   # São Paulo
-        '04': {'economy': 3, 'express': 1},   # São Paulo
-        '05': {'economy': 3, 'express': 1},   # São Paulo
-        '06': {'economy': 3, 'express': 1},   # São Paulo
-        '07': {'economy': 3, 'express': 1},   # São Paulo
-        '08': {'economy': 3, 'express': 1},   # São Paulo
-        '09': {'economy': 3, 'express': 1},   # São Paulo
-        '20': {'economy': 5, 'express': 2},   # Rio de Janeiro
-        '21': {'economy': 5, 'express': 2},   # Rio de Janeiro
-        '22': {'economy': 5, 'express': 2},   # Rio de Janeiro
-        '23': {'economy': 5, 'express': 2},   # Rio de Janeiro
-        '24': {'economy': 5, 'express': 2},   # Rio de Janeiro
-        '25': {'economy': 5, 'express': 2},   # Rio de Janeiro
-        '26': {'economy': 5, 'express': 2},   # Rio de Janeiro
-        '27': {'economy': 5, 'express': 2},   # Rio de Janeiro
-        '28': {'economy': 5, 'express': 2},   # Rio de Janeiro
-        '29': {'economy': 5, 'express': 2},   # Rio de Janeiro
-        '30': {'economy': 4, 'express': 2},   # Minas Gerais
-        '31': {'economy': 4, 'express': 2},   # Minas Gerais
-        '32': {'economy': 4, 'express': 2},   # Minas Gerais
-        '33': {'economy': 4, 'express': 2},   # Minas Gerais
-        '34': {'economy': 4, 'express': 2},   # Minas Gerais
-        '35': {'economy': 4, 'express': 2},   # Minas Gerais
-        '36': {'economy': 4, 'express': 2},   # Minas Gerais
-        '37': {'economy': 4, 'express': 2},   # Minas Gerais
-        '38': {'economy': 4, 'express': 2},   # Minas Gerais
-        '39': {'economy': 4, 'express': 2},   # Minas Gerais
-        '11': {'economy': 3, 'express': 1},   # São Paulo (interior)
-        '12': {'economy': 3, 'express': 1},   # São Paulo (interior)
-        '13': {'economy': 3, 'express': 1},   # São Paulo (interior)
-        '14': {'economy': 3, 'express': 1},   # São Paulo (interior)
-        '15': {'economy': 3, 'express': 1},   # São Paulo (interior)
-        '16': {'economy': 3, 'express': 1},   # São Paulo (interior)
-        '17': {'economy': 3, 'express': 1},   # São Paulo (interior)
-        '18': {'economy': 3, 'express': 1},   # São Paulo (interior)
-        '19': {'economy': 3, 'express': 1},   # São Paulo (interior)
-        
-        # Sul
-        '80': {'economy': 6, 'express': 3},   # Paraná
-        '81': {'economy': 6, 'express': 3},   # Paraná
-        '82': {'economy': 6, 'express': 3},   # Paraná
-        '83': {'economy': 6, 'express': 3},   # Paraná
-        '84': {'economy': 6, 'express': 3},   # Paraná
-        '85': {'economy': 6, 'express': 3},   # Paraná
-        '86': {'economy': 6, 'express': 3},   # Paraná
-        '87': {'economy': 6, 'express': 3},   # Paraná
-        '88': {'economy': 6, 'express': 3},   # Paraná
-        '89': {'economy': 6, 'express': 3},   # Paraná
-        '90': {'economy': 7, 'express': 4},   # Rio Grande do Sul
-        '91': {'economy': 7, 'express': 4},   # Rio Grande do Sul
-        '92': {'economy': 7, 'express': 4},   # Rio Grande do Sul
-        '93': {'economy': 7, 'express': 4},   # Rio Grande do Sul
-        '94': {'economy': 7, 'express': 4},   # Rio Grande do Sul
-        '95': {'economy': 7, 'express': 4},   # Rio Grande do Sul
-        '96': {'economy': 7, 'express': 4},   # Rio Grande do Sul
-        '97': {'economy': 7, 'express': 4},   # Rio Grande do Sul
-        '98': {'economy': 7, 'express': 4},   # Rio Grande do Sul
-        '99': {'economy': 7, 'express': 4},   # Rio Grande do Sul
-        '88': {'economy': 5, 'express': 3},   # Santa Catarina
-        '89': {'economy': 5, 'express': 3},   # Santa Catarina
-        
-        # Nordeste
-        '40': {'economy': 8, 'express': 4},   # Bahia
-        '41': {'economy': 8, 'express': 4},   # Bahia
-        '42': {'economy': 8, 'express': 4},   # Bahia
-        '43': {'economy': 8, 'express': 4},   # Bahia
-        '44': {'economy': 8, 'express': 4},   # Bahia
-        '45': {'economy': 8, 'express': 4},   # Bahia
-        '46': {'economy': 8, 'express': 4},   # Bahia
-        '47': {'economy': 8, 'express': 4},   # Bahia
-        '48': {'economy': 8, 'express': 4},   # Bahia
-        '49': {'economy': 8, 'express': 4},   # Bahia
-        '50': {'economy': 9, 'express': 5},   # Pernambuco
-        '51': {'economy': 9, 'express': 5},   # Pernambuco
-        '52': {'economy': 9, 'express': 5},   # Pernambuco
-        '53': {'economy': 9, 'express': 5},   # Pernambuco
-        '54': {'economy': 9, 'express': 5},   # Pernambuco
-        '55': {'economy': 9, 'express': 5},   # Pernambuco
-        '56': {'economy': 9, 'express': 5},   # Pernambuco
-        '57': {'economy': 9, 'express': 5},   # Pernambuco
-        '58': {'economy': 9, 'express': 5},   # Pernambuco
-        '59': {'economy': 9, 'express': 5},   # Pernambuco
-        '60': {'economy': 8, 'express': 4},   # Ceará
-        '61': {'economy': 8, 'express': 4},   # Ceará
-        '62': {'economy': 8, 'express': 4},   # Ceará
-        '63': {'economy': 8, 'express': 4},   # Ceará
-        '64': {'economy': 8, 'express': 4},   # Ceará
-        '65': {'economy': 8, 'express': 4},   # Ceará
-        '66': {'economy': 8, 'express': 4},   # Ceará
-        '67': {'economy': 8, 'express': 4},   # Ceará
-        '68': {'economy': 8, 'express': 4},   # Ceará
-        '69': {'economy': 8, 'express': 4},   # Ceará
-        
-        # Norte
-        '65': {'economy': 12, 'express': 7},  # Mato Grosso
-        '66': {'economy': 12, 'express': 7},  # Mato Grosso
-        '67': {'economy': 12, 'express': 7},  # Mato Grosso
-        '68': {'economy': 12, 'express': 7},  # Mato Grosso
-        '69': {'economy': 12, 'express': 7},  # Mato Grosso
-        '78': {'economy': 10, 'express': 6},  # Mato Grosso do Sul
-        '79': {'economy': 10, 'express': 6},  # Mato Grosso do Sul
-        '70': {'economy': 11, 'express': 6},  # Distrito Federal
-        '71': {'economy': 11, 'express': 6},  # Distrito Federal
-        '72': {'economy': 11, 'express': 6},  # Distrito Federal
-        '73': {'economy': 11, 'express': 6},  # Distrito Federal
-        '74': {'economy': 11, 'express': 6},  # Distrito Federal
-        '75': {'economy': 11, 'express': 6},  # Distrito Federal
-        '76': {'economy': 11, 'express': 6},  # Distrito Federal
-        '77': {'economy': 11, 'express': 6},  # Distrito Federal
-        '68': {'economy': 15, 'express': 8},  # Acre
-        '69': {'economy': 15, 'express': 8},  # Acre
-        '69': {'economy': 14, 'express': 8},  # Rondônia
-        '76': {'economy': 13, 'express': 7},  # Roraima
-        '77': {'economy': 13, 'express': 7},  # Roraima
-        '69': {'economy': 16, 'express': 9},  # Amazonas
-        '69': {'economy': 15, 'express': 8},  # Pará
-        '69': {'economy': 14, 'express': 8},  # Amapá
-        '69': {'economy': 15, 'express': 8},  # Tocantins
-    }
-    
-    # Retornar prazo padrão se região não encontrada
-    return region_prazos.get(region, {'economy': 10, 'express': 5})
+    return _calculate_own_shipping_for_ceps([cep], weight, dimensions)[cep]
 
 # ===================== IMPORTAÇÃO DE PRODUTOS COM FRETE =====================
 @app.route('/api/aliexpress/import-product', methods=['POST'])
@@ -6865,26 +6729,8 @@ def import_product_with_shipping():
         if not tokens or not tokens.get('access_token'):
             return jsonify({'success': False, 'message': 'Token não encontrado. Faça autorização primeiro.'}), 401
         
-        # Parâmetros para buscar produto
-        params = {
-            "method": "aliexpress.ds.product.get",
-            "app_key": APP_KEY,
-            "timestamp": int(time.time() * 1000),
-            "sign_method": "md5",
-            "format": "json",
-            "v": "2.0",
-            "access_token": tokens['access_token'],
-            "product_id": product_id,
-            "ship_to_country": "BR",
-            "target_currency": "BRL",
-            "target_language": "pt",
-            "remove_personal_benefit": "false"
-        }
-        
-        params["sign"] = generate_api_signature(params, APP_SECRET)
-        
-        # Buscar produto
-        response = requests.get('https://api-sg.aliexpress.com/sync', params=params)
+        # Buscar produto (via cache de detalhes)
+        response = get_product_detail(product_id, tokens['access_token'])
         
         if response.status_code != 200:
             return jsonify({'success': False, 'message': 'Erro ao buscar produto do AliExpress'}), 400
@@ -6911,11 +6757,17 @@ def import_product_with_shipping():
         
         # 3. Calcular frete para CEPs principais
         print(f"🚚 Calculando frete para produto {product_id}...")
-        shipping_data = calculate_shipping_for_main_ceps(product_id, product_weight, product_dimensions)
+        shipping_data, shipping_report = calculate_shipping_for_main_ceps(product_id, product_weight, product_dimensions)
         
         # 4. Adicionar dados de frete ao produto
         processed_product['shipping_data'] = shipping_data
         
+        # Matriz de frete (UF × serviço) persistida para o /shipping/quote
+        # Cotações dos CEPs principais usam o SKU padrão de frete
+        shipping_matrix = build_matrix(product_id, shipping_data, shipping_report, product_weight, product_dimensions,
+                                       sku_id=DEFAULT_FREIGHT_SKU_ID)
+        shipping_matrix_store.save(product_id, shipping_matrix)
+        
         # 5. Processar variações/SKUs se disponíveis
         if 'ae_item_sku_info_dtos' in result:
             sku_info = result['ae_item_sku_info_dtos']
@@ -6941,6 +6793,8 @@ def import_product_with_shipping():
             'data': {
                 'product': processed_product,
                 'shipping_ceps': list(shipping_data.keys()),
+                'shipping_report': shipping_report,
+                'shipping_matrix_regions': sorted(shipping_matrix['regions']),
                 'firebase_id': firebase_product_id
             }
         })
@@ -7020,7 +6874,7 @@ def check_product_status(product_id):
 # ===================== FEEDS: NOMES DOS FEEDS (ETAPA 1) =====================
 @app.route('/api/aliexpress/feeds/names', methods=['GET'])
 def get_feed_names():
-    """ETAPA 1: Buscar nomes dos feeds disponíveis usando aliexpress.ds.feedname.get"""
+    """ETAPA 1: Nomes dos feeds disponíveis (catálogo em cache do aliexpress.ds.feedname.get)"""
     tokens = load_tokens()
     if not tokens or not tokens.get('access_token'):
         return jsonify({'success': False, 'message': 'Token não encontrado. Faça autorização primeiro.'}), 401
@@ -7028,93 +6882,37 @@ def get_feed_names():
     try:
         print(f'🔍 ETAPA 1: Buscando nomes dos feeds disponíveis...')
         
-        # Parâmetros para a API conforme documentação
-        params = {
-            "method": "aliexpress.ds.feedname.get",
-            "app_key": APP_KEY,
-            "timestamp": int(time.time() * 1000),
-            "sign_method": "md5",
-            "format": "json",
-            "v": "2.0",
-            "access_token": tokens['access_token']
-        }
+        force = request.args.get('refresh', 'false').lower() == 'true'
+        catalog, catalog_meta = feed_catalog.get(force=force)
+        if not catalog:
+            return jsonify({
+                'success': False,
+                'message': 'Catálogo de feeds indisponível',
+                'error': catalog_meta['error']
+            }), 503
         
-        # Gerar assinatura
-        params["sign"] = generate_api_signature(params, APP_SECRET)
+        feeds = [
+            {
+                'feed_name': feed['feed_name'],
+                'feed_id': str(i + 1),
+                'display_name': feed['feed_name'],
+                'description': feed['description'],
+                'product_count': feed['product_count']
+            }
+            for i, feed in enumerate(catalog)
+        ]
         
-        # Fazer requisição
-        response = requests.get('https://api-sg.aliexpress.com/sync', params=params)
+        print(f'📦 Feeds encontrados: {len(feeds)}')
         
-        if response.status_code == 200:
-            data = response.json()
-            
-            feeds = []
-            
-            # Verificar estrutura esperada conforme documentação
-            if 'aliexpress_ds_feedname_get_response' in data:
-                feed_response = data['aliexpress_ds_feedname_get_response']
-                resp_result = feed_response.get('resp_result', {})
-                result = resp_result.get('result', {})
-                
-                # Extrair feeds (promos) conforme documentação
-                if 'promos' in result:
-                    promos_data = result['promos']
-                    
-                    if isinstance(promos_data, list):
-                        feeds = [
-                            {
-                                'feed_name': promo.get('promo_name', ''),
-                                'feed_id': str(i + 1),
-                                'display_name': promo.get('promo_name', ''),
-                                'description': promo.get('promo_desc', ''),
-                                'product_count': int(promo.get('product_num', 0))
-                            }
-                            for i, promo in enumerate(promos_data)
-                        ]
-                    elif isinstance(promos_data, dict) and 'promo' in promos_data:
-                        promo_list = promos_data['promo']
-                        if isinstance(promo_list, list):
-                            feeds = [
-                                {
-                                    'feed_name': promo.get('promo_name', ''),
-                                    'feed_id': str(i + 1),
-                                    'display_name': promo.get('promo_name', ''),
-                                    'description': promo.get('promo_desc', ''),
-                                    'product_count': int(promo.get('product_num', 0))
-                                }
-                                for i, promo in enumerate(promo_list)
-                            ]
-                        else:
-                            feeds = [{
-                                'feed_name': promo_list.get('promo_name', ''),
-                                'feed_id': '1',
-                                'display_name': promo_list.get('promo_name', ''),
-                                'description': promo_list.get('promo_desc', ''),
-                                'product_count': int(promo_list.get('product_num', 0))
-                            }]
-                    else:
-                        feeds = []
-                else:
-                    feeds = []
-            else:
-                feeds = []
-            
-            print(f'📦 Feeds encontrados: {len(feeds)}')
-            
-            return jsonify({
-                'success': True,
-                'message': 'Nomes dos feeds obtidos com sucesso',
-                'data': {
-                    'feeds': feeds,
-                    'total_feeds': len(feeds)
-                }
-            })
-        else:
-            return jsonify({
-                'success': False,
-                'message': f'Erro {response.status_code}',
-                'error': response.text
-            }), response.status_code
+        return jsonify({
+            'success': True,
+            'message': 'Nomes dos feeds obtidos com sucesso',
+            'data': {
+                'feeds': feeds,
+                'total_feeds': len(feeds)
+            },
+            'catalog': catalog_meta
+        })
             
     except Exception as e:
         print(f'❌ Erro ao buscar nomes dos feeds: {e}')
@@ -7141,40 +6939,24 @@ def get_feed_item_ids(feed_name):
         print(f'🔍 ETAPA 2: Buscando IDs dos produtos do feed "{feed_name}"...')
         
         # Parâmetros para a API conforme documentação
-        params = {
-            "method": "aliexpress.ds.feed.itemids.get",
-            "app_key": APP_KEY,
-            "timestamp": int(time.time() * 1000),
-            "sign_method": "md5",
-            "format": "json",
-            "v": "2.0",
-            "access_token": tokens['access_token'],
+        params = ali_client.build_params("aliexpress.ds.feed.itemids.get", tokens['access_token'], {
             "feed_name": feed_name,
             "page_size": page_size
-        }
-        
-        # Gerar assinatura
-        params["sign"] = generate_api_signature(params, APP_SECRET)
+        })
         
         # Fazer requisição
-        response = requests.get('https://api-sg.aliexpress.com/sync', params=params)
+        response = ali_client.send(params)
 
         print(f'📡 Status da resposta: {response.status_code}')
         print(f'📄 Tamanho da resposta: {len(response.text)} caracteres')
-        print(f'📄 Primeiros 500 caracteres da resposta:')
-        print(response.text[:500])
-        
         # Verificar se há erro na resposta
         if 'error_response' in response.text.lower():
-            print(f'❌ ERRO DETECTADO NA RESPOSTA!')
-            print(f'📄 Resposta completa:')
-            print(response.text)
+            log_feeds.error('feed_item_ids.error_response', feed=feed_name, body=lazy_text(response.text, limit=2000))
         
         if response.status_code == 200:
             data = response.json()
             
-            print(f'📄 Resposta da API para feed "{feed_name}":')
-            print(json.dumps(data, indent=2, ensure_ascii=False))
+            log_feeds.debug('feed_item_ids.payload', feed=feed_name, payload=lazy_json(data))
             
             # Extrair IDs dos produtos conforme documentação
             item_ids = []
@@ -7186,8 +6968,7 @@ def get_feed_item_ids(feed_name):
                 
                 if 'products' in result:
                     products = result['products']
-                    print(f'📊 Tipo de products: {type(products)}')
-                    print(f'📄 Products: {products}')
+                    log_feeds.debug('feed_item_ids.products', feed=feed_name, kind=type(products).__name__)
                     
                     if isinstance(products, list):
                         for product in products:
@@ -7199,9 +6980,7 @@ def get_feed_item_ids(feed_name):
                         if item_id:
                             item_ids.append(item_id)
                 else:
-                    print(f'❌ products não encontrado em result')
-                    print(f'📄 Estrutura completa do result:')
-                    print(json.dumps(result, indent=2, ensure_ascii=False))
+                    log_feeds.warning('feed_item_ids.no_products', feed=feed_name, result=lazy_json(result, limit=2000))
             else:
                 print(f'❌ result não encontrado na resposta')
                 print(f'📄 Keys da resposta: {list(data.keys())}')
@@ -7233,21 +7012,20 @@ def get_all_feeds_item_ids():
     """Percorre os feeds disponíveis e retorna os primeiros IDs de cada feed (para documentação)."""
     ensure_fresh_token()
     try:
-        with app.test_request_context('/api/aliexpress/feeds/list'):
-            list_resp = get_available_feeds()
-        feeds_data = list_resp.get_json() if hasattr(list_resp, 'get_json') else list_resp[0].get_json()
-        feeds = feeds_data.get('feeds', [])
+        catalog, _ = feed_catalog.get()
         max_feeds = int(request.args.get('max_feeds', 4))
         page_size = int(request.args.get('page_size', 20))
+        feed_names = [feed['feed_name'] for feed in catalog[:max_feeds]]
         result = {}
-        for feed in feeds[:max_feeds]:
-            fname = feed.get('feed_name')
-            with app.test_request_context(f'/api/aliexpress/feeds/{fname}/ids?page=1&page_size={page_size}'):
-                ids_resp = get_feed_item_ids(fname)
-            payload = ids_resp.get_json() if hasattr(ids_resp, 'get_json') else ids_resp[0].get_json()
-            result[fname] = payload.get('item_ids', [])
-        print('\n📄 FEEDS → ITEM IDS (sample):')
-        print(json.dumps(result, indent=2, ensure_ascii=False))
+        # Primeira página de cada feed em paralelo
+        deadline = time.monotonic() + PRODUCT_BATCH_DEADLINE
+        for item in fan_out(lambda fname: fetch_feed_ids_page(fname, 1, None, page_size), feed_names, deadline=deadline):
+            if item.error:
+                print(f'⚠️ Falha ao buscar IDs do feed {item.item}: {item.error}')
+                result[item.item] = []
+            else:
+                result[item.item] = item.value.ids
+        log_feeds.debug('feeds_item_ids.sample', feeds=len(result), result=lazy_json(result))
         return jsonify({'success': True, 'feeds_item_ids': result})
     except Exception as e:
         print(f'❌ Erro ao obter IDs de todos os feeds: {e}')
@@ -7269,29 +7047,34 @@ def check_multiple_products_status():
         
         print(f"📦 Verificando status de {len(product_ids)} produtos...")
         
-        results = []
-        success_count = 0
-        error_count = 0
+        status_mapping = {
+            'on_selling': 'À venda',
+            'offline': 'Offline',
+            'auditing': 'Em revisão',
+            'editing_required': 'Edição necessária',
+            'approved': 'Aprovado',
+            'rejected': 'Rejeitado',
+            'unknown': 'Status desconhecido'
+        }
         
-        for product_id in product_ids:
-            try:
-                # Usar o endpoint individual para cada produto
-                params = {
-                    "method": "aliexpress.ds.product.get",
-                    "app_key": APP_KEY,
-                    "timestamp": int(time.time() * 1000),
-                    "sign_method": "md5",
-                    "format": "json",
-                    "v": "2.0",
-                    "access_token": tokens['access_token'],
-                    "product_id": product_id,
-                    "ship_to_country": "BR",
-                    "target_currency": "BRL",
-                    "target_language": "pt"
+        # Buscar todos os produtos em paralelo, com prazo global
+        results_by_id = {}
+        deadline = time.monotonic() + PRODUCT_BATCH_DEADLINE
+        unique_ids = list(dict.fromkeys(str(pid) for pid in product_ids))
+        
+        for item in get_product_details(unique_ids, tokens['access_token'], deadline=deadline):
+            product_id = item.item
+            if item.error:
+                print(f"❌ Erro ao verificar produto {product_id}: {item.error}")
+                results_by_id[product_id] = {
+                    'product_id': product_id,
+                    'status': 'error',
+                    'error': str(item.error) or item.error.__class__.__name__
                 }
-                
-                params["sign"] = generate_api_signature(params, APP_SECRET)
-                response = requests.get('https://api-sg.aliexpress.com/sync', params=params)
+                continue
+            
+            try:
+                response = item.value
                 
                 if response.status_code == 200:
                     data = response.json()
@@ -7301,17 +7084,7 @@ def check_multiple_products_status():
                         result = product_response.get('result', {})
                         base_info = result.get('ae_item_base_info_dto', {})
                         
-                        status_mapping = {
-                            'on_selling': 'À venda',
-                            'offline': 'Offline',
-                            'auditing': 'Em revisão',
-                            'editing_required': 'Edição necessária',
-                            'approved': 'Aprovado',
-                            'rejected': 'Rejeitado',
-                            'unknown': 'Status desconhecido'
-                        }
-                        
-                        product_status = {
+                        results_by_id[product_id] = {
                             'product_id': product_id,
                             'status': 'success',
                             'status_type': base_info.get('product_status_type', 'unknown'),
@@ -7323,32 +7096,31 @@ def check_multiple_products_status():
                             'sales_count': base_info.get('sales_count', '0'),
                             'evaluation_count': base_info.get('evaluation_count', '0'),
                         }
-                        
-                        results.append(product_status)
-                        success_count += 1
                     else:
-                        results.append({
+                        results_by_id[product_id] = {
                             'product_id': product_id,
                             'status': 'error',
                             'error': 'Produto não encontrado'
-                        })
-                        error_count += 1
+                        }
                 else:
-                    results.append({
+                    results_by_id[product_id] = {
                         'product_id': product_id,
                         'status': 'error',
                         'error': f'Erro HTTP {response.status_code}'
-                    })
-                    error_count += 1
+                    }
                     
             except Exception as e:
                 print(f"❌ Erro ao verificar produto {product_id}: {e}")
-                results.append({
+                results_by_id[product_id] = {
                     'product_id': product_id,
                     'status': 'error',
                     'error': str(e)
-                })
-                error_count += 1
+                }
+        
+        # Resultados na mesma ordem da requisição
+        results = [results_by_id[pid] for pid in unique_ids]
+        success_count = sum(1 for r in results if r['status'] == 'success')
+        error_count = len(results) - success_count
         
         print(f"✅ Verificação de status concluída!")
         print(f"📊 Resumo: {success_count} sucessos, {error_count} erros")
@@ -7417,53 +7189,27 @@ def get_complete_feeds():
     if not tokens or not tokens.get('access_token'):
         return jsonify({'success': False, 'message': 'Token não encontrado. Faça autorização primeiro.'}), 401
     
-    # Parâmetros - MÍNIMOS para evitar timeout
+    # Parâmetros - detalhes buscados em paralelo dentro de um prazo global
     page = int(request.args.get('page', 1))
-    page_size = int(request.args.get('page_size', 1))  # Apenas 1 produto por página
+    page_size = int(request.args.get('page_size', 20))
     max_feeds = int(request.args.get('max_feeds', 1))  # Apenas 1 feed
+    details_max = int(request.args.get('details_max', 0))  # 0 = todos os IDs da página
+    deadline = time.monotonic() + PRODUCT_BATCH_DEADLINE
     
     print(f'🚀 ETAPA 1: Buscando todos os nomes de feeds disponíveis')
     
     try:
-        # 1. Buscar feeds disponíveis usando aliexpress.ds.feedname.get
-        feeds_params = {
-            "method": "aliexpress.ds.feedname.get",
-            "app_key": APP_KEY,
-            "timestamp": int(time.time() * 1000),
-            "sign_method": "md5",
-            "format": "json",
-            "v": "2.0",
-            "access_token": tokens['access_token']
-        }
-        
-        feeds_params["sign"] = generate_api_signature(feeds_params, APP_SECRET)
-        feeds_response = requests.get('https://api-sg.aliexpress.com/sync', params=feeds_params, timeout=8)
+        # 1. Feeds disponíveis pelo catálogo em cache (aliexpress.ds.feedname.get)
+        catalog, catalog_meta = feed_catalog.get()
+        print(f'📡 ETAPA 1: Catálogo de feeds: {catalog_meta["source"]} ({len(catalog)} feeds)')
         
-        print(f'📡 ETAPA 1: Status da busca de feeds: {feeds_response.status_code}')
+        if not catalog:
+            return jsonify({'success': False, 'message': 'Erro ao buscar feeds', 'error': catalog_meta['error']}), 500
         
-        if feeds_response.status_code != 200:
-            return jsonify({'success': False, 'message': 'Erro ao buscar feeds'}), 500
-        
-        feeds_data = feeds_response.json()
-        print(f'📊 ETAPA 1: Estrutura da resposta de feeds: {list(feeds_data.keys())}')
-        
-        feeds_list = []
-        if 'aliexpress_ds_feedname_get_response' in feeds_data:
-            feed_response = feeds_data['aliexpress_ds_feedname_get_response']
-            resp_result = feed_response.get('resp_result', {})
-            result = resp_result.get('result', {})
-            
-            # Tentar diferentes estruturas possíveis
-            if 'feed_name_list' in result:
-                feeds_list = result['feed_name_list'][:max_feeds]
-            elif 'promos' in result:
-                promos_data = result['promos']
-                if isinstance(promos_data, dict) and 'promo' in promos_data:
-                    promos_list = promos_data['promo']
-                    if isinstance(promos_list, list):
-                        feeds_list = promos_list[:max_feeds]
-                    elif isinstance(promos_list, dict):
-                        feeds_list = [promos_list]
+        feeds_list = [
+            {'feed_name': feed['feed_name'], 'feed_desc': feed['description'], 'product_num': feed['product_count']}
+            for feed in catalog[:max_feeds]
+        ]
         
         print(f'✅ ETAPA 1: Feeds encontrados: {len(feeds_list)}')
         
@@ -7496,22 +7242,14 @@ def get_complete_feeds():
             
             # ETAPA 2: Buscar IDs dos produtos do feed
             print(f'🔍 ETAPA 2: Buscando IDs dos produtos do feed {feed_name}...')
-            products_params = {
-                "method": "aliexpress.ds.feed.itemids.get",  # PASSO 2: Retorna apenas IDs
-                "app_key": APP_KEY,
-                "timestamp": int(time.time() * 1000),
-                "sign_method": "md5",
-                "format": "json",
-                "v": "2.0",
-                "access_token": tokens['access_token'],
+            products_params = ali_client.build_params("aliexpress.ds.feed.itemids.get", tokens['access_token'], {
                 "feed_name": feed_name,
                 "page_size": str(page_size),
                 "page_no": str(page)
-            }
+            })
             print(f'🔍 ETAPA 2: Página {page} - page_size: {page_size}, page_no: {page}')
             
-            products_params["sign"] = generate_api_signature(products_params, APP_SECRET)
-            products_response = requests.get('https://api-sg.aliexpress.com/sync', params=products_params, timeout=8)
+            products_response = ali_client.send(products_params, timeout=8)
             
             print(f'📡 ETAPA 2: Status da busca de produtos: {products_response.status_code}')
             
@@ -7539,46 +7277,39 @@ def get_complete_feeds():
                                 print(f'📦 ETAPA 2: IDs coletados: {len(item_ids_only)} produtos da página {page}')
                                 print(f'📦 ETAPA 2: IDs coletados (amostra): {item_ids_only[:10]}')
                                 
-                                # ETAPA 3: Buscar dados de cada ID (limitado para evitar timeout)
-                                print(f'🔎 ETAPA 3: Buscando dados de até 1 produto...')
-                                for idx, product_id in enumerate(item_ids_only):
-                                    if idx >= 1:  # Apenas 1 produto por feed para evitar timeout
-                                        print(f'⚠️ ETAPA 3: Limitando a 1 produto por feed para evitar timeout')
-                                        break
-                                    print(f'🔍 ETAPA 3: Buscando dados do produto {product_id}...')
+                                # ETAPA 3: Buscar dados de todos os IDs em paralelo
+                                detail_ids = item_ids_only[:details_max] if details_max else item_ids_only
+                                print(f'🔎 ETAPA 3: Buscando dados de {len(detail_ids)} produtos em paralelo...')
+                                details_by_id = {}
+                                for item in get_product_details(detail_ids, tokens['access_token'], deadline=deadline, timeout=5):
+                                    product_id = item.item
+                                    if item.error:
+                                        print(f'⚠️ ETAPA 3: Falha ao detalhar {product_id}: {item.error}')
+                                        continue
                                     try:
-                                        product_params = {
-                                            "method": "aliexpress.ds.product.get",
-                                            "app_key": APP_KEY,
-                                            "timestamp": int(time.time() * 1000),
-                                            "sign_method": "md5",
-                                            "format": "json",
-                                            "v": "2.0",
-                                            "access_token": tokens['access_token'],
-                                            "product_id": str(product_id),
-                                            "ship_to_country": "BR",
-                                            "target_currency": "BRL",
-                                            "target_language": "pt",
-                                            "remove_personal_benefit": "false"
-                                        }
-                                        product_params["sign"] = generate_api_signature(product_params, APP_SECRET)
-                                        product_response = requests.get('https://api-sg.aliexpress.com/sync', params=product_params, timeout=5)
+                                        product_response = item.value
                                         if product_response.status_code == 200:
                                             product_data = product_response.json()
                                             if 'aliexpress_ds_product_get_response' in product_data:
-                                                product_result = product_data['aliexpress_ds_product_get_response'].get('result', {})
-                                                feed_products.append({
-                                                    'product_id': str(product_id),
-                                                    'title': product_result.get('product_title', ''),
-                                                    'main_image': product_result.get('product_main_image_url', ''),
-                                                    'price': product_result.get('sale_price', '0.00'),
-                                                    'currency': product_result.get('currency', 'BRL')
-                                                })
-                                                # Estrutura: feedName{ idProduct{ DADOS} }
-                                                item_ids_details_map[str(product_id)] = product_result
+                                                details_by_id[product_id] = product_data['aliexpress_ds_product_get_response'].get('result', {})
                                                 print(f'✅ ETAPA 3: Dados do produto {product_id} carregados com sucesso')
                                     except Exception as e:
                                         print(f'⚠️ ETAPA 3: Falha ao detalhar {product_id}: {e}')
+                                
+                                # Manter a ordem do feed
+                                for product_id in detail_ids:
+                                    if product_id not in details_by_id:
+                                        continue
+                                    product_result = details_by_id[product_id]
+                                    feed_products.append({
+                                        'product_id': product_id,
+                                        'title': product_result.get('product_title', ''),
+                                        'main_image': product_result.get('product_main_image_url', ''),
+                                        'price': product_result.get('sale_price', '0.00'),
+                                        'currency': product_result.get('currency', 'BRL')
+                                    })
+                                    # Estrutura: feedName{ idProduct{ DADOS} }
+                                    item_ids_details_map[product_id] = product_result
                             elif isinstance(product_ids, int):
                                 item_ids_only = [str(product_ids)]
                     else:
@@ -7615,76 +7346,152 @@ def get_complete_feeds():
 # ===================== SYNC FEEDS TO FIREBASE =====================
 @app.route('/api/aliexpress/feeds/sync-to-firebase', methods=['POST'])
 def sync_feeds_to_firebase():
-    """Gera JSON completo de feeds e salva produtos no Firebase, organizados por categoria."""
+    """
+    Lê os feeds e salva os produtos no Firebase, organizados por categoria.
+    Por padrão executa na requisição, com limites (max_feeds, uma página de
+    page_size IDs por feed, details_max detalhes e prazo); cada chamada continua
+    do checkpoint da anterior. {"async": true} enfileira um job que percorre
+    todos os feeds e páginas e responde 202 com o ID (precisa do serviço de jobs).
+    """
     if not FIREBASE_AVAILABLE:
         return jsonify({'success': False, 'message': 'Firebase não configurado no servidor.'}), 500
 
     try:
         # 1) Ler parâmetros de controle (defaults seguros)
         req = request.get_json(silent=True) or {}
-        page = int(req.get('page', 1))
-        page_size = int(req.get('page_size', 20))
-        max_feeds = int(req.get('max_feeds', 3))
-        details_max = int(req.get('details_max', 5))
-
-        # 2) Obter JSON completo com detalhes limitados (evita timeout/OOM)
-        complete_path = f"/api/aliexpress/feeds/complete?page={page}&page_size={page_size}&max_feeds={max_feeds}&details=true&details_max={details_max}"
-        with app.test_request_context(complete_path):
-            complete_resp = get_complete_feeds()
-        if isinstance(complete_resp, tuple):
-            complete_data = complete_resp[0].json
-            status = complete_resp[1]
-            if status != 200:
-                return jsonify({'success': False, 'message': 'Falha ao obter feeds completos'}), status
-        else:
-            complete_data = complete_resp.json
+        if req.get('async', False):
+            # Job sem limites de requisição; max_feeds só se informado
+            params = {'page_size': int(req.get('page_size', 50))}
+            if req.get('max_feeds'):
+                params['max_feeds'] = int(req['max_feeds'])
+            job_id, created = job_queue.enqueue('firebase_sync', params)
+            return jsonify({'success': True, 'job_id': job_id, 'created': created,
+                            'status_url': f'/api/aliexpress/jobs/{job_id}'}), 202
+
+        return jsonify(run_firebase_sync({
+            'page_size': int(req.get('page_size', 20)),
+            'max_feeds': int(req.get('max_feeds', 3)),
+            'max_pages': 1,
+            'details_max': int(req.get('details_max', 5)),
+            'details_budget': PRODUCT_BATCH_DEADLINE,
+            'crawl_budget': FEED_CRAWL_REQUEST_BUDGET,
+        }))
+    except Exception as e:
+        print(f'❌ Erro ao sincronizar feeds no Firebase: {e}')
+        return jsonify({'success': False, 'message': str(e)}), 500
 
-        if not complete_data.get('success'):
-            return jsonify({'success': False, 'message': 'Resposta inválida de feeds completos'}), 500
 
-        db = firestore.client()
-        saved = 0
-
-        # 3) Iterar feeds e produtos
-        for feed in complete_data.get('feeds', []):
-            feed_name = feed.get('feed_name')
-            for product in feed.get('products', []):
-                aliexpress_id = str(product.get('product_id'))
-
-                # Documento por aliexpress_id (idempotente)
-                doc_ref = db.collection('products').doc(aliexpress_id)
-
-                # Construir payload básico
-                payload = {
-                    'name': product.get('title', ''),
-                    'price': _parse_price(product.get('price')),
-                    'original_price': _parse_price(product.get('original_price')),
-                    'images': [product.get('main_image')] if product.get('main_image') else [],
-                    'main_image': product.get('main_image'),
-                    'aliexpress_id': aliexpress_id,
-                    'aliexpress_url': product.get('product_url') or f"https://www.aliexpress.com/item/{aliexpress_id}.html",
-                    'aliexpress_rating': float(product.get('rating') or 0.0),
-                    'aliexpress_reviews_count': int(product.get('review_count') or 0),
-                    'aliexpress_sales_count': int(str(product.get('orders') or '0').replace(',', '')),
-                    'feed_name': feed_name,
-                    'category': {
-                        'detected_category': feed.get('display_name', feed_name),
-                        'source': 'aliexpress_feed',
-                        'detection_timestamp': datetime.utcnow()
-                    },
-                    'status': 'active',
-                    'source': 'aliexpress_feed_sync',
-                    'updated_at': datetime.utcnow(),
-                }
+# Checkpoint próprio da sincronização com a coleção products (independente do
+# feed_crawler, que alimenta aliexpress_feed_products)
+firebase_feed_crawler = FeedCrawler(fetch_feed_ids_page, store=CrawlCheckpointStore(
+    path=os.getenv('FIREBASE_SYNC_CRAWL_DB_PATH', os.path.join(persistent_state_dir('feeds'), 'firebase_crawl.sqlite'))
+))
 
-                # Upsert
-                doc_ref.set(payload, merge=True)
-                saved += 1
+def _firebase_product_payload(product, result, detected_category):
+    """Documento da coleção products a partir do produto de feed (e do resultado bruto do ds.product.get)"""
+    aliexpress_id = product['product_id']
+    return {
+        'name': product['title'],
+        'price': product['price'],
+        'original_price': product['original_price'],
+        'images': [product['main_image']] if product['main_image'] else [],
+        'main_image': product['main_image'],
+        'aliexpress_id': aliexpress_id,
+        'aliexpress_url': product['detail_url'] or f"https://www.aliexpress.com/item/{aliexpress_id}.html",
+        'aliexpress_rating': product['rating'],
+        'aliexpress_reviews_count': int((result.get('ae_item_base_info_dto') or {}).get('evaluation_count') or 0),
+        'aliexpress_sales_count': product['orders'],
+        'feed_name': product['feed_name'],
+        'category': {
+            'detected_category': detected_category,
+            'source': 'aliexpress_feed',
+            'detection_timestamp': datetime.utcnow()
+        },
+        'status': 'active',
+        'source': 'aliexpress_feed_sync',
+        'updated_at': datetime.utcnow(),
+    }
 
-        return jsonify({'success': True, 'saved': saved})
-    except Exception as e:
-        print(f'❌ Erro ao sincronizar feeds no Firebase: {e}')
-        return jsonify({'success': False, 'message': str(e)}), 500
+def run_firebase_sync(params, progress=None):
+    """
+    Corpo da sincronização com o Firebase (requisição ou fila de jobs); devolve o relatório.
+    Para cada feed do catálogo lê os IDs a partir do checkpoint
+    (firebase_feed_crawler), busca os detalhes e grava na coleção products.
+    Limites opcionais em params, ausentes = sem limite (fila de jobs):
+    max_feeds, max_pages, details_max, details_budget e crawl_budget (s).
+    IDs não gravados ficam pendentes e voltam na execução seguinte.
+    """
+    progress = progress or (lambda **fields: None)
+    page_size = int(params.get('page_size', 50))
+    max_feeds, max_pages, details_max = params.get('max_feeds'), params.get('max_pages'), params.get('details_max')
+    details_budget = params.get('details_budget')
+
+    tokens = load_tokens()
+    if not tokens or not tokens.get('access_token'):
+        raise Exception('Token não encontrado. Faça autorização primeiro.')
+
+    # 2) Feeds do catálogo em cache (último snapshot bom se a API falhar)
+    catalog, catalog_meta = feed_catalog.get()
+    if not catalog:
+        raise Exception(f'Catálogo de feeds indisponível: {catalog_meta["error"]}')
+    feed_names = [feed['feed_name'] for feed in (catalog[:max_feeds] if max_feeds else catalog)]
+
+    db = firestore.client()
+    writer = BulkWriter(db)
+    deadline = time.monotonic() + details_budget if details_budget is not None else None
+    feeds_report = {}
+
+    # 3) Iterar feeds e produtos
+    for index, feed_name in enumerate(feed_names, 1):
+        crawl = firebase_feed_crawler.crawl(
+            feed_name, page_size, page_budget=max_pages, time_budget=params.get('crawl_budget'),
+            progress=lambda **fields: progress(feed=feed_name, feeds_done=index - 1, feeds_total=len(feed_names), **fields)
+        )
+        if crawl['error']:
+            print(f'⚠️ Leitura do feed {feed_name} interrompida: {crawl["error"]} (checkpoint preservado)')
+        # Além de details_max os IDs continuam pendentes para a próxima execução
+        ids = crawl['ids'][:details_max] if details_max else crawl['ids']
+        written_ids = set()
+        attempted_ids = set()
+        errors = 0
+        for item in get_product_details(ids, tokens['access_token'], deadline=deadline, timeout=10):
+            aliexpress_id = str(item.item)
+            if not isinstance(item.error, FanOutDeadlineExceeded):
+                attempted_ids.add(aliexpress_id)
+            if item.error:
+                errors += 1
+                continue
+            try:
+                response = item.value
+                result = response.json().get('aliexpress_ds_product_get_response', {}).get('result') if response.status_code == 200 else None
+                if not result:
+                    errors += 1
+                    continue
+                product = _feed_product_from_result(feed_name, aliexpress_id, result)
+                # Upsert em lote, documento por aliexpress_id (idempotente)
+                writer.set('products', aliexpress_id, _firebase_product_payload(product, result, feed_name), merge=True,
+                           on_success=lambda _, pid=aliexpress_id: written_ids.add(pid))
+            except Exception as e:
+                print(f'❌ Erro ao processar produto {aliexpress_id}: {e}')
+                errors += 1
+        writer.flush()
+
+        # Só sai da pendência o que foi gravado
+        try:
+            firebase_feed_crawler.mark_done(feed_name, written_ids)
+            firebase_feed_crawler.mark_failed(feed_name, attempted_ids - written_ids)
+        except sqlite3.Error as e:
+            print(f'⚠️ Falha ao atualizar pendências do feed {feed_name}: {e}')
+        feeds_report[feed_name] = {
+            'pages': crawl['pages'], 'complete': crawl['complete'], 'ids': len(crawl['ids']),
+            'written': len(written_ids), 'errors': errors, 'crawl_error': crawl['error'],
+        }
+        progress(feeds_done=index, feeds_total=len(feed_names), written=writer.report['written'])
+
+    report = writer.flush()
+    progress(feeds_done=len(feed_names), feeds_total=len(feed_names), written=report['written'], failed=report['failed'])
+    return {'success': True, 'saved': report['written'], 'failed': report['failed'],
+            'errors': report['errors'], 'batches': report['batches'], 'feeds': feeds_report}
 
 
 def _parse_price(value):
@@ -7701,6 +7508,19 @@ def _parse_price(value):
 
 
 # ===================== CRON: UPDATE PRICE/STOCK =====================
+def _price_stock_from_result(result):
+    """Menor preço entre os SKUs e se há estoque em algum (resultado do ds.product.get)"""
+    skus = (result.get('ae_item_sku_info_dtos') or {}).get('ae_item_sku_info_d_t_o') or []
+    if not isinstance(skus, list):
+        skus = [skus]
+    if not skus:
+        return _parse_price(result.get('sale_price')), True
+    prices = [_parse_price(sku.get('offer_sale_price') or sku.get('sku_price')) for sku in skus]
+    prices = [p for p in prices if p > 0]
+    stock = sum(int(sku.get('sku_available_stock') or 0) for sku in skus)
+    return (min(prices) if prices else 0.0), stock > 0
+
+
 @app.route('/api/aliexpress/cron/update-price-stock', methods=['POST'])
 def cron_update_price_stock():
     """Atualiza preço e estoque dos produtos importados no Firebase.
@@ -7712,41 +7532,54 @@ def cron_update_price_stock():
     try:
         req = request.get_json(silent=True) or {}
         ids = req.get('aliexpress_ids')
+        tokens = load_tokens()
+        if not tokens or not tokens.get('access_token'):
+            return jsonify({'success': False, 'message': 'Token não encontrado. Faça autorização primeiro.'}), 401
         db = firestore.client()
 
-        # Seleção de produtos
+        # Seleção de produtos (uma leitura só para a lista informada)
         if ids:
-            docs = [db.collection('products').doc(str(pid)).get() for pid in ids]
+            docs = db.get_all([doc_ref(db, 'products', pid) for pid in ids])
         else:
-            docs = db.collection('products').orderBy('updated_at', direction=firestore.Query.DESCENDING).limit(100).stream()
+            docs = db.collection('products').order_by('updated_at', direction=firestore.Query.DESCENDING).limit(100).stream()
 
-        updated = 0
+        aliexpress_ids = []
         for doc in docs:
-            data = doc.to_dict() if hasattr(doc, 'to_dict') else (doc._data if hasattr(doc, '_data') else None)
+            data = doc.to_dict() if doc.exists else None
             if not data:
                 continue
-            aliexpress_id = str(data.get('aliexpress_id') or doc.id)
-            product_url = data.get('aliexpress_url') or f"https://www.aliexpress.com/item/{aliexpress_id}.html"
-
-            # Buscar detalhes atuais
+            aliexpress_ids.append(str(data.get('aliexpress_id') or doc.id))
+
+        # Detalhes atuais em paralelo (mesmo caminho/cache do endpoint de produto) e gravação em lote
+        writer = BulkWriter(db)
+        errors = {}
+        deadline = time.monotonic() + PRODUCT_BATCH_DEADLINE
+        for item in get_product_details(aliexpress_ids, tokens['access_token'], deadline=deadline, timeout=10):
+            aliexpress_id = item.item
+            if item.error:
+                errors[aliexpress_id] = str(item.error)
+                continue
             try:
-                details_resp = requests.get(f"{request.host_url.rstrip('/')}/api/aliexpress/product/{aliexpress_id}")
-                if details_resp.status_code == 200:
-                    details = details_resp.json().get('product') or details_resp.json().get('data') or {}
-                    price = _parse_price(details.get('price'))
-                    stock_available = True if details else True
-
-                    db.collection('products').doc(aliexpress_id).set({
-                        'price': price,
-                        'stockAvailable': stock_available,
-                        'updated_at': datetime.utcnow()
-                    }, merge=True)
-                    updated += 1
+                response = item.value
+                if response.status_code != 200:
+                    errors[aliexpress_id] = f'HTTP {response.status_code}'
+                    continue
+                result = response.json().get('aliexpress_ds_product_get_response', {}).get('result') or {}
+                if not result:
+                    errors[aliexpress_id] = 'produto não encontrado'
+                    continue
+                price, stock_available = _price_stock_from_result(result)
+                update = {'stockAvailable': stock_available, 'updated_at': datetime.utcnow()}
+                if price:
+                    update['price'] = price
+                writer.set('products', aliexpress_id, update, merge=True)
             except Exception as e:
                 print(f"⚠️ Falha ao atualizar {aliexpress_id}: {e}")
-                continue
+                errors[aliexpress_id] = str(e)
 
-        return jsonify({'success': True, 'updated': updated})
+        report = writer.flush()
+        errors.update(report['errors'])
+        return jsonify({'success': True, 'updated': report['written'], 'failed': len(errors), 'errors': errors})
     except Exception as e:
         print(f'❌ Erro no cron de atualização: {e}')
         return jsonify({'success': False, 'message': str(e)}), 500
@@ -7756,6 +7589,11 @@ def cron_update_price_stock():
 
 
 if __name__ == '__main__':
+    if '--jobs' in sys.argv:
+        # Processo dedicado à fila de jobs (padrão: os workers web só enfileiram)
+        print(f'🧵 Executando fila de jobs com {job_queue.workers} worker(s)')
+        job_queue.run_forever()
+        sys.exit(0)
     print(f'🚀 Servidor rodando na porta {PORT}')
     print(f'APP_KEY: {"✅" if APP_KEY else "❌"} | APP_SECRET: {"✅" if APP_SECRET else "❌"} | REDIRECT_URI: {REDIRECT_URI}')
     app.run(host='0.0.0.0', port=PORT, debug=False) 
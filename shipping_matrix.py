@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+"""
+Matriz de frete pré-calculada por produto (UF × serviço → preço, prazo)
+Montada na importação a partir do frete dos CEPs principais, persistida no
+Firestore (coleção shipping_matrix) e lida através de um cache em memória.
+Depois de max_age a matriz fica "stale": a cotação volta a ser ao vivo e um
+recálculo é agendado em segundo plano.
+"""
+
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from cache import TTLCache
+from cep_regions import nearest_uf, uf_for_cep
+
+MATRIX_VERSION = 1
+_MISSING = object()
+
+
+def build_matrix(product_id, shipping_data, report, weight, dimensions=None, sku_id=None):
+    """
+    Matriz compacta a partir do resultado de calculate_shipping_for_main_ceps.
+    Só entram CEPs cotados pelo AliExpress; o primeiro CEP de cada UF vence.
+    sku_id é o selectedSkuId usado nas cotações (a matriz só vale para ele).
+    """
+    regions = {}
+    for cep, options in (shipping_data or {}).items():
+        if (report or {}).get(cep, {}).get('source') != 'aliexpress_api':
+            continue
+        uf = uf_for_cep(cep)
+        if not uf or uf in regions or not options:
+            continue
+        regions[uf] = {
+            service: {
+                'price': opt.get('price', 0.0),
+                'days': opt.get('days'),
+                'carrier': opt.get('carrier'),
+                'service_name': opt.get('service_name'),
+                'service_code': opt.get('service_code'),
+            }
+            for service, opt in options.items()
+        }
+    return {
+        'product_id': str(product_id),
+        'sku_id': str(sku_id) if sku_id else None,
+        'version': MATRIX_VERSION,
+        'computed_at': int(time.time() * 1000),
+        'weight': weight,
+        'dimensions': dimensions,
+        'regions': regions,
+    }
+
+
+class ShippingMatrixStore:
+    """Persistência (Firestore) + cache em memória + política de refresh"""
+
+    def __init__(self, collection_factory=None, rebuild_fn=None, max_age=None, cache_size=None, cache_ttl=None):
+        # collection_factory() devolve a coleção do Firestore (None = só memória)
+        self.collection_factory = collection_factory
+        # rebuild_fn(product_id, matrix) recalcula e devolve uma matriz nova
+        self.rebuild_fn = rebuild_fn
+        self.max_age = max_age if max_age is not None else int(os.getenv('SHIPPING_MATRIX_MAX_AGE', str(7 * 24 * 3600)))
+        # Intervalo mínimo entre tentativas de recálculo do mesmo produto
+        self.retry_interval = int(os.getenv('SHIPPING_MATRIX_RETRY_INTERVAL', '900'))
+        self._cache = TTLCache(
+            maxsize=cache_size or int(os.getenv('SHIPPING_MATRIX_CACHE_SIZE', '1024')),
+            ttl=cache_ttl or int(os.getenv('SHIPPING_MATRIX_CACHE_TTL', '600')),
+            name='shipping-matrix'
+        )
+        self._lock = threading.Lock()
+        self._refreshing = set()
+        self._last_attempt = {}
+        self._executor = None
+        self._executor_pid = None
+        self._stats = {'saved': 0, 'store_reads': 0, 'store_errors': 0, 'refreshes': 0, 'refresh_errors': 0}
+
+    def _doc(self, product_id):
+        collection = self.collection_factory() if self.collection_factory else None
+        if collection is None:
+            return None
+        # Fallback para versões antigas do Firebase Admin SDK
+        try:
+            return collection.doc(str(product_id))
+        except AttributeError:
+            return collection.document(str(product_id))
+
+    def save(self, product_id, matrix):
+        if not matrix or not matrix.get('regions'):
+            return False
+        self._cache.set(str(product_id), matrix)
+        with self._lock:
+            self._stats['saved'] += 1
+        try:
+            doc = self._doc(product_id)
+            if doc is not None:
+                doc.set(matrix)
+        except Exception as e:
+            with self._lock:
+                self._stats['store_errors'] += 1
+            print(f'⚠️ Falha ao salvar matriz de frete de {product_id}: {e}')
+        return True
+
+    def get(self, product_id):
+        """Matriz do produto (memória → Firestore) ou None"""
+        key = str(product_id)
+        value, state = self._cache.lookup(key)
+        if state is not None:
+            return None if value is _MISSING else value
+
+        matrix = None
+        try:
+            doc = self._doc(key)
+            if doc is not None:
+                with self._lock:
+                    self._stats['store_reads'] += 1
+                snapshot = doc.get()
+                if snapshot and snapshot.exists:
+                    matrix = snapshot.to_dict()
+        except Exception as e:
+            with self._lock:
+                self._stats['store_errors'] += 1
+            print(f'⚠️ Falha ao ler matriz de frete de {key}: {e}')
+            return None
+
+        # Ausência também fica em cache para não ir ao Firestore a cada cotação
+        self._cache.set(key, matrix if matrix else _MISSING)
+        return matrix
+
+    def is_stale(self, matrix):
+        computed_at = (matrix or {}).get('computed_at') or 0
+        return time.time() * 1000 - computed_at > self.max_age * 1000
+
+    def lookup(self, product_id, destination_cep, sku_id=None):
+        """
+        Serviços da UF mais próxima do CEP com matriz válida.
+        Devolve (uf_da_matriz, serviços) ou (None, None). Com sku_id, só
+        responde se a matriz foi calculada para esse SKU. Matriz stale não
+        responde, mas agenda o recálculo.
+        """
+        matrix = self.get(product_id)
+        if not matrix or not matrix.get('regions'):
+            return None, None
+        if sku_id and str(sku_id) != matrix.get('sku_id'):
+            # SKUs podem ter frete diferente: cotação ao vivo
+            return None, None
+        if self.is_stale(matrix):
+            self.schedule_refresh(product_id, matrix)
+            return None, None
+        uf = uf_for_cep(destination_cep)
+        region = nearest_uf(uf, matrix['regions'].keys()) if uf else None
+        if not region:
+            return None, None
+        return region, matrix['regions'][region]
+
+    def _get_executor(self):
+        # Pool criado sob demanda em cada worker (threads não sobrevivem ao fork)
+        pid = os.getpid()
+        if self._executor is None or self._executor_pid != pid:
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='shipping-matrix')
+            self._executor_pid = pid
+        return self._executor
+
+    def schedule_refresh(self, product_id, matrix):
+        if not self.rebuild_fn:
+            return False
+        key = str(product_id)
+        now = time.monotonic()
+        with self._lock:
+            if key in self._refreshing or now - self._last_attempt.get(key, -self.retry_interval) < self.retry_interval:
+                return False
+            self._refreshing.add(key)
+            self._last_attempt[key] = now
+            executor = self._get_executor()
+
+        def _refresh():
+            try:
+                new_matrix = self.rebuild_fn(key, matrix)
+                if self.save(key, new_matrix):
+                    with self._lock:
+                        self._stats['refreshes'] += 1
+            except Exception as e:
+                with self._lock:
+                    self._stats['refresh_errors'] += 1
+                print(f'⚠️ Falha ao recalcular matriz de frete de {key}: {e}')
+            finally:
+                with self._lock:
+                    self._refreshing.discard(key)
+
+        executor.submit(_refresh)
+        return True
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['refreshing'] = len(self._refreshing)
+        stats['max_age'] = self.max_age
+        stats['cache'] = self._cache.stats()
+        return stats
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Single-flight: coalescência de chamadas idênticas em andamento
+Enquanto uma chamada com a mesma chave estiver em voo neste processo, as
+demais esperam por ela e recebem o mesmo resultado (ou a mesma exceção).
+"""
+
+import threading
+
+# Parâmetros que mudam a cada chamada e não identificam a consulta
+VOLATILE_PARAMS = ('timestamp', 'sign')
+
+
+def canonical_key(params, ignore=VOLATILE_PARAMS):
+    """Chave estável para (método, parâmetros) sem timestamp/assinatura"""
+    return tuple(sorted((str(k), str(v)) for k, v in params.items() if k not in ignore))
+
+
+class _Call:
+    __slots__ = ('event', 'value', 'error', 'followers')
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.value = None
+        self.error = None
+        self.followers = 0
+
+
+class SingleFlight:
+    """Executa fn uma única vez por chave entre threads concorrentes"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._stats = {'leaders': 0, 'followers': 0}
+
+    def do(self, key, fn):
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                call.followers += 1
+                self._stats['followers'] += 1
+                leader = False
+            else:
+                call = _Call()
+                self._calls[key] = call
+                self._stats['leaders'] += 1
+                leader = True
+
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.value
+
+        try:
+            call.value = fn()
+            return call.value
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.event.set()
+
+    def stats(self):
+        with self._lock:
+            leaders = self._stats['leaders']
+            followers = self._stats['followers']
+            in_flight = len(self._calls)
+        total = leaders + followers
+        return {
+            'leaders': leaders,
+            'followers': followers,
+            'in_flight': in_flight,
+            'hit_rate': round(followers / total, 3) if total else 0.0,
+        }
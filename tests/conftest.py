@@ -0,0 +1,33 @@
+"""
+Testes unitários dos módulos puros (sem rede, Firebase ou AliExpress)
+Os test_*.py da raiz são scripts manuais contra a API real; estes rodam com
+python -m pytest -q tests
+"""
+
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Estado em disco (filas, checkpoints, índices) fora do diretório do projeto
+os.environ.setdefault('STATE_DIR', tempfile.mkdtemp(prefix='mds-tests-'))
+
+
+class FakeClock:
+    """Relógio controlado: substitui o módulo time nos módulos testados"""
+
+    def __init__(self, start=1000.0):
+        self.now = start
+
+    def monotonic(self):
+        return self.now
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+    def advance(self, seconds):
+        self.now += seconds
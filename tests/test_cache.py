@@ -0,0 +1,98 @@
+import threading
+
+import pytest
+
+import cache
+from cache import FRESH, STALE, TTLCache
+from conftest import FakeClock
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(cache, 'time', clock)
+    return clock
+
+
+def test_entry_expires_after_ttl(clock):
+    c = TTLCache(maxsize=10, ttl=5)
+    c.set('a', 1)
+    clock.advance(4.9)
+    assert c.lookup('a') == (1, FRESH)
+    clock.advance(0.2)
+    assert c.lookup('a') == (None, None)
+    assert c.stats()['size'] == 0
+
+
+def test_per_entry_ttl_overrides_default(clock):
+    c = TTLCache(maxsize=10, ttl=5)
+    c.set('a', 1, ttl=1)
+    clock.advance(1.5)
+    assert c.get('a', 'missing') == 'missing'
+
+
+def test_stale_entry_served_inside_window_then_dropped(clock):
+    c = TTLCache(maxsize=10, ttl=5, stale_ttl=10)
+    c.set('a', 1)
+    clock.advance(6)
+    assert c.lookup('a') == (1, STALE)
+    clock.advance(10)
+    assert c.lookup('a') == (None, None)
+
+
+def test_stale_hit_returns_old_value_and_refreshes_in_background(clock):
+    c = TTLCache(maxsize=10, ttl=5, stale_ttl=60)
+    c.set('a', 'old')
+    clock.advance(6)
+
+    release = threading.Event()
+    calls = []
+
+    def loader():
+        calls.append(1)
+        release.wait(5)
+        return 'new'
+
+    assert c.get_or_load('a', loader) == ('old', True)
+    # Recarga já em andamento: não agenda outra
+    assert c.get_or_load('a', loader) == ('old', True)
+    release.set()
+    c._executor.shutdown(wait=True)
+    assert calls == [1]
+    assert c.lookup('a') == ('new', FRESH)
+    assert c.stats()['refreshes'] == 1
+
+
+def test_failed_refresh_keeps_stale_value(clock):
+    c = TTLCache(maxsize=10, ttl=5, stale_ttl=60)
+    c.set('a', 'old')
+    clock.advance(6)
+
+    def loader():
+        raise RuntimeError('api fora')
+
+    assert c.get_or_load('a', loader) == ('old', True)
+    c._executor.shutdown(wait=True)
+    assert c.lookup('a') == ('old', STALE)
+    assert c.stats()['refresh_errors'] == 1
+
+
+def test_miss_loads_and_respects_cacheable(clock):
+    c = TTLCache(maxsize=10, ttl=5)
+    assert c.get_or_load('a', lambda: None, cacheable=lambda v: v is not None) == (None, False)
+    assert c.lookup('a') == (None, None)
+    assert c.get_or_load('a', lambda: 2) == (2, False)
+    assert c.get_or_load('a', lambda: 3) == (2, True)
+
+
+def test_lru_evicts_least_recently_used(clock):
+    c = TTLCache(maxsize=2, ttl=60)
+    c.set('a', 1)
+    c.set('b', 2)
+    # Leitura de 'a' o torna o mais recente; 'b' sai primeiro
+    assert c.get('a') == 1
+    c.set('c', 3)
+    assert c.get('b') is None
+    assert c.get('a') == 1
+    assert c.get('c') == 3
+    assert c.stats()['evictions'] == 1
@@ -0,0 +1,45 @@
+import pytest
+
+from cep_regions import delivery_days_for_cep, nearest_uf, normalize_cep, region_for_cep, uf_for_cep
+
+
+@pytest.mark.parametrize('cep, uf', [
+    # DF e GO intercalados: 70000-72799 DF, 72800-72999 GO, 73000-73699 DF, 73700-76799 GO
+    ('70000-000', 'DF'),
+    ('72799-999', 'DF'),
+    ('72800-000', 'GO'),
+    ('72999-999', 'GO'),
+    ('73000-000', 'DF'),
+    ('73699-999', 'DF'),
+    ('73700-000', 'GO'),
+    ('76799-999', 'GO'),
+    ('76800-000', 'RO'),
+    # 78900-78999 é RO, cercado por MT
+    ('78899-999', 'MT'),
+    ('78900-000', 'RO'),
+    ('78999-999', 'RO'),
+    ('79000-000', 'MS'),
+    ('01001-000', 'SP'),
+    ('99999-999', 'RS'),
+])
+def test_uf_at_range_edges(cep, uf):
+    assert uf_for_cep(cep) == uf
+
+
+def test_invalid_cep():
+    assert normalize_cep('60.000-1') is None
+    assert normalize_cep('60000-100') == '60000100'
+    assert region_for_cep(None) is None
+    assert uf_for_cep('abc') is None
+
+
+def test_delivery_days_default_outside_ranges():
+    assert delivery_days_for_cep('') == {'economy': 10, 'express': 5}
+    region = region_for_cep('78950-000')
+    assert delivery_days_for_cep('78950-000') == {'economy': region.economy_days, 'express': region.express_days}
+
+
+def test_nearest_uf():
+    assert nearest_uf('CE', ['SP', 'CE']) == 'CE'
+    assert nearest_uf('DF', ['GO', 'RS']) == 'GO'
+    assert nearest_uf('XX', ['SP']) is None
@@ -0,0 +1,107 @@
+import pytest
+
+from feed_crawler import CrawlCheckpointStore, FeedCrawler, FeedPage
+
+# Feed de 10 IDs em páginas de 3 (a última, curta, fecha o ciclo)
+FEED = [str(1000 + i) for i in range(10)]
+PAGE_SIZE = 3
+
+
+class FakeFeed:
+    def __init__(self, ids=FEED, fail_pages=(), cursor=False):
+        self.ids = list(ids)
+        self.fail_pages = set(fail_pages)
+        self.cursor = cursor
+        self.calls = []
+
+    def __call__(self, feed_name, page_no, search_id, page_size):
+        if search_id:
+            page_no = int(search_id)
+        self.calls.append(page_no)
+        if page_no in self.fail_pages:
+            self.fail_pages.discard(page_no)
+            raise RuntimeError(f'timeout na página {page_no}')
+        ids = self.ids[(page_no - 1) * page_size:page_no * page_size]
+        next_cursor = str(page_no + 1) if self.cursor and ids else None
+        return FeedPage(ids, next_cursor, None)
+
+
+@pytest.fixture
+def store(tmp_path):
+    return CrawlCheckpointStore(path=str(tmp_path / 'crawl.sqlite'), max_attempts=2)
+
+
+def _crawler(fetch, store):
+    # Um crawler novo por execução: o estado vem só do checkpoint em disco
+    return FeedCrawler(fetch, store=store, concurrency=1)
+
+
+def test_resumes_from_checkpoint_across_runs(store):
+    feed = FakeFeed()
+    first = _crawler(feed, store).crawl('f', PAGE_SIZE, page_budget=2)
+    assert (first['ids'], first['complete'], first['cycle']) == (FEED[:6], False, 1)
+    _crawler(feed, store).mark_done('f', first['ids'])
+
+    second = _crawler(feed, store).crawl('f', PAGE_SIZE, page_budget=5)
+    assert second['ids'] == FEED[6:]
+    assert (second['pages'], second['complete'], second['cycle_pages']) == (2, True, 4)
+    assert second['cycle_ids'] == set(FEED)
+    assert feed.calls == [1, 2, 3, 4]
+
+
+def test_unbounded_budget_reads_to_the_end(store):
+    result = _crawler(FakeFeed(), store).crawl('f', PAGE_SIZE, page_budget=None)
+    assert (result['ids'], result['pages'], result['complete']) == (FEED, 4, True)
+
+
+def test_completed_cycle_starts_next_one(store):
+    feed = FakeFeed()
+    crawler = _crawler(feed, store)
+    crawler.mark_done('f', crawler.crawl('f', PAGE_SIZE, page_budget=None)['ids'])
+    again = crawler.crawl('f', PAGE_SIZE, page_budget=1)
+    assert (again['cycle'], again['ids']) == (2, FEED[:3])
+
+
+def test_failed_page_keeps_checkpoint(store):
+    feed = FakeFeed(fail_pages={3})
+    first = _crawler(feed, store).crawl('f', PAGE_SIZE, page_budget=None)
+    assert first['error'] == 'timeout na página 3'
+    assert (first['pages'], first['complete']) == (2, False)
+    _crawler(feed, store).mark_done('f', first['ids'])
+
+    second = _crawler(feed, store).crawl('f', PAGE_SIZE, page_budget=None)
+    assert (second['error'], second['complete'], second['ids']) == (None, True, FEED[6:])
+    assert feed.calls == [1, 2, 3, 3, 4]
+
+
+def test_expired_cursor_restarts_chain_without_repeating_ids(store):
+    feed = FakeFeed(fail_pages={3}, cursor=True)
+    first = _crawler(feed, store).crawl('f', PAGE_SIZE, page_budget=None)
+    assert first['error'] and first['ids'] == FEED[:6]
+    _crawler(feed, store).mark_done('f', first['ids'])
+
+    second = _crawler(feed, store).crawl('f', PAGE_SIZE, page_budget=None)
+    # Refaz a cadeia desde a página 1, mas só os IDs ainda não vistos contam
+    assert feed.calls[3:5] == [1, 2]
+    assert second['ids'] == FEED[6:]
+    assert second['complete']
+
+
+def test_unconfirmed_ids_come_back_until_max_attempts(store):
+    feed = FakeFeed()
+    crawler = _crawler(feed, store)
+    first = crawler.crawl('f', PAGE_SIZE, page_budget=1)
+    assert first['ids'] == FEED[:3]
+    crawler.mark_done('f', FEED[:1])
+    crawler.mark_failed('f', FEED[1:2])
+    # FEED[2] nem foi tentado (ex.: prazo): volta sem gastar tentativa
+
+    second = crawler.crawl('f', PAGE_SIZE, page_budget=1)
+    assert (second['retried'], second['ids']) == (2, FEED[1:3] + FEED[3:6])
+    crawler.mark_done('f', FEED[2:6])
+    crawler.mark_failed('f', FEED[1:2])
+
+    # Segunda falha esgota as tentativas (max_attempts=2)
+    third = crawler.crawl('f', PAGE_SIZE, page_budget=1)
+    assert (third['retried'], third['ids']) == (0, FEED[6:9])
+    assert crawler.status('f')['pending'] == 3
@@ -0,0 +1,30 @@
+from datetime import datetime
+from types import SimpleNamespace
+
+import pytest
+
+# server.py importa Flask, Firebase (opcional) e cria os singletons do app
+server = pytest.importorskip('server')
+
+
+def _snapshot(doc_id, **fields):
+    return SimpleNamespace(id=doc_id, to_dict=lambda: fields)
+
+
+@pytest.mark.parametrize('sort, fields, value', [
+    ('updated_at_desc', {'updated_at': datetime(2024, 5, 1, 12, 30, 15, 250000)}, datetime(2024, 5, 1, 12, 30, 15, 250000)),
+    ('price_asc', {'price': 19.9}, 19.9),
+    ('orders_desc', {'orders': 1200}, 1200),
+    ('price_asc', {}, None),
+])
+def test_cursor_round_trip(sort, fields, value):
+    token = server._encode_feed_cursor(sort, _snapshot('Feed&Ofertas_1005001', **fields))
+    # Opaco e seguro em query string (base64 url-safe sem padding)
+    assert '=' not in token and '/' not in token and '+' not in token
+    assert server._decode_feed_cursor(token) == (sort, value, 'Feed&Ofertas_1005001')
+
+
+@pytest.mark.parametrize('token', ['', 'nao-e-cursor', 'e30', '!!!'])
+def test_invalid_cursor_raises_value_error(token):
+    with pytest.raises(ValueError):
+        server._decode_feed_cursor(token)
@@ -0,0 +1,50 @@
+import numpy as np
+import pytest
+
+from feed_id_index import FeedIdIndex, contains, difference, intersection, to_id_array, union
+
+
+@pytest.fixture
+def index(tmp_path):
+    return FeedIdIndex(directory=str(tmp_path))
+
+
+def test_to_id_array_sorts_dedupes_and_skips_non_numeric():
+    array = to_id_array(['30', 10, '20', '10', 'abc', None])
+    assert array.dtype == np.uint64
+    assert array.tolist() == [10, 20, 30]
+
+
+def test_set_operations_on_memmapped_snapshots(index):
+    index.save('a', ['1', '2', '3', '5'])
+    index.save('b', ['3', '4', '5', '1005000000000000001'])
+    a, b = index.load('a'), index.load('b')
+    assert isinstance(a, np.memmap)
+
+    assert union(a, b).tolist() == [1, 2, 3, 4, 5, 1005000000000000001]
+    assert intersection(a, b).tolist() == [3, 5]
+    assert difference(a, b).tolist() == [1, 2]
+    assert difference(b, a).tolist() == [4, 1005000000000000001]
+
+
+def test_set_operations_with_empty_arrays(index):
+    empty = index.load('missing')
+    a = to_id_array([1, 2])
+    assert len(empty) == 0
+    assert union().tolist() == []
+    assert union(empty, a).tolist() == [1, 2]
+    assert intersection(a, empty).tolist() == []
+    assert difference(a, empty).tolist() == [1, 2]
+    assert contains(empty, [1]).tolist() == [False]
+
+
+def test_save_rotates_snapshot_and_reports_diff(index):
+    first = index.save('Feed & Ofertas', ['1', '2', '3'])
+    assert (first['size'], first['added'].tolist(), first['removed'].tolist()) == (3, [1, 2, 3], [])
+    second = index.save('Feed & Ofertas', ['2', '3', '4'])
+    assert (second['added'].tolist(), second['removed'].tolist()) == ([4], [1])
+
+    diff = index.diff('Feed & Ofertas')
+    assert (diff['added'].tolist(), diff['removed'].tolist()) == ([4], [1])
+    assert index.new_ids('Feed & Ofertas', ['9', '2', 'x', '4']) == ['9', 'x']
+    assert index.feeds() == {'Feed & Ofertas': 3}
@@ -0,0 +1,86 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import hedging
+from hedging import DeadlineExceeded, HedgeStage, check_deadline, remaining, run_hedged
+
+
+def _stage(name, value=None, delay=0.0, error=None, hedge_at=0.5, calls=None):
+    def fn(deadline):
+        if calls is not None:
+            calls.append(name)
+        time.sleep(delay)
+        if error:
+            raise error
+        return value
+    return HedgeStage(name, fn, hedge_at)
+
+
+def test_first_stage_wins_without_hedging():
+    calls = []
+    result = run_hedged([_stage('api', 1, calls=calls), _stage('cache', 2, calls=calls)], budget=1.0)
+    assert (result.stage, result.value) == ('api', 1)
+    assert calls == ['api']
+
+
+def test_slow_stage_hedged_by_next_after_hedge_point():
+    calls = []
+    result = run_hedged([_stage('api', 1, delay=0.5, hedge_at=0.1, calls=calls),
+                         _stage('cache', 2, calls=calls)], budget=1.0)
+    assert (result.stage, result.value) == ('cache', 2)
+    assert calls == ['api', 'cache']
+    assert result.elapsed < 0.5
+
+
+def test_failed_stage_starts_next_immediately():
+    result = run_hedged([_stage('api', error=RuntimeError('500'), hedge_at=0.9),
+                         _stage('cache', 2)], budget=1.0)
+    assert result.stage == 'cache'
+    assert result.elapsed < 0.5
+    assert result.errors == {'api': '500'}
+
+
+def test_invalid_response_counts_as_failure():
+    result = run_hedged([_stage('api', {}), _stage('cache', {'ok': 1})], budget=1.0, is_valid=bool)
+    assert result.stage == 'cache'
+    assert result.errors == {'api': 'resposta inválida'}
+
+
+def test_stages_not_launched_after_deadline():
+    calls = []
+    # O ponto de hedge do 1º estágio fica além do orçamento: o 2º nunca dispara
+    result = run_hedged([_stage('api', 1, delay=0.3, hedge_at=2.0, calls=calls),
+                         _stage('cache', 2, calls=calls)], budget=0.1)
+    assert result.stage is None
+    assert result.errors == {'api': 'orçamento esgotado'}
+    assert calls == ['api']
+
+
+def test_stage_queued_past_deadline_is_skipped(monkeypatch):
+    # Pool de um worker ocupado pelo 1º estágio: o 2º só sairia da fila depois do prazo
+    executor = ThreadPoolExecutor(max_workers=1)
+    monkeypatch.setattr(hedging, '_get_executor', lambda: executor)
+    calls = []
+    result = run_hedged([_stage('api', 1, delay=0.3, hedge_at=0.1, calls=calls),
+                         _stage('cache', 2, calls=calls)], budget=0.15)
+    assert result.stage is None
+    executor.shutdown(wait=True)
+    assert calls == ['api']
+
+
+def test_check_deadline():
+    check_deadline(None)
+    check_deadline(time.monotonic() + 1)
+    with pytest.raises(DeadlineExceeded):
+        check_deadline(time.monotonic() - 0.01)
+
+
+def test_remaining_never_returns_none_after_deadline():
+    assert remaining(None) is None
+    assert remaining(None, default=5) == 5
+    assert remaining(time.monotonic() - 1) == 0.5
+    assert remaining(time.monotonic() - 1, default=2) == 2
+    assert remaining(time.monotonic() + 0.1) == 0.5
+    assert 9 < remaining(time.monotonic() + 10) <= 10
@@ -0,0 +1,82 @@
+import pytest
+
+from job_queue import STATUS_DONE, STATUS_FAILED, STATUS_QUEUED, STATUS_RUNNING, JobQueue, JobStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    return JobStore(path=str(tmp_path / 'jobs.sqlite'))
+
+
+def test_identical_job_is_deduplicated_while_pending(store):
+    job_id, created = store.create('feed_sync', {'feed_name': 'a', 'page_size': 50})
+    same_id, created_again = store.create('feed_sync', {'page_size': 50, 'feed_name': 'a'})
+    other_id, _ = store.create('feed_sync', {'feed_name': 'b'})
+    assert created and not created_again
+    assert same_id == job_id
+    assert other_id != job_id
+
+
+def test_claim_takes_oldest_job_of_registered_kinds(store):
+    first, _ = store.create('feed_sync', {'feed_name': 'a'})
+    store.create('other', {})
+    second, _ = store.create('feed_sync', {'feed_name': 'b'})
+
+    job = store.claim('w1', ['feed_sync'])
+    assert job['job_id'] == first
+    assert (job['status'], job['worker'], job['attempts']) == (STATUS_RUNNING, 'w1', 1)
+    assert store.claim('w2', ['feed_sync'])['job_id'] == second
+    assert store.claim('w3', ['feed_sync']) is None
+    assert store.claim('w3', []) is None
+
+
+def test_stale_running_job_is_retried_then_failed(store):
+    job_id, _ = store.create('feed_sync', {'feed_name': 'a'})
+    store.claim('w1', ['feed_sync'])
+    store.heartbeat(job_id, {'pages': 3})
+
+    # Heartbeat recente: continua com o worker
+    assert store.requeue_stale(stale_after=300, max_attempts=2) == 0
+    # Sem heartbeat (stale_after negativo = todos vencidos): volta à fila
+    assert store.requeue_stale(stale_after=-1, max_attempts=2) == 1
+    job = store.get(job_id)
+    assert (job['status'], job['worker'], job['progress']) == (STATUS_QUEUED, None, {'pages': 3})
+
+    job = store.claim('w2', ['feed_sync'])
+    assert (job['job_id'], job['attempts']) == (job_id, 2)
+    # Esgotou as tentativas: falha em vez de voltar à fila
+    assert store.requeue_stale(stale_after=-1, max_attempts=2) == 0
+    job = store.get(job_id)
+    assert (job['status'], job['error']) == (STATUS_FAILED, 'worker interrompido')
+    # Finalizado libera a deduplicação
+    assert store.create('feed_sync', {'feed_name': 'a'})[1]
+
+
+def test_queue_runs_handler_and_records_result_or_error(store, monkeypatch):
+    monkeypatch.delenv('JOB_WORKER_MODE', raising=False)
+    queue = JobQueue(store=store, workers=1)
+    # Fila sqlite (não compartilhada): executa nos próprios processos
+    assert queue.mode == 'thread'
+
+    def handler(params, progress):
+        progress(pages=1)
+        if params.get('fail'):
+            raise RuntimeError('api fora')
+        return {'saved': params['n']}
+
+    queue.register('feed_sync', handler)
+    ok_id, _ = store.create('feed_sync', {'n': 7})
+    bad_id, _ = store.create('feed_sync', {'fail': True})
+    queue._run(store.claim('w', ['feed_sync']))
+    queue._run(store.claim('w', ['feed_sync']))
+
+    ok, bad = store.get(ok_id), store.get(bad_id)
+    assert (ok['status'], ok['result'], ok['progress']) == (STATUS_DONE, {'saved': 7}, {'pages': 1})
+    assert (bad['status'], bad['error']) == (STATUS_FAILED, 'api fora')
+    assert queue.stats()['jobs'] == {STATUS_DONE: 1, STATUS_FAILED: 1}
+
+
+def test_enqueue_rejects_unknown_kind(store):
+    queue = JobQueue(store=store)
+    with pytest.raises(ValueError):
+        queue.enqueue('nope')
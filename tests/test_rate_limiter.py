@@ -0,0 +1,69 @@
+import pytest
+
+import rate_limiter
+from conftest import FakeClock
+from rate_limiter import TokenBucketLimiter, parse_method_qps
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(rate_limiter, 'time', clock)
+    return clock
+
+
+@pytest.fixture
+def limiter(tmp_path, clock):
+    return TokenBucketLimiter(default_qps=2, method_qps={'fast': 10, 'off': 0}, state_dir=str(tmp_path))
+
+
+def test_burst_then_wait_for_refill(limiter, clock):
+    # Balde cheio: burst = qps tokens sem espera
+    assert limiter.acquire('m') == 0.0
+    assert limiter.acquire('m') == 0.0
+    # Vazio: espera 1/qps pelo próximo token (o sleep avança o relógio)
+    start = clock.now
+    assert limiter.acquire('m') == pytest.approx(0.5)
+    assert clock.now - start == pytest.approx(0.5)
+
+
+def test_tokens_refill_with_elapsed_time(limiter, clock):
+    for _ in range(2):
+        limiter.acquire('m')
+    clock.advance(0.5)
+    assert limiter.acquire('m') == 0.0
+    assert limiter.acquire('m', max_wait=0) is None
+    clock.advance(10)
+    # Reabastece só até o burst, não acumula
+    assert limiter.acquire('m') == 0.0
+    assert limiter.acquire('m') == 0.0
+    assert limiter.acquire('m', max_wait=0.1) is None
+
+
+def test_max_wait_gives_up_without_taking_token(limiter, clock):
+    limiter.acquire('m')
+    limiter.acquire('m')
+    assert limiter.acquire('m', max_wait=0.1) is None
+    clock.advance(0.5)
+    assert limiter.acquire('m') == 0.0
+
+
+def test_buckets_are_per_method_and_shared_through_state_dir(tmp_path, clock):
+    a = TokenBucketLimiter(default_qps=1, method_qps={}, state_dir=str(tmp_path))
+    b = TokenBucketLimiter(default_qps=1, method_qps={}, state_dir=str(tmp_path))
+    assert a.acquire('m1') == 0.0
+    # Outro "processo" com o mesmo diretório vê o balde vazio
+    assert b.acquire('m1', max_wait=0.5) is None
+    assert b.acquire('m2') == 0.0
+
+
+def test_method_rates(limiter):
+    assert limiter.rate_for('fast') == 10
+    assert limiter.rate_for('other') == 2
+    # QPS 0 desliga o limite
+    assert all(limiter.acquire('off') == 0.0 for _ in range(50))
+
+
+def test_parse_method_qps():
+    assert parse_method_qps('a=1.5, b = 3,ruim,c=x') == {'a': 1.5, 'b': 3.0}
+    assert parse_method_qps(None) == {}
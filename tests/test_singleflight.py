@@ -0,0 +1,96 @@
+import threading
+import time
+
+import pytest
+
+from singleflight import SingleFlight, canonical_key
+
+
+def _wait_for_followers(flight, count, timeout=5):
+    end = time.monotonic() + timeout
+    while flight.stats()['followers'] < count:
+        assert time.monotonic() < end, 'seguidores não chegaram'
+        time.sleep(0.005)
+
+
+def _run_concurrently(flight, key, fn, followers):
+    """Líder bloqueado em fn até os seguidores entrarem; devolve (resultados, exceções)"""
+    results, errors = [], []
+
+    def call():
+        try:
+            results.append(flight.do(key, fn))
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=call) for _ in range(followers + 1)]
+    threads[0].start()
+    deadline = time.monotonic() + 5
+    while flight.stats()['in_flight'] == 0:
+        assert time.monotonic() < deadline, 'líder não começou'
+        time.sleep(0.005)
+    for t in threads[1:]:
+        t.start()
+    _wait_for_followers(flight, followers)
+    return threads, results, errors
+
+
+def test_concurrent_calls_share_one_result():
+    flight = SingleFlight()
+    release = threading.Event()
+    calls = []
+
+    def fn():
+        calls.append(1)
+        release.wait(5)
+        return {'value': 42}
+
+    threads, results, errors = _run_concurrently(flight, 'k', fn, followers=4)
+    release.set()
+    for t in threads:
+        t.join(5)
+
+    assert calls == [1]
+    assert errors == []
+    assert len(results) == 5
+    # Mesmo objeto para todos, não cópias
+    assert all(r is results[0] for r in results)
+    assert flight.stats()['in_flight'] == 0
+
+
+def test_concurrent_calls_share_one_exception():
+    flight = SingleFlight()
+    release = threading.Event()
+    calls = []
+
+    def fn():
+        calls.append(1)
+        release.wait(5)
+        raise RuntimeError('falhou')
+
+    threads, results, errors = _run_concurrently(flight, 'k', fn, followers=3)
+    release.set()
+    for t in threads:
+        t.join(5)
+
+    assert calls == [1]
+    assert results == []
+    assert len(errors) == 4
+    assert all(e is errors[0] for e in errors)
+
+
+def test_next_call_after_completion_runs_again():
+    flight = SingleFlight()
+    assert flight.do('k', lambda: 1) == 1
+    assert flight.do('k', lambda: 2) == 2
+    with pytest.raises(ValueError):
+        flight.do('k', lambda: (_ for _ in ()).throw(ValueError('x')))
+    assert flight.do('k', lambda: 3) == 3
+    assert flight.stats()['leaders'] == 4
+
+
+def test_canonical_key_ignores_volatile_params_and_order():
+    a = canonical_key({'method': 'm', 'id': 1, 'timestamp': '1', 'sign': 'aa'})
+    b = canonical_key({'id': '1', 'sign': 'bb', 'method': 'm', 'timestamp': '2'})
+    assert a == b
+    assert canonical_key({'id': 2, 'method': 'm'}) != a
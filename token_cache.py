@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Cache em memória dos tokens do AliExpress
+Evita uma leitura no Firestore a cada requisição: o token fica em memória
+até pouco antes de expire_time (ou até max_age), é invalidado quando os
+tokens são salvos e, opcionalmente, atualizado por um listener on_snapshot.
+"""
+
+import os
+import threading
+import time
+
+
+def token_expire_ms(tokens):
+    """expire_time do AliExpress em ms (aceita expires_at como alternativa)"""
+    expire = (tokens or {}).get('expire_time') or (tokens or {}).get('expires_at')
+    try:
+        return int(expire) if expire else None
+    except (TypeError, ValueError):
+        return None
+
+
+class TokenCache:
+    """Guarda os tokens carregados por loader() e devolve cópias"""
+
+    def __init__(self, loader, max_age=None, expiry_margin=None):
+        self.loader = loader
+        # Tempo máximo sem reler (outros workers podem ter feito refresh)
+        self.max_age = max_age if max_age is not None else int(os.getenv('TOKEN_CACHE_MAX_AGE', '300'))
+        # Para de servir o token este tanto de segundos antes de expirar
+        self.expiry_margin = expiry_margin if expiry_margin is not None else int(os.getenv('TOKEN_CACHE_EXPIRY_MARGIN', '120'))
+
+        self._lock = threading.Lock()
+        self._tokens = None
+        self._loaded_at = 0.0
+        self._watch = None
+        self._watch_pid = None
+        self._watch_lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0}
+
+    def _listening(self):
+        return self._watch is not None and self._watch_pid == os.getpid()
+
+    def _is_fresh(self):
+        if self._tokens is None:
+            return False
+        if not self._listening() and time.monotonic() - self._loaded_at > self.max_age:
+            return False
+        expire_ms = token_expire_ms(self._tokens)
+        if expire_ms and expire_ms - time.time() * 1000 < self.expiry_margin * 1000:
+            return False
+        return True
+
+    def get(self):
+        with self._lock:
+            if self._is_fresh():
+                self._stats['hits'] += 1
+                return dict(self._tokens)
+
+            self._stats['misses'] += 1
+            tokens = self.loader()
+            if tokens:
+                self._tokens = dict(tokens)
+                self._loaded_at = time.monotonic()
+                return dict(tokens)
+            self._tokens = None
+            return None
+
+    def set(self, tokens):
+        with self._lock:
+            self._tokens = dict(tokens) if tokens else None
+            self._loaded_at = time.monotonic()
+
+    def invalidate(self):
+        with self._lock:
+            self._tokens = None
+            self._loaded_at = 0.0
+
+    def watch(self, doc_ref_factory):
+        """
+        Assina o documento dos tokens (Firestore on_snapshot); doc_ref_factory
+        só é chamado na primeira tentativa do processo. Com o listener
+        ativo, max_age deixa de valer: cada refresh feito por qualquer worker
+        chega aqui. Precisa ser chamado de novo após fork (checa o pid).
+        """
+        pid = os.getpid()
+        with self._watch_lock:
+            # Uma tentativa por processo; sem listener o cache usa max_age
+            if self._watch_pid == pid:
+                return self._watch is not None
+            self._watch = None
+            self._watch_pid = pid
+
+            def _on_snapshot(docs, changes, read_time):
+                for doc in docs:
+                    if doc.exists:
+                        self.set(doc.to_dict())
+                    else:
+                        self.invalidate()
+
+            try:
+                self._watch = doc_ref_factory().on_snapshot(_on_snapshot)
+                print('👂 Listener de tokens ativo (Firestore on_snapshot)')
+                return True
+            except Exception as e:
+                self._watch = None
+                print(f'⚠️ Não foi possível assinar o documento de tokens: {e}')
+                return False
+
+    def stats(self):
+        with self._lock:
+            return {
+                'hits': self._stats['hits'],
+                'misses': self._stats['misses'],
+                'cached': self._tokens is not None,
+                'listening': self._listening(),
+            }
@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""
+Renovação proativa do access_token do AliExpress
+Uma thread em segundo plano renova o token antes de expirar. Um FileLock
+garante que só um worker faz o refresh por vez; quem chega depois relê os
+tokens do armazenamento e desiste se outro worker já renovou.
+"""
+
+import os
+import threading
+import time
+from datetime import datetime
+
+from file_lock import FileLock, shared_state_dir
+from token_cache import token_expire_ms
+
+# Renovar quando faltar menos que isso para expirar (segundos)
+REFRESH_AHEAD = int(os.getenv('TOKEN_REFRESH_AHEAD', '900'))
+# Intervalo entre verificações da thread (segundos)
+CHECK_INTERVAL = int(os.getenv('TOKEN_REFRESH_INTERVAL', '60'))
+# Espera mínima após um refresh que falhou antes de tentar de novo (segundos)
+RETRY_INTERVAL = int(os.getenv('TOKEN_REFRESH_RETRY_INTERVAL', '120'))
+# Validade assumida quando o token não traz expire_time (segundos)
+FALLBACK_TTL = int(os.getenv('TOKEN_FALLBACK_TTL', '21600'))
+
+
+def seconds_until_expiry(tokens):
+    """Segundos de validade restantes; 0 quando não há token"""
+    if not tokens or not tokens.get('access_token'):
+        return 0
+    expire_ms = token_expire_ms(tokens)
+    if expire_ms:
+        return (expire_ms - time.time() * 1000) / 1000
+    # Sem expire_time: conta a partir do último salvamento
+    saved_at = tokens.get('saved_at')
+    if saved_at:
+        try:
+            saved = datetime.fromisoformat(str(saved_at))
+            return FALLBACK_TTL - (datetime.utcnow() - saved).total_seconds()
+        except ValueError:
+            pass
+    return 0
+
+
+class TokenRefresher:
+    """Thread de refresh por processo + lock entre processos"""
+
+    def __init__(self, refresh_fn, load_fn, reload_fn, on_refreshed=None,
+                 refresh_ahead=REFRESH_AHEAD, interval=CHECK_INTERVAL, retry_interval=RETRY_INTERVAL):
+        self.refresh_fn = refresh_fn      # executa o refresh e salva os tokens
+        self.load_fn = load_fn            # leitura barata (cache)
+        self.reload_fn = reload_fn        # leitura direta do armazenamento
+        self.on_refreshed = on_refreshed  # recebe os tokens atualizados
+        self.refresh_ahead = refresh_ahead
+        self.interval = interval
+        self.retry_interval = retry_interval
+        self._failed_at = None
+
+        self._lock_path = None
+        self._thread = None
+        self._thread_pid = None
+        self._start_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stats = {'checks': 0, 'refreshes': 0, 'skipped': 0, 'errors': 0, 'last_refresh': None, 'last_error': None}
+
+    @property
+    def lock(self):
+        if self._lock_path is None:
+            self._lock_path = os.path.join(shared_state_dir('aliexpress-tokens'), 'refresh.lock')
+        return FileLock(self._lock_path)
+
+    def start(self):
+        """Inicia a thread neste processo (de novo após fork do gunicorn)"""
+        pid = os.getpid()
+        if self._thread is not None and self._thread_pid == pid and self._thread.is_alive():
+            return
+        with self._start_lock:
+            if self._thread is not None and self._thread_pid == pid and self._thread.is_alive():
+                return
+            self._wake = threading.Event()
+            self._thread = threading.Thread(target=self._run, name='token-refresher', daemon=True)
+            self._thread_pid = pid
+            self._thread.start()
+            print(f'🔁 Refresh proativo de token ativo (pid {pid})')
+
+    def backing_off(self):
+        """True enquanto o último refresh falhou há menos de retry_interval"""
+        failed_at = self._failed_at
+        return failed_at is not None and time.monotonic() - failed_at < self.retry_interval
+
+    def kick(self):
+        """Pede uma verificação imediata sem esperar por ela"""
+        self.start()
+        if self.backing_off():
+            # Endpoint de token falhando: a thread tenta de novo quando o intervalo vencer
+            self._stats['skipped'] += 1
+            return
+        self._wake.set()
+
+    def needs_refresh(self, tokens, min_valid_seconds=None):
+        ahead = self.refresh_ahead if min_valid_seconds is None else max(self.refresh_ahead, min_valid_seconds)
+        return seconds_until_expiry(tokens) < ahead
+
+    def _run(self):
+        while True:
+            # Limpa antes de verificar: um kick() durante a verificação acorda a próxima espera
+            self._wake.clear()
+            try:
+                self.check()
+            except Exception as e:
+                self._failed_at = time.monotonic()
+                self._stats['errors'] += 1
+                self._stats['last_error'] = str(e)
+                print(f'❌ Erro no refresh proativo de token: {e}')
+            self._wake.wait(self.interval)
+
+    def check(self):
+        self._stats['checks'] += 1
+        tokens = self.load_fn()
+        # Sem refresh_token não há o que renovar (autorização OAuth pendente)
+        if not tokens or not tokens.get('refresh_token'):
+            return None
+        if not self.needs_refresh(tokens):
+            return None
+        if self.backing_off():
+            return None
+        return self.refresh_now()
+
+    def refresh_now(self, force=False):
+        """
+        Faz o refresh segurando o lock entre processos. Sem force, relê os
+        tokens do armazenamento já com o lock e só renova se ainda precisar.
+        Devolve (tokens, erro) como refresh_access_token.
+        """
+        with self.lock:
+            if not force:
+                current = self.reload_fn()
+                if not self.needs_refresh(current):
+                    # Outro worker já renovou
+                    self._stats['skipped'] += 1
+                    if self.on_refreshed and current:
+                        self.on_refreshed(current)
+                    return current, None
+
+            new_tokens, error = self.refresh_fn()
+            if new_tokens:
+                self._failed_at = None
+                self._stats['refreshes'] += 1
+                self._stats['last_refresh'] = datetime.utcnow().isoformat()
+            else:
+                self._failed_at = time.monotonic()
+                self._stats['errors'] += 1
+                self._stats['last_error'] = error
+            return new_tokens, error
+
+    def stats(self):
+        stats = dict(self._stats)
+        stats['backing_off'] = self.backing_off()
+        stats['running'] = self._thread is not None and self._thread_pid == os.getpid() and self._thread.is_alive()
+        return stats